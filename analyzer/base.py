@@ -0,0 +1,338 @@
+"""
+Base analyzer module for horse race analysis
+Shared analysis flow (prompting, response parsing, token estimation, cost)
+for all LLM provider adapters.
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Dict, Optional
+from utils import tracing
+from .prompts import SYSTEM_PROMPT, create_user_prompt
+from .structured import ANALYSIS_SCHEMA, render_markdown
+from .tokens import count_tokens, approximate_tokens, estimate_prompt_tokens
+
+
+class RequestCancelled(Exception):
+    """Raised inside a provider call when its cancel event is set"""
+
+
+class CancelToken(threading.Event):
+    """
+    Cancel event that also closes the provider streams registered on it
+
+    A plain event only stops a stream at its next chunk; closing the
+    connection also ends a stream that hangs without sending anything.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._close_lock = threading.Lock()
+        self._closers = []
+
+    def on_cancel(self, close: Callable[[], None]) -> None:
+        """Call close when the token is set (immediately if it already is)"""
+        with self._close_lock:
+            if not self.is_set():
+                self._closers.append(close)
+                return
+        close()
+
+    def set(self) -> None:
+        with self._close_lock:
+            super().set()
+            closers, self._closers = self._closers, []
+        for close in closers:
+            try:
+                close()
+            except Exception as e:
+                print(f"Error closing cancelled stream: {e}")
+
+
+class LLMAnalyzer:
+    """Base class for LLM based horse race analyzers"""
+
+    # Display name used in the UI and log messages
+    name = "LLM"
+
+    # Pricing per 1 million tokens, keyed by model
+    PRICING: Dict[str, Dict[str, float]] = {}
+
+    # Default pricing for unknown models
+    DEFAULT_PRICING = {
+        'input': 3.0,
+        'output': 15.0,
+        'cached_input': 0.30
+    }
+
+    # Whether the local tokenizer matches the provider (tiktoken for OpenAI)
+    EXACT_TOKEN_COUNT = False
+
+    # Shared utils.ledger.CostLedger that receives one row per call (None = not recorded)
+    ledger = None
+
+    def __init__(self):
+        """Load configuration shared by all providers"""
+        self.model = ""
+        self.max_input_tokens: Optional[int] = None
+
+        # Prompt encoding ("markdown" or "compact") and optional token budget
+        self.prompt_format = os.getenv('PROMPT_FORMAT', 'markdown').lower()
+        budget = os.getenv('PROMPT_TOKEN_BUDGET', '')
+        self.prompt_token_budget = int(budget) if budget else None
+
+        # Output mode ("markdown" or "structured" JSON schema output)
+        self.output_mode = os.getenv('OUTPUT_MODE', 'markdown').lower()
+
+    def analyze_horses(self, race_data: Dict, custom_prompt: str = "") -> Optional[Dict]:
+        """
+        Analyze horses in a single LLM request
+
+        Args:
+            race_data: Dictionary containing race and horse information
+            custom_prompt: Optional custom user instructions
+
+        Returns:
+            Dictionary containing:
+            - raw_response: str - Full LLM response
+            - individual_analysis: str - Individual horse analysis section
+            - comparison: str - Horse comparison section
+            - ranking: str - Ranking section
+            - tokens_used: Dict - Token usage information
+            - cost_usd: float - Cost of the request
+            - response_time: float - Wall time in seconds
+            - time_to_first_token: float - Seconds until the first output token
+            - model: str - Model that produced the response
+            - provider: str - Provider display name
+            - llm_calls: int - Number of LLM requests made
+            - structured: Dict - Structured analysis (structured output mode only)
+        """
+        structured = self.output_mode == 'structured'
+
+        # Create prompt
+        user_prompt = create_user_prompt(
+            race_data,
+            custom_prompt,
+            compact=(self.prompt_format == 'compact'),
+            token_budget=self.prompt_token_budget,
+            structured=structured
+        )
+
+        # Log token estimate
+        estimated_tokens = estimate_prompt_tokens(SYSTEM_PROMPT, user_prompt, exact=self.EXACT_TOKEN_COUNT)
+        print(f"Estimated input tokens: {estimated_tokens}")
+
+        if self.max_input_tokens and estimated_tokens > self.max_input_tokens:
+            print(f"Warning: Input may exceed token limit ({self.max_input_tokens})")
+
+        start_time = time.time()
+        first_token_at = []
+
+        try:
+            completion = self.complete(
+                SYSTEM_PROMPT,
+                user_prompt,
+                schema=ANALYSIS_SCHEMA if structured else None,
+                on_first_token=lambda: first_token_at.append(time.time())
+            )
+        except Exception as e:
+            print(f"Error calling {self.name} API: {e}")
+            return None
+
+        input_tokens = completion['input_tokens']
+        output_tokens = completion['output_tokens']
+        cached_tokens = completion.get('cached_tokens', 0)
+
+        # Log token usage
+        print(f"Token usage - Input: {input_tokens}, Output: {output_tokens}, Total: {input_tokens + output_tokens}")
+        print(f"Response time: {completion['response_time']:.2f}s")
+        print(f"Estimated cost: ${completion['cost_usd']:.4f}")
+
+        # Parse response into sections (render locally in structured mode)
+        if structured:
+            parsed = render_markdown(completion['data'])
+            raw_response = parsed['raw']
+        else:
+            raw_response = completion['text']
+            parsed = self._parse_response(raw_response)
+
+        result = {
+            'raw_response': raw_response,
+            'individual_analysis': parsed.get('individual', ''),
+            'comparison': parsed.get('comparison', ''),
+            'ranking': parsed.get('ranking', ''),
+            'tokens_used': {
+                'input': input_tokens,
+                'output': output_tokens,
+                'cached': cached_tokens,
+                'total': input_tokens + output_tokens
+            },
+            'cost_usd': completion['cost_usd'],
+            'response_time': completion['response_time'],
+            'time_to_first_token': first_token_at[0] - start_time if first_token_at else None,
+            'model': completion['model'],
+            'provider': completion['provider'],
+            'llm_calls': 1
+        }
+
+        if structured:
+            result['structured'] = completion['data']
+
+        return result
+
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None,
+                 schema: Optional[Dict] = None, cancel_event: Optional[threading.Event] = None,
+                 on_first_token: Optional[Callable[[], None]] = None) -> Dict:
+        """
+        Send a single prompt to the provider and attach cost information
+
+        Args:
+            system_prompt: System prompt
+            user_prompt: User prompt
+            max_tokens: Output token limit (defaults to the provider setting)
+            schema: JSON schema for structured output (None = free-form Markdown)
+            cancel_event: Abort the call when this event is set
+            on_first_token: Called once when the first output token arrives
+
+        Returns:
+            Dictionary containing text, input_tokens, output_tokens, cached_tokens,
+            response_time, time_to_first_token, cost_usd, model, provider, and
+            data (decoded JSON) when a schema is given
+
+        Raises:
+            RequestCancelled: If cancel_event was set during the call
+            Exception: If the API call fails
+        """
+        with tracing.span('llm.complete', provider=self.name, model=self.model, structured=schema is not None) as span:
+            start_time = time.time()
+            try:
+                completion = self._complete(system_prompt, user_prompt, max_tokens, schema, cancel_event, on_first_token)
+            except Exception as e:
+                self._record_call(latency_seconds=time.time() - start_time,
+                                  cancelled=isinstance(e, RequestCancelled), error=str(e)[:200])
+                raise
+            completion['cost_usd'] = self.calculate_cost(
+                completion['input_tokens'],
+                completion['output_tokens'],
+                completion.get('cached_tokens', 0)
+            )
+            completion['model'] = self.model
+            completion['provider'] = self.name
+            span.set(input_tokens=completion['input_tokens'], output_tokens=completion['output_tokens'],
+                     cached_tokens=completion.get('cached_tokens', 0), cost_usd=completion['cost_usd'],
+                     ttft_ms=round(completion['time_to_first_token'] * 1000, 1)
+                     if completion.get('time_to_first_token') is not None else None)
+            self._record_call(input_tokens=completion['input_tokens'], output_tokens=completion['output_tokens'],
+                              cached_tokens=completion.get('cached_tokens', 0),
+                              latency_seconds=completion['response_time'],
+                              ttft_seconds=completion.get('time_to_first_token'), cost_usd=completion['cost_usd'])
+            return completion
+
+    def _record_call(self, **fields) -> None:
+        """
+        Write one ledger row for a provider call
+
+        Args:
+            **fields: Row fields (see utils.ledger.CALL_FIELDS); provider and model are added
+        """
+        if self.ledger is not None:
+            self.ledger.record_call({'provider': self.name, 'model': self.model, **fields})
+
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int],
+                  schema: Optional[Dict], cancel_event: Optional[threading.Event],
+                  on_first_token: Optional[Callable[[], None]]) -> Dict:
+        """
+        Provider-specific streaming call
+
+        Returns:
+            Dictionary containing text, input_tokens, output_tokens,
+            cached_tokens (subset of input_tokens), response_time,
+            time_to_first_token, and data when a schema is given
+        """
+        raise NotImplementedError
+
+    def _close_on_cancel(self, cancel_event: Optional[threading.Event], stream) -> None:
+        """
+        Close a provider stream when its request is cancelled
+
+        Args:
+            cancel_event: The call's cancel event (only a CancelToken can close streams)
+            stream: Open SDK stream with a close() method
+        """
+        if isinstance(cancel_event, CancelToken):
+            cancel_event.on_cancel(stream.close)
+
+    def _parse_response(self, response: str) -> Dict[str, str]:
+        """
+        Parse LLM response into sections
+
+        Args:
+            response: Raw LLM response text
+
+        Returns:
+            Dictionary with parsed sections
+        """
+        sections = {
+            'individual': '',
+            'comparison': '',
+            'ranking': ''
+        }
+
+        # Split by main headers
+        parts = response.split('##')
+
+        for part in parts:
+            part = part.strip()
+
+            if not part:
+                continue
+
+            # Check section type
+            if '1.' in part and '個別' in part:
+                sections['individual'] = '##' + part
+
+            elif '2.' in part and '比較' in part:
+                sections['comparison'] = '##' + part
+
+            elif '3.' in part and ('ランキング' in part or 'おすすめ' in part):
+                sections['ranking'] = '##' + part
+
+        return sections
+
+    def _estimate_tokens(self, text: str) -> int:
+        """
+        Estimate token count for text
+
+        Args:
+            text: Input text
+
+        Returns:
+            Estimated token count
+        """
+        if self.EXACT_TOKEN_COUNT:
+            return count_tokens(text)
+
+        return approximate_tokens(text)
+
+    def calculate_cost(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """
+        Calculate the cost in USD for a given token usage
+
+        Args:
+            input_tokens: Number of input tokens used (including cached tokens)
+            output_tokens: Number of output tokens used
+            cached_tokens: Number of input tokens served from the provider's prompt cache
+
+        Returns:
+            Total cost in USD
+        """
+        pricing = self.PRICING.get(self.model, self.DEFAULT_PRICING)
+
+        # Calculate cost (pricing is per 1 million tokens)
+        uncached_tokens = input_tokens - cached_tokens
+        input_cost = (uncached_tokens / 1_000_000) * pricing['input']
+        input_cost += (cached_tokens / 1_000_000) * pricing.get('cached_input', pricing['input'])
+        output_cost = (output_tokens / 1_000_000) * pricing['output']
+
+        return input_cost + output_cost
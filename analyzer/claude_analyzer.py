@@ -1,35 +1,40 @@
 """
 Claude 4.5 analyzer module for horse race analysis
-Handles LLM interaction and response parsing.
+Anthropic provider adapter for LLMAnalyzer.
 """
 
 import os
 import time
-from typing import Dict, Optional
+import json
+import threading
+from typing import Callable, Dict, Optional
 from anthropic import Anthropic
-from .prompts import SYSTEM_PROMPT, create_user_prompt
+from .base import LLMAnalyzer, RequestCancelled
+from .structured import TOOL_NAME, TOOL_DESCRIPTION
 
 
-class ClaudeAnalyzer:
+class ClaudeAnalyzer(LLMAnalyzer):
     """Claude 4.5 based horse race analyzer"""
 
+    name = "Claude 4.5"
+
     # Claude 4.5 pricing (per 1 million tokens)
     # Source: https://www.anthropic.com/pricing
     PRICING = {
         'claude-sonnet-4-5-20250929': {
             'input': 3.0,    # $3.00 per 1M input tokens
-            'output': 15.0   # $15.00 per 1M output tokens
+            'output': 15.0,  # $15.00 per 1M output tokens
+            'cached_input': 0.30  # $0.30 per 1M prompt cache read tokens
         }
     }
 
-    # Default pricing for unknown models
-    DEFAULT_PRICING = {
-        'input': 3.0,
-        'output': 15.0
-    }
+    # No local Claude tokenizer, so token counts are approximate
+    EXACT_TOKEN_COUNT = False
 
     def __init__(self):
         """Initialize Claude analyzer with Anthropic client"""
+        super().__init__()
+
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable not set")
@@ -41,148 +46,92 @@ class ClaudeAnalyzer:
         self.max_tokens = int(os.getenv('CLAUDE_MAX_TOKENS', '8000'))
         self.temperature = float(os.getenv('CLAUDE_TEMPERATURE', '0.7'))
 
-    def analyze_horses(self, race_data: Dict, custom_prompt: str = "") -> Optional[Dict]:
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None,
+                  schema: Optional[Dict] = None, cancel_event: Optional[threading.Event] = None,
+                  on_first_token: Optional[Callable[[], None]] = None) -> Dict:
         """
-        Analyze horses using Claude 4.5
+        Stream a single prompt to Claude and return the text with usage
 
         Args:
-            race_data: Dictionary containing race and horse information
-            custom_prompt: Optional custom user instructions
+            system_prompt: System prompt
+            user_prompt: User prompt
+            max_tokens: Output token limit (defaults to CLAUDE_MAX_TOKENS)
+            schema: JSON schema for structured output (None = free-form Markdown)
+            cancel_event: Abort the stream when this event is set
+            on_first_token: Called once when the first output token arrives
 
         Returns:
-            Dictionary containing:
-            - raw_response: str - Full Claude response
-            - individual_analysis: str - Individual horse analysis section
-            - comparison: str - Horse comparison section
-            - ranking: str - Ranking section
-            - tokens_used: Dict - Token usage information
-        """
-        # Create prompt
-        user_prompt = create_user_prompt(race_data, custom_prompt)
-
-        # Log token estimate
-        estimated_tokens = self._estimate_tokens(user_prompt)
-        print(f"Estimated input tokens: {estimated_tokens}")
-
-        try:
-            start_time = time.time()
-
-            # Call Claude API
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=SYSTEM_PROMPT,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-
-            elapsed_time = time.time() - start_time
-
-            # Extract response
-            raw_response = response.content[0].text
-
-            # Log token usage
-            usage = response.usage
-            print(f"Token usage - Input: {usage.input_tokens}, Output: {usage.output_tokens}, Total: {usage.input_tokens + usage.output_tokens}")
-            print(f"Response time: {elapsed_time:.2f}s")
-
-            # Calculate cost
-            cost_usd = self.calculate_cost(usage.input_tokens, usage.output_tokens)
-            print(f"Estimated cost: ${cost_usd:.4f}")
-
-            # Parse response into sections
-            parsed = self._parse_response(raw_response)
-
-            return {
-                'raw_response': raw_response,
-                'individual_analysis': parsed.get('individual', ''),
-                'comparison': parsed.get('comparison', ''),
-                'ranking': parsed.get('ranking', ''),
-                'tokens_used': {
-                    'input': usage.input_tokens,
-                    'output': usage.output_tokens,
-                    'total': usage.input_tokens + usage.output_tokens
-                },
-                'cost_usd': cost_usd,
-                'response_time': elapsed_time
-            }
-
-        except Exception as e:
-            print(f"Error calling Claude API: {e}")
-            return None
-
-    def _parse_response(self, response: str) -> Dict[str, str]:
-        """
-        Parse Claude response into sections
-
-        Args:
-            response: Raw Claude response text
+            Dictionary containing text, input_tokens, output_tokens, cached_tokens,
+            response_time, time_to_first_token, and data (decoded JSON) when a
+            schema is given
 
-        Returns:
-            Dictionary with parsed sections
+        Raises:
+            RequestCancelled: If cancel_event was set during the call
+            Exception: If the API call fails
         """
-        sections = {
-            'individual': '',
-            'comparison': '',
-            'ranking': ''
+        kwargs = {}
+        if schema:
+            # Force a single tool call whose input is the structured result
+            kwargs['tools'] = [{
+                'name': TOOL_NAME,
+                'description': TOOL_DESCRIPTION,
+                'input_schema': schema
+            }]
+            kwargs['tool_choice'] = {'type': 'tool', 'name': TOOL_NAME}
+
+        start_time = time.time()
+        time_to_first_token = None
+
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature,
+            system=system_prompt,
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            **kwargs
+        ) as stream:
+            self._close_on_cancel(cancel_event, stream)
+            try:
+                for event in stream:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RequestCancelled(f"{self.name} request cancelled")
+
+                    # First text or tool-input delta
+                    if time_to_first_token is None and event.type == 'content_block_delta':
+                        time_to_first_token = time.time() - start_time
+                        if on_first_token:
+                            on_first_token()
+
+                response = stream.get_final_message()
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                # Closing the stream on cancel surfaces as a read error
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelled(f"{self.name} request cancelled") from e
+                raise
+
+        elapsed_time = time.time() - start_time
+
+        # Prompt cache reads are billed separately from input_tokens; report
+        # them as part of the input so cached_tokens is a subset like OpenAI
+        cached_tokens = getattr(response.usage, 'cache_read_input_tokens', None) or 0
+
+        completion = {
+            'input_tokens': response.usage.input_tokens + cached_tokens,
+            'output_tokens': response.usage.output_tokens,
+            'cached_tokens': cached_tokens,
+            'response_time': elapsed_time,
+            'time_to_first_token': time_to_first_token
         }
 
-        # Split by main headers
-        parts = response.split('##')
-
-        for part in parts:
-            part = part.strip()
-
-            if not part:
-                continue
-
-            # Check section type
-            if '1.' in part and '個別' in part:
-                sections['individual'] = '##' + part
-
-            elif '2.' in part and '比較' in part:
-                sections['comparison'] = '##' + part
-
-            elif '3.' in part and 'ランキング' in part or 'おすすめ' in part:
-                sections['ranking'] = '##' + part
-
-        return sections
-
-    def _estimate_tokens(self, text: str) -> int:
-        """
-        Estimate token count for text
-
-        Args:
-            text: Input text
-
-        Returns:
-            Estimated token count
-        """
-        # Claude's token counting is roughly:
-        # 1 token ≈ 0.75 English words or 0.5 Japanese characters
-        japanese_chars = sum(1 for c in text if ord(c) > 0x3000)
-        other_chars = len(text) - japanese_chars
-        estimated = (japanese_chars / 2) + (other_chars / 4)
-
-        return int(estimated)
-
-    def calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
-        """
-        Calculate the cost in USD for a given token usage
-
-        Args:
-            input_tokens: Number of input tokens used
-            output_tokens: Number of output tokens used
-
-        Returns:
-            Total cost in USD
-        """
-        pricing = self.PRICING.get(self.model, self.DEFAULT_PRICING)
-
-        # Calculate cost (pricing is per 1 million tokens)
-        input_cost = (input_tokens / 1_000_000) * pricing['input']
-        output_cost = (output_tokens / 1_000_000) * pricing['output']
+        if schema:
+            tool_use = next(block for block in response.content if block.type == 'tool_use')
+            completion['data'] = tool_use.input
+            completion['text'] = json.dumps(tool_use.input, ensure_ascii=False)
+        else:
+            completion['text'] = response.content[0].text
 
-        return input_cost + output_cost
+        return completion
@@ -0,0 +1,361 @@
+"""
+Numeric feature extraction from horse result histories
+Parses the string fields of scraped result rows into per-horse numeric
+columns (built once per horse and cached with the results), and stacks the
+columns of a whole field into one NumPy feature table.
+"""
+
+import re
+from datetime import date
+from typing import Dict, List, Optional
+import numpy as np
+
+# Bump when parsing changes so cached columns are rebuilt
+FEATURES_VERSION = 1
+
+# Approximate time per length used to convert second margins to lengths
+SECONDS_PER_LENGTH = 0.2
+
+# Margins given in words, in lengths
+MARGIN_WORDS = {
+    '同着': 0.0,
+    'ハナ': 0.05,
+    'アタマ': 0.1,
+    'クビ': 0.25,
+    '大': 10.0,
+    '大差': 10.0,
+}
+
+SURFACE_CODES = {'芝': 0, 'ダ': 1, '障': 2}
+
+# Numeric columns in the per-horse column dict (missing values are None)
+NUMERIC_COLUMNS = [
+    'position', 'time_seconds', 'margin_lengths', 'last_3f', 'odds', 'popularity',
+    'horse_weight', 'weight_change', 'passing_first', 'passing_last',
+    'distance_meters', 'surface', 'date_ordinal'
+]
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_WEIGHT = re.compile(r'(\d+)\s*\(([+-]?\d+)\)')
+_LENGTHS = re.compile(r'^(?:(\d+)\.)?(\d+)/(\d+)$')
+_DIGITS = re.compile(r'\d')
+
+
+def parse_float(text) -> Optional[float]:
+    """
+    Parse the first number in a cell
+
+    Args:
+        text: Cell text or number
+
+    Returns:
+        Parsed number, or None if the cell has no number
+    """
+    if isinstance(text, (int, float)):
+        return float(text)
+
+    match = _NUMBER.search(str(text or ''))
+    return float(match.group()) if match else None
+
+
+def parse_position(position) -> Optional[float]:
+    """
+    Parse a finishing position
+
+    Args:
+        position: Position as int (0/99 = unknown) or cell text (e.g. "3", "中", "1(降)")
+
+    Returns:
+        Position, or None for non-finishers and unknown values
+    """
+    value = parse_float(position)
+    if value is None or value <= 0 or value >= 99:
+        return None
+    return value
+
+
+def parse_time(text) -> Optional[float]:
+    """
+    Parse a race time into seconds
+
+    Args:
+        text: Time text (e.g. "1:34.5", "58.9")
+
+    Returns:
+        Seconds, or None if the horse has no time
+    """
+    text = str(text or '').strip()
+    if not text:
+        return None
+
+    try:
+        if ':' in text:
+            minutes, seconds = text.split(':', 1)
+            return int(minutes) * 60 + float(seconds)
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_margin_lengths(text) -> Optional[float]:
+    """
+    Parse a finishing margin into lengths behind the winner
+
+    The horse results page gives margins in seconds ("0.3", winners "-0.1"),
+    while race pages use lengths ("1.1/2", "3/4", "クビ").
+
+    Args:
+        text: Margin text
+
+    Returns:
+        Lengths behind (0 for winners), or None if unknown
+    """
+    text = str(text or '').strip()
+    if not text:
+        return None
+
+    if text in MARGIN_WORDS:
+        return MARGIN_WORDS[text]
+
+    match = _LENGTHS.match(text)
+    if match:
+        whole = int(match.group(1) or 0)
+        return whole + int(match.group(2)) / int(match.group(3))
+
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+
+    # Decimal margins are seconds, plain integers are lengths
+    if '.' in text or value < 0:
+        return max(value, 0.0) / SECONDS_PER_LENGTH
+    return value
+
+
+def parse_passing(text) -> Dict[str, Optional[float]]:
+    """
+    Parse corner passing positions
+
+    Args:
+        text: Passing text (e.g. "3-3-2-1")
+
+    Returns:
+        Dictionary with passing_first and passing_last
+    """
+    positions = [int(part) for part in str(text or '').split('-') if part.strip().isdigit()]
+    if not positions:
+        return {'passing_first': None, 'passing_last': None}
+    return {'passing_first': float(positions[0]), 'passing_last': float(positions[-1])}
+
+
+def parse_horse_weight(text) -> Dict[str, Optional[float]]:
+    """
+    Parse body weight and change
+
+    Args:
+        text: Weight text (e.g. "480(+4)", "計不")
+
+    Returns:
+        Dictionary with horse_weight and weight_change
+    """
+    text = str(text or '')
+    match = _WEIGHT.search(text)
+    if match:
+        return {'horse_weight': float(match.group(1)), 'weight_change': float(match.group(2))}
+    return {'horse_weight': parse_float(text), 'weight_change': None}
+
+
+def parse_distance(text) -> Dict[str, Optional[float]]:
+    """
+    Parse distance and surface
+
+    Args:
+        text: Distance text (e.g. "芝1600", "ダ1200")
+
+    Returns:
+        Dictionary with distance_meters and surface code (0 芝, 1 ダート, 2 障害)
+    """
+    text = str(text or '')
+    surface = next((code for mark, code in SURFACE_CODES.items() if mark in text), None)
+    return {
+        'distance_meters': parse_float(text),
+        'surface': float(surface) if surface is not None else None
+    }
+
+
+def parse_date_ordinal(text) -> Optional[float]:
+    """
+    Parse a race date into a proleptic Gregorian ordinal
+
+    Args:
+        text: Date text (e.g. "2025/10/05")
+
+    Returns:
+        Day ordinal, or None if the date cannot be parsed
+    """
+    parts = re.split(r'[/.\-]', str(text or '').strip())
+    try:
+        return float(date(int(parts[0]), int(parts[1]), int(parts[2])).toordinal())
+    except (ValueError, IndexError):
+        return None
+
+
+def result_columns(results: List[Dict]) -> Dict[str, List]:
+    """
+    Build numeric columns for one horse in a single pass over its results
+
+    Accepts rows from both HorseScraper.fetch_horse_results (position, track)
+    and HorseScraper.fetch_race_results (finish_position, venue). The result
+    is plain lists so it can be cached alongside the results.
+
+    Args:
+        results: Result rows, most recent first
+
+    Returns:
+        Dictionary containing version, venue (list of str) and one list per
+        NUMERIC_COLUMNS entry (None where the value is missing)
+    """
+    columns = {name: [] for name in NUMERIC_COLUMNS}
+    venues = []
+
+    for result in results:
+        get = result.get
+        row = {
+            'position': parse_position(get('finish_position', get('position'))),
+            'time_seconds': parse_time(get('time')),
+            'margin_lengths': parse_margin_lengths(get('margin')),
+            'last_3f': parse_float(get('last_3f')),
+            'odds': parse_float(get('odds')),
+            'popularity': parse_float(get('popularity')),
+            'date_ordinal': parse_date_ordinal(get('date')),
+            **parse_horse_weight(get('horse_weight')),
+            **parse_passing(get('passing')),
+            **parse_distance(get('distance')),
+        }
+
+        for name in NUMERIC_COLUMNS:
+            columns[name].append(row[name])
+        venues.append(_DIGITS.sub('', get('venue', get('track', '')) or ''))
+
+    return {'version': FEATURES_VERSION, 'venue': venues, **columns}
+
+
+def ensure_result_columns(horse_results: Dict, results_key: str = 'recent_results') -> Dict:
+    """
+    Attach cached feature columns to a horse results dictionary
+
+    Args:
+        horse_results: Dictionary from fetch_horse_results (or the cache)
+        results_key: Key holding the result rows
+
+    Returns:
+        The same dictionary with an up-to-date 'features' entry
+    """
+    features = horse_results.get('features')
+    if not features or features.get('version') != FEATURES_VERSION:
+        horse_results['features'] = result_columns(horse_results.get(results_key, []))
+    return horse_results
+
+
+def _group_zscore(values: np.ndarray, groups: np.ndarray, num_groups: int) -> np.ndarray:
+    """Z-score values within groups, ignoring NaN (NaN where a group has < 2 values)"""
+    mask = ~np.isnan(values)
+    filled = np.where(mask, values, 0.0)
+
+    counts = np.bincount(groups, weights=mask.astype(float), minlength=num_groups)
+    sums = np.bincount(groups, weights=filled, minlength=num_groups)
+    squares = np.bincount(groups, weights=filled * filled, minlength=num_groups)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares / counts - means * means, 0.0))
+        valid = (counts >= 2) & (stds > 0)
+        z = (values - means[groups]) / stds[groups]
+
+    return np.where(mask & valid[groups], z, np.nan)
+
+
+def build_feature_table(horses: List[Dict], max_results: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Stack the cached per-horse columns of a field into one feature table
+
+    Args:
+        horses: Horse data dictionaries carrying 'result_features' (columns from
+                result_columns); horses without them are parsed on the fly
+        max_results: Only use the most recent N results per horse (None = all)
+
+    Returns:
+        Column dictionary of equal-length arrays, one row per past race:
+        - horse_index: int - Position of the horse in the field
+        - race_index: int - 0 = most recent race of that horse
+        - venue: str array
+        - NUMERIC_COLUMNS: float (NaN where missing)
+        - time_per_km: float - Seconds per 1000m
+        - time_z, last_3f_z: float - Z-score within venue/surface/distance groups
+    """
+    horse_index = []
+    race_index = []
+    venues = []
+    numeric = {name: [] for name in NUMERIC_COLUMNS}
+
+    for i, horse in enumerate(horses):
+        columns = horse.get('result_features')
+        if not columns or columns.get('version') != FEATURES_VERSION:
+            columns = result_columns(horse.get('recent_results', []))
+
+        count = len(columns['venue'])
+        if max_results is not None:
+            count = min(count, max_results)
+
+        horse_index.extend([i] * count)
+        race_index.extend(range(count))
+        venues.extend(columns['venue'][:count])
+        for name in NUMERIC_COLUMNS:
+            numeric[name].extend(columns[name][:count])
+
+    table = {
+        'horse_index': np.array(horse_index, dtype=int),
+        'race_index': np.array(race_index, dtype=int),
+        'venue': np.array(venues, dtype=str),
+    }
+    for name in NUMERIC_COLUMNS:
+        # None becomes NaN
+        table[name] = np.array(numeric[name], dtype=float)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['time_per_km'] = table['time_seconds'] / table['distance_meters'] * 1000
+
+    # Normalize within venue + surface + distance groups
+    if len(horse_index):
+        keys = np.char.add(np.char.add(table['venue'], '|'),
+                           np.char.add(table['surface'].astype(str), table['distance_meters'].astype(str)))
+        _, groups = np.unique(keys, return_inverse=True)
+        groups = groups.ravel()
+        num_groups = int(groups.max()) + 1
+        table['time_z'] = _group_zscore(table['time_seconds'], groups, num_groups)
+        table['last_3f_z'] = _group_zscore(table['last_3f'], groups, num_groups)
+    else:
+        table['time_z'] = np.zeros(0)
+        table['last_3f_z'] = np.zeros(0)
+
+    return table
+
+
+def to_matrix(table: Dict[str, np.ndarray], column: str, num_horses: int, num_races: int) -> np.ndarray:
+    """
+    Scatter a feature column into a (horses x recent races) matrix
+
+    Args:
+        table: Feature table from build_feature_table
+        column: Column name
+        num_horses: Number of horses in the field
+        num_races: Number of recent races per horse
+
+    Returns:
+        Float matrix with NaN where a horse has fewer races
+    """
+    matrix = np.full((num_horses, num_races), np.nan)
+    mask = table['race_index'] < num_races
+    matrix[table['horse_index'][mask], table['race_index'][mask]] = table[column][mask]
+    return matrix
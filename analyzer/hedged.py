@@ -0,0 +1,263 @@
+"""
+Hedged LLM requests
+Sends each request to the primary provider and, if no first token has
+arrived by a p95-derived deadline, also to the secondary provider. The
+first completion wins and the other stream is closed.
+
+When the primary loses or is cancelled before its first token, the time
+it had waited is recorded as a (censored) TTFT sample, so the deadline
+still rises while the primary is slow instead of being learned only from
+the requests it answered quickly.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Deque, Dict, List, Optional
+from utils import tracing
+from utils.ledger import call_context
+from .base import CancelToken, LLMAnalyzer, RequestCancelled
+
+# Time-to-first-token samples per model, shared by all HedgedAnalyzer instances
+_TTFT_SAMPLES: Dict[str, Deque[float]] = {}
+_TTFT_LOCK = threading.Lock()
+
+
+def record_ttft(model: str, seconds: float, window: int = 200):
+    """
+    Record a time-to-first-token sample
+
+    Args:
+        model: Model name
+        seconds: Seconds from request start to first token
+        window: Number of recent samples to keep per model
+    """
+    with _TTFT_LOCK:
+        samples = _TTFT_SAMPLES.get(model)
+        if samples is None or samples.maxlen != window:
+            samples = deque(samples or (), maxlen=window)
+            _TTFT_SAMPLES[model] = samples
+        samples.append(seconds)
+
+
+def ttft_percentile(model: str, percentile: float = 0.95, min_samples: int = 1) -> Optional[float]:
+    """
+    Get a time-to-first-token percentile for a model
+
+    Args:
+        model: Model name
+        percentile: Percentile between 0 and 1
+        min_samples: Minimum number of samples required
+
+    Returns:
+        Percentile in seconds, or None if there are too few samples
+    """
+    with _TTFT_LOCK:
+        samples: List[float] = sorted(_TTFT_SAMPLES.get(model, ()))
+
+    if not samples or len(samples) < min_samples:
+        return None
+
+    index = min(len(samples) - 1, int(round(percentile * (len(samples) - 1))))
+    return samples[index]
+
+
+class HedgedAnalyzer(LLMAnalyzer):
+    """Hedged requests across two provider adapters"""
+
+    def __init__(self, primary: LLMAnalyzer, secondary: LLMAnalyzer):
+        """
+        Initialize hedged analyzer
+
+        Args:
+            primary: Provider adapter used for every request
+            secondary: Provider adapter used when the primary is slow or fails
+        """
+        super().__init__()
+
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f"{primary.name} (+{secondary.name})"
+
+        # Prompt settings and cache fingerprints follow the primary provider
+        self.model = primary.model
+        self.max_input_tokens = primary.max_input_tokens
+        self.EXACT_TOKEN_COUNT = primary.EXACT_TOKEN_COUNT
+
+        self.percentile = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+        self.fallback_deadline = float(os.getenv('HEDGE_DEADLINE_SECONDS', '8'))
+        self.min_samples = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+        self.sample_window = int(os.getenv('HEDGE_SAMPLE_WINDOW', '200'))
+
+    def hedge_deadline(self) -> float:
+        """
+        Get the time to wait for the primary's first token before hedging
+
+        Returns:
+            Deadline in seconds (p95 of recent primary TTFT, or the
+            HEDGE_DEADLINE_SECONDS fallback until enough samples exist)
+        """
+        deadline = ttft_percentile(self.primary.model, self.percentile, self.min_samples)
+        return deadline if deadline is not None else self.fallback_deadline
+
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None,
+                 schema: Optional[Dict] = None, cancel_event: Optional[threading.Event] = None,
+                 on_first_token: Optional[Callable[[], None]] = None) -> Dict:
+        """
+        Send a prompt to the primary provider, hedging to the secondary if slow
+
+        The cancelled provider's partial usage is not reported by the streaming
+        APIs, so cost_usd only covers the winning completion.
+
+        Args:
+            system_prompt: System prompt
+            user_prompt: User prompt
+            max_tokens: Output token limit (defaults to each provider's setting)
+            schema: JSON schema for structured output (None = free-form Markdown)
+            cancel_event: Abort both calls when this event is set
+            on_first_token: Called once when the first output token arrives
+
+        Returns:
+            Completion dictionary from the winning provider plus:
+            - hedged: bool - Whether the secondary provider was started
+
+        Raises:
+            Exception: If both providers fail
+        """
+        deadline = self.hedge_deadline()
+        progress = threading.Event()
+        first_token_lock = threading.Lock()
+        first_token_seen = []
+        # Start time of the primary call and whether its TTFT was sampled
+        primary_state = {'start': time.time(), 'sampled': False}
+
+        def sample_primary(seconds: float):
+            with first_token_lock:
+                if primary_state['sampled']:
+                    return
+                primary_state['sampled'] = True
+            record_ttft(self.primary.model, seconds, self.sample_window)
+
+        def first_token_callback(model: str, start_time: float) -> Callable[[], None]:
+            def callback():
+                if model == self.primary.model:
+                    sample_primary(time.time() - start_time)
+                progress.set()
+                with first_token_lock:
+                    if first_token_seen:
+                        return
+                    first_token_seen.append(model)
+                if on_first_token:
+                    on_first_token()
+            return callback
+
+        def submit(executor, analyzer: LLMAnalyzer, event: threading.Event, leg: str):
+            def run(*args):
+                # The leg's ledger row says which side of the hedge it was
+                with call_context(hedge=leg):
+                    return analyzer.complete(*args)
+
+            future = executor.submit(
+                tracing.bind(run), system_prompt, user_prompt, max_tokens, schema,
+                event, first_token_callback(analyzer.model, time.time())
+            )
+            future.add_done_callback(lambda _: progress.set())
+            return future
+
+        # CancelTokens also close the provider's stream, so a hung loser does not keep running
+        primary_cancel = CancelToken()
+        secondary_cancel = CancelToken()
+        watcher_done = threading.Event()
+
+        # Propagate the caller's cancel event to both providers
+        if cancel_event is not None:
+            def watch_cancel():
+                while not watcher_done.is_set():
+                    if cancel_event.wait(0.1):
+                        primary_cancel.set()
+                        secondary_cancel.set()
+                        return
+            threading.Thread(target=watch_cancel, daemon=True).start()
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            primary_state['start'] = time.time()
+            primary_future = submit(executor, self.primary, primary_cancel, 'primary')
+            progress.wait(deadline)
+
+            if first_token_seen or primary_future.done():
+                # Primary answered or is streaming within the deadline, no hedge needed
+                try:
+                    return self._finish(primary_future.result(), hedged=False)
+                except RequestCancelled:
+                    sample_primary(time.time() - primary_state['start'])
+                    raise
+                except Exception as e:
+                    print(f"Primary provider failed, failing over to {self.secondary.name}: {e}")
+
+                secondary_future = submit(executor, self.secondary, secondary_cancel, 'secondary')
+                return self._finish(secondary_future.result(), hedged=True)
+
+            print(f"No first token from {self.primary.name} within {deadline:.1f}s, hedging to {self.secondary.name}")
+
+            secondary_future = submit(executor, self.secondary, secondary_cancel, 'secondary')
+            pending = {primary_future, secondary_future}
+            errors = []
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    error = future.exception()
+                    if error is None:
+                        if future is secondary_future and not primary_future.done():
+                            # Censored sample: the primary had not answered after this long
+                            sample_primary(time.time() - primary_state['start'])
+                        # Close the losing stream
+                        loser_cancel = secondary_cancel if future is primary_future else primary_cancel
+                        loser_cancel.set()
+                        return self._finish(future.result(), hedged=True)
+                    if not isinstance(error, RequestCancelled):
+                        errors.append(error)
+
+            if not errors:
+                sample_primary(time.time() - primary_state['start'])
+            raise errors[-1] if errors else RequestCancelled("Hedged request cancelled")
+
+        finally:
+            watcher_done.set()
+            # Finished calls ignore this; anything still streaming is closed
+            primary_cancel.set()
+            secondary_cancel.set()
+            executor.shutdown(wait=False)
+
+    def _finish(self, completion: Dict, hedged: bool) -> Dict:
+        """
+        Annotate the winning completion
+
+        Args:
+            completion: Completion dictionary from a provider adapter
+            hedged: Whether the secondary provider was started
+
+        Returns:
+            Completion dictionary
+        """
+        completion['hedged'] = hedged
+        if hedged:
+            print(f"Hedged request won by {completion.get('provider', '')}")
+        return completion
+
+    def calculate_cost(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """
+        Calculate the cost in USD at the primary provider's pricing
+
+        Args:
+            input_tokens: Number of input tokens used (including cached tokens)
+            output_tokens: Number of output tokens used
+            cached_tokens: Number of input tokens served from the provider's prompt cache
+
+        Returns:
+            Total cost in USD
+        """
+        return self.primary.calculate_cost(input_tokens, output_tokens, cached_tokens)
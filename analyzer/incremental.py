@@ -0,0 +1,263 @@
+"""
+Incremental horse race analysis
+Splits the analysis into cacheable per-horse units plus a race-level
+comparison/ranking pass, so re-runs only pay for horses whose data changed.
+"""
+
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from utils import tracing
+from .prompts import SYSTEM_PROMPT, create_horse_prompt, create_ranking_prompt, format_horse_summary
+from .structured import (
+    HORSE_ANALYSIS_SCHEMA, RANKING_SCHEMA,
+    render_horse_markdown, render_comparison_markdown, render_ranking_markdown
+)
+
+
+class IncrementalAnalyzer:
+    """Per-horse cached analysis on top of an LLMAnalyzer"""
+
+    def __init__(self, analyzer, cache=None):
+        """
+        Initialize incremental analyzer
+
+        Args:
+            analyzer: LLMAnalyzer instance (provider adapter or HedgedAnalyzer)
+            cache: Optional DynamoDBCache instance for per-horse results
+        """
+        self.analyzer = analyzer
+        self.cache = cache
+        self.max_workers = int(os.getenv('ANALYSIS_MAX_WORKERS', '6'))
+        self.horse_max_tokens = int(os.getenv('HORSE_ANALYSIS_MAX_TOKENS', '1000'))
+
+    def horse_fingerprint(self, horse_prompt: str) -> str:
+        """
+        Generate the cache fingerprint for a horse's individual analysis
+
+        The prompt is a deterministic rendering of the horse data and race
+        conditions, so hashing it together with the model covers every input
+        that can change the analysis.
+
+        Args:
+            horse_prompt: Rendered per-horse prompt
+
+        Returns:
+            MD5 hex digest
+        """
+        key = f"{self.analyzer.model}\n{horse_prompt}"
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def analyze_horses(self, race_data: Dict, custom_prompt: str = "") -> Optional[Dict]:
+        """
+        Analyze horses, re-running only horses whose data changed
+
+        Args:
+            race_data: Dictionary containing race and horse information
+            custom_prompt: Optional custom user instructions (ranking pass only)
+
+        Returns:
+            Dictionary with the same keys as LLMAnalyzer.analyze_horses plus:
+            - horses_cached: int - Number of horses reused from cache
+            - horses_analyzed: int - Number of horses sent to the LLM
+            - horses_summarized: int - Number of pre-ranked-out horses (summary only)
+            - horses_failed: int - Number of horses whose call failed (summary only,
+              not cached; a re-run retries just these horses)
+        """
+        start_time = time.time()
+        horses = race_data.get('horses', [])
+        structured = getattr(self.analyzer, 'output_mode', 'markdown') == 'structured'
+
+        # Render prompts and look up cached per-horse analyses
+        jobs = []
+        analyses: List[Optional[str]] = [None] * len(horses)
+        horse_data: List[Optional[Dict]] = [None] * len(horses)
+
+        for i, horse in enumerate(horses):
+            # Horses outside the pre-ranking top N are not sent to the LLM
+            if horse.get('prerank_summary'):
+                analyses[i], horse_data[i] = self._summary_section(i, horse)
+                continue
+
+            horse_prompt = create_horse_prompt(race_data, i + 1, horse, structured=structured)
+            fingerprint = self.horse_fingerprint(horse_prompt)
+
+            cached = None
+            if self.cache:
+                cached = self.cache.get_horse_analysis(horse.get('horse_id', ''), fingerprint)
+
+            if cached and cached.get('analysis'):
+                analyses[i] = cached['analysis']
+                horse_data[i] = cached.get('structured')
+            else:
+                jobs.append((i, horse, horse_prompt, fingerprint))
+
+        horses_summarized = sum(1 for horse in horses if horse.get('prerank_summary'))
+        horses_cached = len(horses) - horses_summarized - len(jobs)
+        print(f"Per-horse analysis - Cached: {horses_cached}, To analyze: {len(jobs)}, Summary only: {horses_summarized}")
+
+        input_tokens = 0
+        output_tokens = 0
+        cached_tokens = 0
+        cost_usd = 0.0
+        first_token_at = []
+
+        # Run changed horses in parallel; each result is cached as soon as it arrives
+        failed = []
+        if jobs:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+                futures = {
+                    executor.submit(tracing.bind(self._analyze_horse), horse_prompt, structured,
+                                    first_token_at.append): (i, horse, fingerprint)
+                    for i, horse, horse_prompt, fingerprint in jobs
+                }
+
+                for future in as_completed(futures):
+                    i, horse, fingerprint = futures[future]
+                    completion = future.result()
+                    if not completion:
+                        # Keep the rest of the analysis; this horse gets its summary instead
+                        failed.append(i)
+                        analyses[i], horse_data[i] = self._summary_section(i, horse)
+                        continue
+
+                    entry = {}
+                    if structured:
+                        horse_data[i] = completion['data']
+                        analyses[i] = render_horse_markdown(completion['data'])
+                        entry['structured'] = completion['data']
+                    else:
+                        analyses[i] = completion['text'].strip()
+                    entry['analysis'] = analyses[i]
+
+                    input_tokens += completion['input_tokens']
+                    output_tokens += completion['output_tokens']
+                    cached_tokens += completion.get('cached_tokens', 0)
+                    cost_usd += completion['cost_usd']
+
+                    if self.cache:
+                        self.cache.set_horse_analysis(horse.get('horse_id', ''), fingerprint, entry)
+
+            if failed:
+                print(f"Per-horse analysis failed for {len(failed)} horse(s), using summaries: "
+                      f"{', '.join(str(horses[i].get('horse_number', i + 1)) for i in sorted(failed))}")
+
+        # Race-level comparison and ranking pass
+        ranking_prompt = create_ranking_prompt(race_data, analyses, custom_prompt, structured=structured)
+
+        try:
+            completion = self.analyzer.complete(
+                SYSTEM_PROMPT,
+                ranking_prompt,
+                schema=RANKING_SCHEMA if structured else None,
+                on_first_token=lambda: first_token_at.append(time.time())
+            )
+        except Exception as e:
+            print(f"Error in ranking pass: {e}")
+            return None
+
+        input_tokens += completion['input_tokens']
+        output_tokens += completion['output_tokens']
+        cached_tokens += completion.get('cached_tokens', 0)
+        cost_usd += completion['cost_usd']
+
+        if structured:
+            parsed = {
+                'comparison': render_comparison_markdown(completion['data'].get('comparisons', [])),
+                'ranking': render_ranking_markdown(completion['data'].get('ranking', []))
+            }
+        else:
+            parsed = self.analyzer._parse_response(completion['text'])
+
+        individual_analysis = "## 1. 個別馬分析\n\n" + "\n\n---\n\n".join(analyses)
+        raw_response = "\n\n".join([
+            individual_analysis,
+            parsed.get('comparison', ''),
+            parsed.get('ranking', '')
+        ])
+
+        elapsed_time = time.time() - start_time
+
+        print(f"Token usage - Input: {input_tokens}, Output: {output_tokens}, Total: {input_tokens + output_tokens}")
+        print(f"Response time: {elapsed_time:.2f}s")
+        print(f"Estimated cost: ${cost_usd:.4f}")
+
+        result = {
+            'raw_response': raw_response,
+            'individual_analysis': individual_analysis,
+            'comparison': parsed.get('comparison', ''),
+            'ranking': parsed.get('ranking', ''),
+            'tokens_used': {
+                'input': input_tokens,
+                'output': output_tokens,
+                'cached': cached_tokens,
+                'total': input_tokens + output_tokens
+            },
+            'cost_usd': cost_usd,
+            'response_time': elapsed_time,
+            'time_to_first_token': min(first_token_at) - start_time if first_token_at else None,
+            'model': completion['model'],
+            'provider': completion['provider'],
+            'llm_calls': len(jobs) + 1,
+            'horses_cached': horses_cached,
+            'horses_analyzed': len(jobs),
+            'horses_summarized': horses_summarized,
+            'horses_failed': len(failed)
+        }
+
+        if structured:
+            result['structured'] = {
+                'horses': horse_data,
+                'comparisons': completion['data'].get('comparisons', []),
+                'ranking': completion['data'].get('ranking', [])
+            }
+
+        return result
+
+    def _summary_section(self, i: int, horse: Dict):
+        """
+        Summary-only section of a horse that is not analyzed by the LLM
+
+        Args:
+            i: Index of the horse in race_data['horses']
+            horse: Horse dictionary
+
+        Returns:
+            Tuple of (markdown section, structured horse entry)
+        """
+        summary = format_horse_summary(i + 1, horse)
+        section = f"### {horse.get('horse_name', '')} ({horse.get('horse_number', '')})\n{summary}"
+        return section, {
+            'horse_number': horse.get('horse_number', ''),
+            'horse_name': horse.get('horse_name', ''),
+            'strengths': [],
+            'weaknesses': [],
+            'summary': summary
+        }
+
+    def _analyze_horse(self, horse_prompt: str, structured: bool = False,
+                       on_first_token_at: Optional[Callable[[float], None]] = None) -> Optional[Dict]:
+        """
+        Run the individual analysis for one horse
+
+        Args:
+            horse_prompt: Rendered per-horse prompt
+            structured: Request JSON schema output
+            on_first_token_at: Called with the wall time of the first output token
+
+        Returns:
+            Completion dictionary or None if the API call failed
+        """
+        try:
+            return self.analyzer.complete(
+                SYSTEM_PROMPT,
+                horse_prompt,
+                self.horse_max_tokens,
+                schema=HORSE_ANALYSIS_SCHEMA if structured else None,
+                on_first_token=(lambda: on_first_token_at(time.time())) if on_first_token_at else None
+            )
+        except Exception as e:
+            print(f"Error in per-horse analysis: {e}")
+            return None
@@ -0,0 +1,290 @@
+"""
+Pre-ranking of the field with a local numeric score
+Scores every runner from the scraped data (recent form, rest, jockey and
+pedigree rates) so only the top-N horses get full detail in the LLM prompt.
+"""
+
+import os
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .features import build_feature_table, to_matrix
+from .prompts import create_user_prompt
+from .tokens import count_tokens
+
+# Recent races used for the form score, newest first, with recency weights
+FORM_RACES = 5
+RECENCY_WEIGHTS = np.array([1.0, 0.8, 0.65, 0.5, 0.4])
+
+# Feature weights for the combined score (features are z-scored over the field)
+WEIGHTS = {
+    'position': 0.35,
+    'margin': 0.20,
+    'rest': 0.10,
+    'jockey': 0.20,
+    'sire': 0.10,
+    'dam': 0.05,
+}
+
+# Margins are capped so one blow-out race does not dominate the form score
+MARGIN_CAP_LENGTHS = 10.0
+
+NO_DATA_DAYS = 999
+
+# Output tokens assumed per section for the latency estimate of prerank_savings
+OUTPUT_TOKENS_PER_HORSE = 250    # Full individual analysis
+OUTPUT_TOKENS_PER_SUMMARY = 30   # Mention of a summary-only horse
+OUTPUT_TOKENS_RANKING = 600      # Comparison and ranking sections
+
+
+def build_features(horses: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Build per-feature arrays over the field
+
+    Args:
+        horses: Horse data dictionaries (as built by fetch_race_data_with_cache)
+
+    Returns:
+        Dictionary of feature name to float array of length len(horses)
+        (NaN where the horse has no data for the feature)
+    """
+    n = len(horses)
+    table = build_feature_table(horses, max_results=FORM_RACES)
+    positions = to_matrix(table, 'position', n, FORM_RACES)
+    margins = np.minimum(to_matrix(table, 'margin_lengths', n, FORM_RACES), MARGIN_CAP_LENGTHS)
+
+    days = np.full(n, np.nan)
+    jockey = np.full(n, np.nan)
+    parents = {'sire': np.full(n, np.nan), 'dam': np.full(n, np.nan)}
+
+    for i, horse in enumerate(horses):
+        days_since = horse.get('days_since_last_race', NO_DATA_DAYS)
+        if days_since < NO_DATA_DAYS:
+            days[i] = days_since
+
+        if horse.get('jockey_name', ''):
+            jockey[i] = horse.get('jockey_show_rate', 0)
+
+        for parent_type, values in parents.items():
+            counts = [horse.get(f'{parent_type}_{key}', 0) or 0
+                      for key in ('first', 'second', 'third', 'fourth_or_lower')]
+            total = sum(counts)
+            if total > 0:
+                values[i] = (counts[0] + counts[1] + counts[2]) / total * 100
+
+    weights = np.broadcast_to(RECENCY_WEIGHTS, positions.shape)
+
+    def weighted_mean(values: np.ndarray) -> np.ndarray:
+        mask = ~np.isnan(values)
+        total = np.where(mask, weights, 0.0).sum(axis=1)
+        summed = np.where(mask, values * weights, 0.0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, summed / np.where(total > 0, total, 1.0), np.nan)
+
+    # Higher is better for every feature
+    # Rest: about 3-12 weeks is treated as ideal; shorter or longer loses points
+    rest = -np.abs(np.log(np.clip(days, 7, 365) / 42.0))
+
+    return {
+        'position': -weighted_mean(positions),
+        'margin': -weighted_mean(margins),
+        'rest': rest,
+        'jockey': jockey,
+        'sire': parents['sire'],
+        'dam': parents['dam'],
+    }
+
+
+def score_horses(horses: List[Dict]) -> np.ndarray:
+    """
+    Compute the pre-ranking score for every horse
+
+    Each feature is z-scored over the field; missing values score as the field
+    average (0), so a horse is neither rewarded nor punished for missing data.
+
+    Args:
+        horses: Horse data dictionaries
+
+    Returns:
+        Score array in field order (higher is better)
+    """
+    if not horses:
+        return np.zeros(0)
+
+    features = build_features(horses)
+    scores = np.zeros(len(horses))
+
+    for name, weight in WEIGHTS.items():
+        values = features[name]
+        mask = ~np.isnan(values)
+        if mask.sum() < 2:
+            continue
+
+        mean = values[mask].mean()
+        std = values[mask].std()
+        if std == 0:
+            continue
+
+        scores += weight * np.where(mask, (values - mean) / std, 0.0)
+
+    return scores
+
+
+def prerank_race(race_data: Dict, top_n: Optional[int] = None) -> Dict:
+    """
+    Score the field and mark which horses get full detail in the prompt
+
+    Args:
+        race_data: Dictionary containing race and horse information
+        top_n: Horses to keep in full detail (defaults to PRERANK_TOP_N;
+               0 or a value >= field size keeps everyone)
+
+    Returns:
+        Copy of race_data whose horses carry prerank_score, prerank_rank and
+        prerank_summary (True = one-line summary only), plus a 'prerank' entry
+        with top_n, summarized count and scoring time
+    """
+    if top_n is None:
+        top_n = int(os.getenv('PRERANK_TOP_N', '0'))
+
+    horses = race_data.get('horses', [])
+
+    start_time = time.perf_counter()
+    scores = score_horses(horses)
+    # Stable sort keeps field order for equal scores
+    order = np.argsort(-scores, kind='stable')
+    ranks = np.empty(len(horses), dtype=int)
+    ranks[order] = np.arange(1, len(horses) + 1)
+    elapsed = time.perf_counter() - start_time
+
+    keep_all = top_n <= 0 or top_n >= len(horses)
+    ranked = []
+    for i, horse in enumerate(horses):
+        ranked.append({
+            **horse,
+            'prerank_score': round(float(scores[i]), 3),
+            'prerank_rank': int(ranks[i]),
+            'prerank_summary': bool(not keep_all and ranks[i] > top_n)
+        })
+
+    summarized = sum(1 for horse in ranked if horse['prerank_summary'])
+    print(f"Pre-ranking - Full detail: {len(ranked) - summarized}, Summary only: {summarized}, "
+          f"Scoring time: {elapsed * 1000:.2f}ms")
+
+    return {
+        **race_data,
+        'horses': ranked,
+        'prerank': {
+            'top_n': top_n,
+            'summarized': summarized,
+            'scoring_ms': elapsed * 1000
+        }
+    }
+
+
+def estimate_call_seconds(input_tokens: int, output_tokens: int) -> Tuple[float, float]:
+    """
+    Estimate the latency of one LLM call
+
+    Time to first token is a fixed overhead plus prefill of the prompt; the
+    rest of the call is generating the output at a steady rate. Rates come
+    from LATENCY_BASE_TTFT_SECONDS, LATENCY_PREFILL_TOKENS_PER_SECOND and
+    LATENCY_OUTPUT_TOKENS_PER_SECOND (check them against the ledger's ttft
+    and latency percentiles).
+
+    Args:
+        input_tokens: Prompt tokens
+        output_tokens: Generated tokens
+
+    Returns:
+        Tuple of (time to first token, total seconds)
+    """
+    base_ttft = float(os.getenv('LATENCY_BASE_TTFT_SECONDS', '1.0'))
+    prefill_rate = float(os.getenv('LATENCY_PREFILL_TOKENS_PER_SECOND', '4000'))
+    output_rate = float(os.getenv('LATENCY_OUTPUT_TOKENS_PER_SECOND', '60'))
+
+    ttft = base_ttft + input_tokens / prefill_rate
+    return ttft, ttft + output_tokens / output_rate
+
+
+def estimate_analysis_seconds(prompt_tokens: int, detailed: int, summarized: int,
+                              analysis_mode: str = 'single', max_workers: int = 6) -> Tuple[float, float]:
+    """
+    Estimate the latency of one analysis
+
+    Args:
+        prompt_tokens: Tokens of the race prompt (create_user_prompt)
+        detailed: Horses in full detail
+        summarized: Horses reduced to a summary line
+        analysis_mode: "single" (one call) or "incremental" (one call per
+            detailed horse on max_workers threads, then a ranking call)
+        max_workers: Parallel per-horse calls (ANALYSIS_MAX_WORKERS)
+
+    Returns:
+        Tuple of (time to first token, total seconds)
+    """
+    horses = detailed + summarized
+    if analysis_mode != 'incremental':
+        output_tokens = (detailed * OUTPUT_TOKENS_PER_HORSE + summarized * OUTPUT_TOKENS_PER_SUMMARY
+                         + OUTPUT_TOKENS_RANKING)
+        return estimate_call_seconds(prompt_tokens, output_tokens)
+
+    # Each horse call carries about its share of the race prompt
+    horse_ttft, horse_seconds = estimate_call_seconds(prompt_tokens // max(1, horses), OUTPUT_TOKENS_PER_HORSE)
+    rounds = math.ceil(detailed / max(1, max_workers))
+    ranking_input = detailed * OUTPUT_TOKENS_PER_HORSE + summarized * OUTPUT_TOKENS_PER_SUMMARY
+    ranking_ttft, ranking_seconds = estimate_call_seconds(ranking_input, OUTPUT_TOKENS_RANKING)
+
+    ttft = horse_ttft if detailed else ranking_ttft
+    return ttft, rounds * horse_seconds + ranking_seconds
+
+
+def prerank_savings(race_data: Dict, ranked_race_data: Dict, compact: bool = False,
+                    analysis_mode: str = 'single', max_workers: int = 6) -> Dict:
+    """
+    Estimate the prompt size and latency saved by pre-ranking
+
+    Latency is an estimate (see estimate_analysis_seconds), not a measurement.
+
+    Args:
+        race_data: Race data before pre-ranking
+        ranked_race_data: Result of prerank_race
+        compact: Compare compact encodings instead of Markdown
+        analysis_mode: ANALYSIS_MODE the analysis runs with
+        max_workers: Parallel per-horse calls in incremental mode
+
+    Returns:
+        Dictionary containing:
+        - full_tokens: int - Prompt tokens with every horse in full detail
+        - ranked_tokens: int - Prompt tokens after pre-ranking
+        - saved_tokens: int - Difference
+        - saved_ratio: float - saved_tokens / full_tokens
+        - horses_summarized: int - Horses reduced to a summary line
+        - full_ttft, ranked_ttft: float - Estimated seconds to the first token
+        - full_seconds, ranked_seconds: float - Estimated analysis latency
+        - saved_seconds: float - Difference
+    """
+    full_tokens = count_tokens(create_user_prompt(race_data, compact=compact))
+    ranked_tokens = count_tokens(create_user_prompt(ranked_race_data, compact=compact))
+    saved_tokens = full_tokens - ranked_tokens
+
+    horses = len(race_data.get('horses', []))
+    summarized = ranked_race_data.get('prerank', {}).get('summarized', 0)
+    full_ttft, full_seconds = estimate_analysis_seconds(full_tokens, horses, 0, analysis_mode, max_workers)
+    ranked_ttft, ranked_seconds = estimate_analysis_seconds(
+        ranked_tokens, horses - summarized, summarized, analysis_mode, max_workers
+    )
+
+    return {
+        'full_tokens': full_tokens,
+        'ranked_tokens': ranked_tokens,
+        'saved_tokens': saved_tokens,
+        'saved_ratio': saved_tokens / full_tokens if full_tokens else 0.0,
+        'horses_summarized': summarized,
+        'full_ttft': full_ttft,
+        'ranked_ttft': ranked_ttft,
+        'full_seconds': full_seconds,
+        'ranked_seconds': ranked_seconds,
+        'saved_seconds': full_seconds - ranked_seconds
+    }
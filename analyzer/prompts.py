@@ -2,6 +2,10 @@
 Prompt templates for GPT-5 horse race analysis
 """
 
+from typing import Optional
+from keiba.race_id import track_name as race_track_name
+from .tokens import count_tokens, count_static_tokens
+
 SYSTEM_PROMPT = """あなたは競馬データ解析の専門家です。
 
 提供されるデータ:
@@ -53,212 +57,510 @@ def calculate_parent_stats(horse: dict, parent_type: str) -> dict:
     }
 
 
-def format_race_data(race_data: dict) -> str:
+# Static prompt sections are built once at import; per-horse sections are
+# rendered by compiled f-strings. Bump PROMPT_VERSION whenever the rendered
+# text changes.
+PROMPT_VERSION = "1"
+
+NO_RESULTS_ROW = "| - | - | - | - | - | - |"
+NO_JOCKEY = "- 騎手: データなし"
+
+CUSTOM_PROMPT_TEMPLATE = """# カスタム指示
+{custom_prompt}
+
+"""
+
+ANALYSIS_INSTRUCTIONS = """# 分析指示
+
+上記のデータに基づいて、以下の3つの観点で分析結果を提供してください:
+
+## 1. 個別馬分析
+各馬について、以下の形式で分析してください:
+
+### 馬名 (馬番)
+**強み**
+- [具体的な強み1]
+- [具体的な強み2]
+
+**弱点**
+- [具体的な弱点1]
+- [具体的な弱点2]
+
+**総合評価**
+[総合的なコメント]
+
+---
+
+## 2. 馬同士の比較
+注目すべき馬同士の比較分析を行ってください。
+特に上位候補となる馬について、どの馬が有利かを比較してください。
+馬名を記載する際は、必ず馬番も併記してください (例: 馬名(馬番))。
+
+---
+
+## 3. おすすめランキング
+上位5頭を推奨順にランキングしてください。
+各馬について、推奨理由を明確に記載してください。
+
+### 1位: [馬名] (馬番)
+**推奨理由**: [データに基づいた理由]
+
+### 2位: [馬名] (馬番)
+**推奨理由**: [データに基づいた理由]
+
+(以下同様に5位まで)"""
+
+HORSE_INSTRUCTIONS_TEMPLATE = """# 分析指示
+
+上記の1頭について、以下の形式で個別分析のみを提供してください:
+
+### {horse_name} ({horse_number})
+**強み**
+- [具体的な強み1]
+- [具体的な強み2]
+
+**弱点**
+- [具体的な弱点1]
+- [具体的な弱点2]
+
+**総合評価**
+[総合的なコメント]"""
+
+RANKING_INSTRUCTIONS = """# 分析指示
+
+上記の個別馬分析に基づいて、以下の2つの観点で分析結果を提供してください:
+
+## 2. 馬同士の比較
+注目すべき馬同士の比較分析を行ってください。
+特に上位候補となる馬について、どの馬が有利かを比較してください。
+馬名を記載する際は、必ず馬番も併記してください (例: 馬名(馬番))。
+
+---
+
+## 3. おすすめランキング
+上位5頭を推奨順にランキングしてください。
+各馬について、推奨理由を明確に記載してください。
+
+### 1位: [馬名] (馬番)
+**推奨理由**: [データに基づいた理由]
+
+### 2位: [馬名] (馬番)
+**推奨理由**: [データに基づいた理由]
+
+(以下同様に5位まで)"""
+
+STRUCTURED_ANALYSIS_INSTRUCTIONS = """# 分析指示
+
+上記のデータに基づいて、指定されたJSONスキーマの形式で分析結果を提供してください:
+
+- horses: 全出走馬について、具体的な強み・弱点 (各2つ以上) と総合評価
+- comparisons: 注目すべき馬同士の比較。特に上位候補となる馬について、どの馬が有利か
+- ranking: 上位5頭を推奨順に、データに基づいた推奨理由とともに"""
+
+STRUCTURED_HORSE_INSTRUCTIONS = """# 分析指示
+
+上記の1頭について、指定されたJSONスキーマの形式で個別分析のみを提供してください。
+強み・弱点はそれぞれ具体的に2つ以上挙げてください。"""
+
+STRUCTURED_RANKING_INSTRUCTIONS = """# 分析指示
+
+上記の個別馬分析に基づいて、指定されたJSONスキーマの形式で分析結果を提供してください:
+
+- comparisons: 注目すべき馬同士の比較。特に上位候補となる馬について、どの馬が有利か
+- ranking: 上位5頭を推奨順に、データに基づいた推奨理由とともに"""
+
+SUMMARY_SECTION_HEADER = """# 事前評価下位の出走馬 (要約のみ)
+以下の馬は事前スコアで下位と判定されたため要約のみです。個別分析は1〜2行の簡潔な評価で構いません。
+
+"""
+
+
+def format_race_header(race_data: dict) -> str:
     """
-    Format race data for LLM consumption according to LLM_PROMPT.md
+    Format the race information block shared by every prompt
 
     Args:
-        race_data: Dictionary containing race and horse information
+        race_data: Dictionary containing race information
 
     Returns:
-        Formatted string with race data
+        Formatted race information string
     """
-    output = []
+    get = race_data.get
+
+    # Use track_name from race_data if available, otherwise decode it from race_id
+    return (
+        f"# レース情報\n"
+        f"- 競馬場: {get('track_name') or race_track_name(get('race_id', ''))}\n"
+        f"- レース名: {get('race_name', '')}\n"
+        f"- 距離: {get('distance', '')}\n"
+        f"- 馬場: {get('track_type', '')}\n"
+        f"\n"
+        f"---\n"
+    )
+
+
+def _format_parent(horse: dict, parent_type: str, label: str) -> str:
+    """Format the sire or dam block of a horse section"""
+    get = horse.get
+    name = get(f'{parent_type}_name', '')
+    if not name:
+        return f"#### {label}: データなし"
+
+    stats = calculate_parent_stats(horse, parent_type)
+    if stats['total'] == 0:
+        return f"#### {label}: {name}\n- 成績: データなし"
+
+    return (
+        f"#### {label}: {name}\n"
+        f"- 成績: 1着{get(f'{parent_type}_first', 0)}回、2着{get(f'{parent_type}_second', 0)}回、"
+        f"3着{get(f'{parent_type}_third', 0)}回、4着以下{get(f'{parent_type}_fourth_or_lower', 0)}回 "
+        f"(総戦数: {stats['total']}戦)\n"
+        f"- 勝率: {stats['win_rate']}% | 複勝率: {stats['place_rate']}%"
+    )
+
+
+def _format_result_row(result: dict) -> str:
+    """Format one row of the past results table"""
+    get = result.get
+    return (
+        f"| {get('date', '-')} | {get('track', '-')} | {get('distance', '-')} | "
+        f"{get('position', '-')}着 | {get('time', '-')} | {get('margin', '-')} |"
+    )
+
+
+def format_horse_section(index: int, horse: dict) -> str:
+    """
+    Format one horse's data block
 
-    # レース情報
-    race_id = race_data.get('race_id', '')
-    # Use track_name from race_data if available, otherwise extract from race_id
-    track_name = race_data.get('track_name', '')
+    All conditional parts are resolved first, then the section is rendered
+    by a single compiled f-string.
 
-    output.append("# レース情報")
-    output.append(f"- 競馬場: {track_name}")
-    output.append(f"- レース名: {race_data.get('race_name', '')}")
-    output.append(f"- 距離: {race_data.get('distance', '')}")
-    output.append(f"- 馬場: {race_data.get('track_type', '')}")
-    output.append("")
-    output.append("---")
-    output.append("")
+    Args:
+        index: 1-based position of the horse in the field
+        horse: Horse data dictionary
 
-    # 出走馬データ
-    output.append("# 出走馬データ")
-    output.append("")
+    Returns:
+        Formatted horse data string
+    """
+    get = horse.get
+
+    days = get('days_since_last_race', 999)
+    days_text = f"{days}日" if days < 999 else "データなし"
+
+    recent_results = get('recent_results', [])
+    if recent_results:
+        results = "\n".join([_format_result_row(result) for result in recent_results[:5]])
+    else:
+        results = NO_RESULTS_ROW
+
+    jockey_name = get('jockey_name', '')
+    if jockey_name:
+        jockey = (
+            f"- 騎手: {jockey_name}\n"
+            f"- 勝率: {get('jockey_win_rate', 0):.1f}%\n"
+            f"- 連対率: {get('jockey_place_rate', 0):.1f}%\n"  # 連対率 (1着+2着)
+            f"- 複勝率: {get('jockey_show_rate', 0):.1f}%"      # 複勝率 (1着+2着+3着)
+        )
+    else:
+        jockey = NO_JOCKEY
+
+    return (
+        f"## {index}. {get('horse_name', '')} (枠番: {get('frame_number', '')}, 馬番: {get('horse_number', '')})\n"
+        f"\n"
+        f"### 基本情報\n"
+        f"- 前走からの期間: {days_text}\n"
+        f"\n"
+        f"### 過去成績 (最新5走)\n"
+        f"\n"
+        f"| 日付 | 競馬場 | 距離 | 着順 | タイム | 着差 |\n"
+        f"|------|--------|------|------|--------|------|\n"
+        f"{results}\n"
+        f"\n"
+        f"### 騎手情報\n"
+        f"{jockey}\n"
+        f"\n"
+        f"### 血統情報\n"
+        f"\n"
+        f"{_format_parent(horse, 'sire', '父馬')}\n"
+        f"\n"
+        f"{_format_parent(horse, 'dam', '母馬')}\n"
+        f"\n"
+        f"---\n"
+    )
+
+
+def format_horse_summary(index: int, horse: dict) -> str:
+    """
+    Format a one-line summary for a horse outside the pre-ranking top N
 
-    horses = race_data.get('horses', [])
+    Args:
+        index: 1-based position of the horse in the field
+        horse: Horse data dictionary
 
-    for i, horse in enumerate(horses, 1):
-        output.append(f"## {i}. {horse.get('horse_name', '')} (枠番: {horse.get('frame_number', '')}, 馬番: {horse.get('horse_number', '')})")
-        output.append("")
+    Returns:
+        Formatted summary line
+    """
+    get = horse.get
 
-        # 基本情報
-        output.append("### 基本情報")
-        days = horse.get('days_since_last_race', 999)
-        if days < 999:
-            output.append(f"- 前走からの期間: {days}日")
-        else:
-            output.append("- 前走からの期間: データなし")
-        output.append("")
+    days = get('days_since_last_race', 999)
+    days_text = f"{days}日" if days < 999 else "-"
+    positions = "-".join(str(result.get('position', '-') or '-')
+                         for result in get('recent_results', [])[:5]) or "-"
+    jockey = f"{get('jockey_name', '')} 複勝率{get('jockey_show_rate', 0):.1f}%" if get('jockey_name', '') else "-"
 
-        # 過去成績 (最新5走)
-        output.append("### 過去成績 (最新5走)")
-        output.append("")
-        output.append("| 日付 | 競馬場 | 距離 | 着順 | タイム | 着差 |")
-        output.append("|------|--------|------|------|--------|------|")
+    return (
+        f"- {index}. {get('horse_name', '')} (馬番: {get('horse_number', '')}) | "
+        f"事前評価: {get('prerank_rank', '-')}位 | 前走から: {days_text} | 近走着順: {positions} | "
+        f"騎手: {jockey} | 父: {get('sire_name', '') or '-'}"
+    )
 
-        recent_results = horse.get('recent_results', [])
-        for result in recent_results[:5]:
-            date = result.get('date', '-')
-            track = result.get('track', '-')
-            distance = result.get('distance', '-')
-            position = result.get('position', '-')
-            time = result.get('time', '-')
-            margin = result.get('margin', '-')
 
-            output.append(f"| {date} | {track} | {distance} | {position}着 | {time} | {margin} |")
+def format_race_data(race_data: dict) -> str:
+    """
+    Format race data for LLM consumption according to LLM_PROMPT.md
 
-        # データがない場合
-        if not recent_results:
-            output.append("| - | - | - | - | - | - |")
+    Horses marked prerank_summary get a one-line summary instead of a full
+    data block.
 
-        output.append("")
+    Args:
+        race_data: Dictionary containing race and horse information
 
-        # 騎手情報
-        output.append("### 騎手情報")
-        jockey_name = horse.get('jockey_name', '')
-        jockey_win_rate = horse.get('jockey_win_rate', 0)
-        jockey_place_rate = horse.get('jockey_place_rate', 0)  # 連対率 (1着+2着)
-        jockey_show_rate = horse.get('jockey_show_rate', 0)    # 複勝率 (1着+2着+3着)
-
-        if jockey_name:
-            output.append(f"- 騎手: {jockey_name}")
-            output.append(f"- 勝率: {jockey_win_rate:.1f}%")
-            output.append(f"- 連対率: {jockey_place_rate:.1f}%")
-            output.append(f"- 複勝率: {jockey_show_rate:.1f}%")
+    Returns:
+        Formatted string with race data
+    """
+    sections = []
+    summaries = []
+    for i, horse in enumerate(race_data.get('horses', []), 1):
+        if horse.get('prerank_summary'):
+            summaries.append(format_horse_summary(i, horse))
         else:
-            output.append("- 騎手: データなし")
+            sections.append(format_horse_section(i, horse))
 
-        output.append("")
+    if summaries:
+        sections.append(SUMMARY_SECTION_HEADER + "\n".join(summaries) + "\n")
 
-        # 血統情報
-        output.append("### 血統情報")
-        output.append("")
+    return "\n".join([format_race_header(race_data), "# 出走馬データ", "", *sections])
 
-        # 父馬
-        sire_name = horse.get('sire_name', '')
-        if sire_name:
-            output.append(f"#### 父馬: {sire_name}")
 
-            sire_stats = calculate_parent_stats(horse, 'sire')
+# Compact encoding degradation steps, tried in order until the budget fits:
+# (past races per horse, pedigree detail level)
+# Pedigree level 2: sire and dam tables, 1: sire table only, 0: names only
+COMPACT_LEVELS = [
+    (5, 2), (4, 2), (3, 2), (3, 1), (2, 1), (1, 1), (1, 0), (0, 0)
+]
 
-            if sire_stats['total'] > 0:
-                first = horse.get('sire_first', 0)
-                second = horse.get('sire_second', 0)
-                third = horse.get('sire_third', 0)
-                fourth_or_lower = horse.get('sire_fourth_or_lower', 0)
+COMPACT_LEGEND = (
+    "凡例: 番=馬番 枠=枠番 間=前走からの日数 勝/連/複=勝率/連対率/複勝率(%) "
+    "成績=1着-2着-3着-4着以下 着=着順 差=着差 -=データなし"
+)
 
-                output.append(f"- 成績: 1着{first}回、2着{second}回、3着{third}回、4着以下{fourth_or_lower}回 (総戦数: {sire_stats['total']}戦)")
 
-                if sire_stats['win_rate'] is not None:
-                    output.append(f"- 勝率: {sire_stats['win_rate']}% | 複勝率: {sire_stats['place_rate']}%")
-                else:
-                    output.append("- 勝率: データなし | 複勝率: データなし")
-            else:
-                output.append("- 成績: データなし")
-        else:
-            output.append("#### 父馬: データなし")
+def _parent_row(horse: dict, parent_type: str) -> str:
+    """Format one row of the compact pedigree table"""
+    stats = calculate_parent_stats(horse, parent_type)
+    if stats['total'] == 0:
+        return f"{horse.get(f'{parent_type}_name', '')}|-|-|-"
 
-        output.append("")
+    record = "-".join(str(horse.get(f'{parent_type}_{key}', 0))
+                      for key in ('first', 'second', 'third', 'fourth_or_lower'))
 
-        # 母馬
-        dam_name = horse.get('dam_name', '')
-        if dam_name:
-            output.append(f"#### 母馬: {dam_name}")
+    return f"{horse.get(f'{parent_type}_name', '')}|{record}|{stats['win_rate']}|{stats['place_rate']}"
 
-            dam_stats = calculate_parent_stats(horse, 'dam')
 
-            if dam_stats['total'] > 0:
-                first = horse.get('dam_first', 0)
-                second = horse.get('dam_second', 0)
-                third = horse.get('dam_third', 0)
-                fourth_or_lower = horse.get('dam_fourth_or_lower', 0)
+def _format_compact(race_data: dict, max_results: int, pedigree_level: int) -> str:
+    """
+    Format race data in the compact encoding at one degradation level
+
+    Args:
+        race_data: Dictionary containing race and horse information
+        max_results: Past races to include per horse
+        pedigree_level: 2 = sire and dam tables, 1 = sire table, 0 = names only
+
+    Returns:
+        Formatted string with race data
+    """
+    horses = race_data.get('horses', [])
+    output = []
 
-                output.append(f"- 成績: 1着{first}回、2着{second}回、3着{third}回、4着以下{fourth_or_lower}回 (総戦数: {dam_stats['total']}戦)")
+    track = race_data.get('track_name') or race_track_name(race_data.get('race_id', ''))
+    output.append("# レース情報")
+    output.append(f"{track}|{race_data.get('race_name', '')}|"
+                  f"{race_data.get('distance', '')}|{race_data.get('track_type', '')}")
+    output.append("")
+    output.append(COMPACT_LEGEND)
+    output.append("")
 
-                if dam_stats['win_rate'] is not None:
-                    output.append(f"- 勝率: {dam_stats['win_rate']}% | 複勝率: {dam_stats['place_rate']}%")
-                else:
-                    output.append("- 勝率: データなし | 複勝率: データなし")
-            else:
-                output.append("- 成績: データなし")
+    # One row per horse
+    output.append("# 出走馬")
+    output.append("番|枠|馬名|間|騎手|勝|連|複|父|母")
+    for horse in horses:
+        days = horse.get('days_since_last_race', 999)
+        if horse.get('jockey_name', ''):
+            jockey = (f"{horse.get('jockey_name', '')}|{horse.get('jockey_win_rate', 0):.1f}|"
+                      f"{horse.get('jockey_place_rate', 0):.1f}|{horse.get('jockey_show_rate', 0):.1f}")
         else:
-            output.append("#### 母馬: データなし")
+            jockey = "-|-|-|-"
+
+        output.append(
+            f"{horse.get('horse_number', '')}|{horse.get('frame_number', '')}|{horse.get('horse_name', '')}|"
+            f"{days if days < 999 else '-'}|{jockey}|"
+            f"{horse.get('sire_name', '') or '-'}|{horse.get('dam_name', '') or '-'}"
+        )
+    output.append("")
 
+    # Pedigree reference tables, one row per distinct parent
+    if pedigree_level >= 1:
+        parent_types = ['sire', 'dam'] if pedigree_level >= 2 else ['sire']
+        for parent_type in parent_types:
+            label = '父' if parent_type == 'sire' else '母'
+            rows = {}
+            for horse in horses:
+                name = horse.get(f'{parent_type}_name', '')
+                if name and name not in rows:
+                    rows[name] = _parent_row(horse, parent_type)
+
+            if rows:
+                output.append(f"# 血統 ({label})")
+                output.append(f"{label}|成績|勝|複")
+                output.extend(rows.values())
+                output.append("")
+
+    # One race-wide results table keyed by horse number
+    if max_results > 0:
+        output.append(f"# 過去成績 (新しい順, 最大{max_results}走)")
+        output.append("番|日付|場|距離|着|タイム|差")
+        for horse in horses:
+            if horse.get('prerank_summary'):
+                continue
+            number = horse.get('horse_number', '')
+            for result in horse.get('recent_results', [])[:max_results]:
+                output.append(
+                    f"{number}|{result.get('date', '-')}|{result.get('track', '-')}|"
+                    f"{result.get('distance', '-')}|{result.get('position', '-')}|"
+                    f"{result.get('time', '-')}|{result.get('margin', '-')}"
+                )
         output.append("")
-        output.append("---")
+
+    summarized = [str(horse.get('horse_number', '')) for horse in horses if horse.get('prerank_summary')]
+    if summarized:
+        output.append(f"事前評価下位のため過去成績省略 (簡潔な評価で可): 番 {','.join(summarized)}")
         output.append("")
 
     return "\n".join(output)
 
 
-def create_user_prompt(race_data: dict, custom_prompt: str = "") -> str:
+def format_race_data_compact(race_data: dict, token_budget: Optional[int] = None) -> str:
+    """
+    Format race data in the compact encoding, degrading to fit a token budget
+
+    Past races are trimmed first, then pedigree detail. If even the smallest
+    level exceeds the budget, the smallest level is returned.
+
+    Args:
+        race_data: Dictionary containing race and horse information
+        token_budget: Target token count (None = no limit, full detail)
+
+    Returns:
+        Formatted string with race data
+    """
+    formatted = ""
+
+    for max_results, pedigree_level in COMPACT_LEVELS:
+        formatted = _format_compact(race_data, max_results, pedigree_level)
+
+        if token_budget is None or count_tokens(formatted) <= token_budget:
+            return formatted
+
+    print(f"Warning: Compact race data exceeds token budget ({token_budget})")
+    return formatted
+
+
+def create_user_prompt(race_data: dict, custom_prompt: str = "", compact: bool = False,
+                       token_budget: Optional[int] = None, structured: bool = False) -> str:
     """
     Create user prompt for GPT-5
 
     Args:
         race_data: Dictionary containing race and horse information
         custom_prompt: Optional custom user instructions
+        compact: Use the compact race data encoding
+        token_budget: Target token count for the whole prompt (compact only)
+        structured: Ask for JSON schema output instead of Markdown
+
+    Returns:
+        Formatted user prompt string
+    """
+    static_instructions = STRUCTURED_ANALYSIS_INSTRUCTIONS if structured else ANALYSIS_INSTRUCTIONS
+
+    custom = ""
+    if custom_prompt:
+        custom = CUSTOM_PROMPT_TEMPLATE.format(custom_prompt=custom_prompt)
+    instructions = custom + static_instructions
+
+    if compact:
+        data_budget = None
+        if token_budget is not None:
+            data_budget = token_budget - count_static_tokens(static_instructions) - count_tokens(custom)
+        formatted_data = format_race_data_compact(race_data, data_budget)
+    else:
+        formatted_data = format_race_data(race_data)
+
+    return formatted_data + "\n" + instructions
+
+
+def create_horse_prompt(race_data: dict, index: int, horse: dict, structured: bool = False) -> str:
+    """
+    Create user prompt for a single horse's individual analysis
+
+    The custom prompt is deliberately not included so the result can be
+    reused across custom prompt changes.
+
+    Args:
+        race_data: Dictionary containing race information
+        index: 1-based position of the horse in the field
+        horse: Horse data dictionary
+        structured: Ask for JSON schema output instead of Markdown
 
     Returns:
         Formatted user prompt string
     """
-    formatted_data = format_race_data(race_data)
+    if structured:
+        instructions = STRUCTURED_HORSE_INSTRUCTIONS
+    else:
+        instructions = HORSE_INSTRUCTIONS_TEMPLATE.format(
+            horse_name=horse.get('horse_name', ''),
+            horse_number=horse.get('horse_number', '')
+        )
+
+    return "\n".join([
+        format_race_header(race_data),
+        "# 出走馬データ",
+        "",
+        format_horse_section(index, horse),
+        instructions
+    ])
+
+
+def create_ranking_prompt(race_data: dict, horse_analyses: list, custom_prompt: str = "",
+                          structured: bool = False) -> str:
+    """
+    Create user prompt for the race-level comparison and ranking pass
 
-    prompt_parts = [formatted_data]
+    Args:
+        race_data: Dictionary containing race information
+        horse_analyses: Individual analysis text for each horse, in field order
+        custom_prompt: Optional custom user instructions
+        structured: Ask for JSON schema output instead of Markdown
+
+    Returns:
+        Formatted user prompt string
+    """
+    analyses = "".join(f"{analysis.strip()}\n\n" for analysis in horse_analyses)
 
-    # Add custom instructions if provided
+    custom = ""
     if custom_prompt:
-        prompt_parts.append("# カスタム指示")
-        prompt_parts.append(custom_prompt)
-        prompt_parts.append("")
-
-    # Add output format instructions
-    prompt_parts.append("# 分析指示")
-    prompt_parts.append("")
-    prompt_parts.append("上記のデータに基づいて、以下の3つの観点で分析結果を提供してください:")
-    prompt_parts.append("")
-    prompt_parts.append("## 1. 個別馬分析")
-    prompt_parts.append("各馬について、以下の形式で分析してください:")
-    prompt_parts.append("")
-    prompt_parts.append("### 馬名 (馬番)")
-    prompt_parts.append("**強み**")
-    prompt_parts.append("- [具体的な強み1]")
-    prompt_parts.append("- [具体的な強み2]")
-    prompt_parts.append("")
-    prompt_parts.append("**弱点**")
-    prompt_parts.append("- [具体的な弱点1]")
-    prompt_parts.append("- [具体的な弱点2]")
-    prompt_parts.append("")
-    prompt_parts.append("**総合評価**")
-    prompt_parts.append("[総合的なコメント]")
-    prompt_parts.append("")
-    prompt_parts.append("---")
-    prompt_parts.append("")
-    prompt_parts.append("## 2. 馬同士の比較")
-    prompt_parts.append("注目すべき馬同士の比較分析を行ってください。")
-    prompt_parts.append("特に上位候補となる馬について、どの馬が有利かを比較してください。")
-    prompt_parts.append("馬名を記載する際は、必ず馬番も併記してください (例: 馬名(馬番))。")
-    prompt_parts.append("")
-    prompt_parts.append("---")
-    prompt_parts.append("")
-    prompt_parts.append("## 3. おすすめランキング")
-    prompt_parts.append("上位5頭を推奨順にランキングしてください。")
-    prompt_parts.append("各馬について、推奨理由を明確に記載してください。")
-    prompt_parts.append("")
-    prompt_parts.append("### 1位: [馬名] (馬番)")
-    prompt_parts.append("**推奨理由**: [データに基づいた理由]")
-    prompt_parts.append("")
-    prompt_parts.append("### 2位: [馬名] (馬番)")
-    prompt_parts.append("**推奨理由**: [データに基づいた理由]")
-    prompt_parts.append("")
-    prompt_parts.append("(以下同様に5位まで)")
-
-    return "\n".join(prompt_parts)
+        custom = CUSTOM_PROMPT_TEMPLATE.format(custom_prompt=custom_prompt)
+
+    instructions = STRUCTURED_RANKING_INSTRUCTIONS if structured else RANKING_INSTRUCTIONS
+
+    return f"{format_race_header(race_data)}\n# 個別馬分析\n\n{analyses}{custom}{instructions}"
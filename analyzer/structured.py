@@ -0,0 +1,188 @@
+"""
+Structured (JSON schema) analysis output
+Schemas passed to the LLM as a tool / response format, and local Markdown
+rendering of the structured result.
+"""
+
+import json
+from typing import Dict, List
+
+# Schemas follow OpenAI strict mode rules (every property required,
+# no additional properties), which Anthropic tool input schemas also accept.
+
+HORSE_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'horse_number': {'type': 'integer', 'description': '馬番'},
+        'horse_name': {'type': 'string', 'description': '馬名'},
+        'strengths': {'type': 'array', 'items': {'type': 'string'}, 'description': '具体的な強み'},
+        'weaknesses': {'type': 'array', 'items': {'type': 'string'}, 'description': '具体的な弱点'},
+        'summary': {'type': 'string', 'description': '総合評価'}
+    },
+    'required': ['horse_number', 'horse_name', 'strengths', 'weaknesses', 'summary'],
+    'additionalProperties': False
+}
+
+COMPARISON_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string', 'description': '比較の見出し (例: 馬名(馬番) vs 馬名(馬番))'},
+        'horse_numbers': {'type': 'array', 'items': {'type': 'integer'}, 'description': '比較対象の馬番'},
+        'analysis': {'type': 'string', 'description': 'どの馬が有利かの比較分析'}
+    },
+    'required': ['title', 'horse_numbers', 'analysis'],
+    'additionalProperties': False
+}
+
+RANK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'rank': {'type': 'integer', 'description': '順位 (1-5)'},
+        'horse_number': {'type': 'integer', 'description': '馬番'},
+        'horse_name': {'type': 'string', 'description': '馬名'},
+        'reason': {'type': 'string', 'description': 'データに基づいた推奨理由'}
+    },
+    'required': ['rank', 'horse_number', 'horse_name', 'reason'],
+    'additionalProperties': False
+}
+
+RANKING_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'comparisons': {'type': 'array', 'items': COMPARISON_SCHEMA},
+        'ranking': {'type': 'array', 'items': RANK_SCHEMA, 'description': '上位5頭を推奨順に'}
+    },
+    'required': ['comparisons', 'ranking'],
+    'additionalProperties': False
+}
+
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'horses': {'type': 'array', 'items': HORSE_ANALYSIS_SCHEMA, 'description': '全出走馬の個別分析'},
+        'comparisons': RANKING_SCHEMA['properties']['comparisons'],
+        'ranking': RANKING_SCHEMA['properties']['ranking']
+    },
+    'required': ['horses', 'comparisons', 'ranking'],
+    'additionalProperties': False
+}
+
+TOOL_NAME = 'submit_analysis'
+TOOL_DESCRIPTION = '競馬レースの分析結果を提出する'
+
+
+def parse_structured(text: str) -> Dict:
+    """
+    Decode a JSON analysis response
+
+    Args:
+        text: JSON text returned by the model
+
+    Returns:
+        Decoded dictionary
+
+    Raises:
+        ValueError: If the text is not a JSON object
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Structured response is not a JSON object")
+    return data
+
+
+def render_horse_markdown(horse: Dict) -> str:
+    """
+    Render one horse's individual analysis as Markdown
+
+    Args:
+        horse: Horse analysis matching HORSE_ANALYSIS_SCHEMA
+
+    Returns:
+        Markdown string
+    """
+    lines = [f"### {horse.get('horse_name', '')} ({horse.get('horse_number', '')})", "**強み**"]
+    lines.extend(f"- {item}" for item in horse.get('strengths', []))
+    lines.append("")
+    lines.append("**弱点**")
+    lines.extend(f"- {item}" for item in horse.get('weaknesses', []))
+    lines.append("")
+    lines.append("**総合評価**")
+    lines.append(horse.get('summary', ''))
+
+    return "\n".join(lines)
+
+
+def render_comparison_markdown(comparisons: List[Dict]) -> str:
+    """
+    Render the comparison section as Markdown
+
+    Args:
+        comparisons: List of comparisons matching COMPARISON_SCHEMA
+
+    Returns:
+        Markdown string
+    """
+    lines = ["## 2. 馬同士の比較", ""]
+    for comparison in comparisons:
+        lines.append(f"### {comparison.get('title', '')}")
+        lines.append(comparison.get('analysis', ''))
+        lines.append("")
+
+    return "\n".join(lines).rstrip()
+
+
+def sorted_ranking(ranking: List[Dict], limit: int = 5) -> List[Dict]:
+    """
+    Order ranking entries by rank and keep the top entries
+
+    Args:
+        ranking: List of ranking entries matching RANK_SCHEMA
+        limit: Number of entries to keep
+
+    Returns:
+        Sorted ranking entries
+    """
+    return sorted(ranking, key=lambda entry: entry.get('rank', 99))[:limit]
+
+
+def render_ranking_markdown(ranking: List[Dict]) -> str:
+    """
+    Render the ranking section as Markdown
+
+    Args:
+        ranking: List of ranking entries matching RANK_SCHEMA
+
+    Returns:
+        Markdown string
+    """
+    lines = ["## 3. おすすめランキング", ""]
+    for entry in sorted_ranking(ranking):
+        lines.append(f"### {entry.get('rank', '')}位: {entry.get('horse_name', '')} ({entry.get('horse_number', '')})")
+        lines.append(f"**推奨理由**: {entry.get('reason', '')}")
+        lines.append("")
+
+    return "\n".join(lines).rstrip()
+
+
+def render_markdown(data: Dict) -> Dict[str, str]:
+    """
+    Render a full structured analysis as Markdown sections
+
+    Args:
+        data: Analysis matching ANALYSIS_SCHEMA
+
+    Returns:
+        Dictionary with individual, comparison, ranking and raw Markdown
+    """
+    individual = "## 1. 個別馬分析\n\n" + "\n\n---\n\n".join(
+        render_horse_markdown(horse) for horse in data.get('horses', [])
+    )
+    comparison = render_comparison_markdown(data.get('comparisons', []))
+    ranking = render_ranking_markdown(data.get('ranking', []))
+
+    return {
+        'individual': individual,
+        'comparison': comparison,
+        'ranking': ranking,
+        'raw': "\n\n".join([individual, comparison, ranking])
+    }
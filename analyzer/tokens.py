@@ -0,0 +1,140 @@
+"""
+Token counting service shared by the analyzers
+Loads tokenizer encodings once and provides a fast approximation for
+Japanese prompts when no exact tokenizer is available.
+"""
+
+import threading
+import importlib.util
+from functools import lru_cache
+from typing import Optional
+
+# tiktoken itself is imported in get_encoding(): it pulls in regex and its
+# native extension, which adds noticeably to app start-up
+TIKTOKEN_AVAILABLE = importlib.util.find_spec('tiktoken') is not None
+
+
+# Approximate characters per token by character class
+# 1 token ≈ 0.75 English words or 0.5 Japanese characters
+WIDE_CHARS_PER_TOKEN = 2
+NARROW_CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    Get the tiktoken encoding, loading it on first use only
+
+    Returns:
+        tiktoken Encoding (o200k_base, falling back to cl100k_base) or None
+        if tiktoken is not available
+    """
+    global _encoding, _encoding_loaded
+
+    if _encoding_loaded:
+        return _encoding
+
+    with _encoding_lock:
+        if not _encoding_loaded:
+            if TIKTOKEN_AVAILABLE:
+                try:
+                    import tiktoken
+                    # Use o200k_base encoding (used by GPT-4o and newer models)
+                    try:
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                    except Exception:
+                        _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"Tiktoken encoding failed to load, using approximation: {e}")
+                    _encoding = None
+            _encoding_loaded = True
+
+    return _encoding
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Approximate token count from character classes
+
+    Non-ASCII characters are counted as wide (Japanese) characters. The
+    class split is done by a single C-level encode instead of a per-character
+    Python loop.
+
+    Args:
+        text: Input text
+
+    Returns:
+        Approximate token count
+    """
+    if not text:
+        return 0
+
+    narrow_chars = len(text.encode('ascii', 'ignore'))
+    wide_chars = len(text) - narrow_chars
+
+    return int(wide_chars / WIDE_CHARS_PER_TOKEN + narrow_chars / NARROW_CHARS_PER_TOKEN)
+
+
+def count_tokens(text: str, exact: bool = True) -> int:
+    """
+    Count tokens for text
+
+    Args:
+        text: Input text
+        exact: Use the tiktoken encoding when available
+
+    Returns:
+        Token count (exact when tiktoken is available and exact=True)
+    """
+    if exact:
+        encoding = get_encoding()
+        if encoding is not None:
+            try:
+                return len(encoding.encode(text))
+            except Exception as e:
+                print(f"Tiktoken encoding failed, using fallback: {e}")
+
+    return approximate_tokens(text)
+
+
+@lru_cache(maxsize=64)
+def count_static_tokens(text: str, exact: bool = True) -> int:
+    """
+    Count tokens for a static prompt part, memoized by content
+
+    Args:
+        text: Static prompt text (system prompt, instruction blocks)
+        exact: Use the tiktoken encoding when available
+
+    Returns:
+        Token count
+    """
+    return count_tokens(text, exact)
+
+
+def estimate_prompt_tokens(system_prompt: str, user_prompt: str, exact: bool = True,
+                           static_parts: Optional[tuple] = None) -> int:
+    """
+    Estimate tokens for a full request
+
+    The system prompt and any static parts are counted once and cached;
+    only the dynamic user prompt is tokenized per call.
+
+    Args:
+        system_prompt: System prompt (static)
+        user_prompt: User prompt (dynamic part)
+        exact: Use the tiktoken encoding when available
+        static_parts: Additional static strings sent with the request
+
+    Returns:
+        Token count
+    """
+    total = count_static_tokens(system_prompt, exact) + count_tokens(user_prompt, exact)
+
+    for part in static_parts or ():
+        total += count_static_tokens(part, exact)
+
+    return total
@@ -23,13 +23,13 @@ def setup_environment():
 
 setup_environment()
 
-from scraper.race import RaceScraper
-from scraper.horse import HorseScraper
-from scraper.jockey import JockeyScraper
-from cache.dynamodb import DynamoDBCache
-from analyzer.gpt_analyzer import GPTAnalyzer
-from analyzer.claude_analyzer import ClaudeAnalyzer
-
+# Only light modules load with the login page; scrapers (requests/bs4), the
+# DynamoDB cache (boto3), numpy and the LLM SDKs are imported in main() after
+# authentication (see benchmarks/bench_imports.py)
+from scraper.scheduler import INTERACTIVE, fetch_priority
+from utils import tracing
+from utils.metrics import start_metrics_server, track_session
+from utils.profiling import profile, profiling_requested
 
 def check_authentication():
     """Check if user is authenticated"""
@@ -50,129 +50,131 @@ def check_authentication():
         st.stop()
 
 
-def fetch_race_data_with_cache(race_id: str, cache: DynamoDBCache, track_name: str = None) -> dict:
+def fetch_race_data_with_cache(race_id: str, cache: 'DynamoDBCache', track_name: str = None,
+                               history: 'HistoryStore' = None) -> dict:
     """
     Fetch complete race data with caching
 
     Args:
         race_id: Race identifier
         cache: DynamoDB cache instance
-        track_name: Track name (e.g., "東京", "中山") - optional, used for accurate track identification
+        track_name: Track name (e.g., "東京", "中山") - optional, overrides the track decoded from race_id
+        history: Optional HistoryStore that receives every scraped result row
 
     Returns:
         Complete race data dictionary
     """
-    race_scraper = RaceScraper()
-    horse_scraper = HorseScraper()
-    jockey_scraper = JockeyScraper()
-
-    # Check cache for race metadata
-    race_data = cache.get_race_metadata(race_id)
+    from keiba.planner import fetch_race_data
 
-    if not race_data:
+    # Race metadata (cache first)
+    race_errors = []
+    if not cache.get_race_metadata(race_id):
         st.info("レース情報を取得中...")
-        try:
-            race_data = race_scraper.fetch_race_details(race_id, track_name)
-
-            if not race_data:
-                st.error("レース情報の取得に失敗しました。レースIDが正しいか確認してください。")
-                return None
-
-            # Cache race metadata
-            cache.set_race_metadata(race_id, race_data)
-        except Exception as e:
-            st.error(f"レース情報の取得中にエラーが発生しました: {str(e)}")
-            return None
-
-    # Fetch detailed data for each horse
-    horses_detailed = []
-    total_horses = len(race_data.get('horses', []))
-
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
-    for idx, horse in enumerate(race_data.get('horses', [])):
-        horse_id = horse['horse_id']
-        jockey_id = horse['jockey_id']
-
-        # Show current processing status
-        status_text.text(f"馬データ取得中... ({idx + 1}/{total_horses} 完了)")
-        progress_bar.progress((idx + 1) / total_horses)
-
-        # Fetch horse results with cache
-        horse_results = cache.get_horse_results(horse_id)
-        if not horse_results:
-            try:
-                horse_results = horse_scraper.fetch_horse_results(horse_id)
-                if horse_results:
-                    cache.set_horse_results(horse_id, horse_results)
-            except Exception as e:
-                st.warning(f"馬 {horse.get('horse_name', horse_id)} の成績取得に失敗: {str(e)}")
-                horse_results = None
-
-        # Fetch parent horses with cache
-        parent_horses = cache.get_horse_parents(horse_id)
-        if not parent_horses:
-            try:
-                parent_horses = horse_scraper.fetch_parent_horses(horse_id)
-                if parent_horses:
-                    cache.set_horse_parents(horse_id, parent_horses)
-            except Exception as e:
-                st.warning(f"馬 {horse.get('horse_name', horse_id)} の血統情報取得に失敗: {str(e)}")
-                parent_horses = None
-
-        # Fetch jockey stats with cache
-        jockey_stats = cache.get_jockey_stats(jockey_id)
-        if not jockey_stats:
-            try:
-                jockey_stats = jockey_scraper.fetch_jockey_stats(jockey_id)
-                if jockey_stats:
-                    cache.set_jockey_stats(jockey_id, jockey_stats)
-            except Exception as e:
-                st.warning(f"騎手 {horse.get('jockey_name', jockey_id)} の統計取得に失敗: {str(e)}")
-                jockey_stats = None
-
-        # Combine all data
-        # Extract jockey stats from nested structure
-        jockey_overall_stats = jockey_stats.get('overall_stats', {}) if jockey_stats else {}
-
-        horse_detailed = {
-            **horse,
-            'recent_results': horse_results.get('recent_results', []) if horse_results else [],
-            'days_since_last_race': horse_results.get('days_since_last_race', 999) if horse_results else 999,
-            'jockey_win_rate': jockey_overall_stats.get('win_rate', 0),
-            'jockey_place_rate': jockey_overall_stats.get('place_rate', 0),  # 連対率 (1着+2着)
-            'jockey_show_rate': jockey_overall_stats.get('show_rate', 0),    # 複勝率 (1着+2着+3着)
-            'sire_name': parent_horses.get('sire', {}).get('name', '') if parent_horses else '',
-            'sire_earnings': parent_horses.get('sire', {}).get('earnings', '') if parent_horses else '',
-            'sire_first': parent_horses.get('sire', {}).get('first', 0) if parent_horses else 0,
-            'sire_second': parent_horses.get('sire', {}).get('second', 0) if parent_horses else 0,
-            'sire_third': parent_horses.get('sire', {}).get('third', 0) if parent_horses else 0,
-            'sire_fourth_or_lower': parent_horses.get('sire', {}).get('fourth_or_lower', 0) if parent_horses else 0,
-            'dam_name': parent_horses.get('dam', {}).get('name', '') if parent_horses else '',
-            'dam_earnings': parent_horses.get('dam', {}).get('earnings', '') if parent_horses else '',
-            'dam_first': parent_horses.get('dam', {}).get('first', 0) if parent_horses else 0,
-            'dam_second': parent_horses.get('dam', {}).get('second', 0) if parent_horses else 0,
-            'dam_third': parent_horses.get('dam', {}).get('third', 0) if parent_horses else 0,
-            'dam_fourth_or_lower': parent_horses.get('dam', {}).get('fourth_or_lower', 0) if parent_horses else 0
-        }
-
-        horses_detailed.append(horse_detailed)
+
+    progress_bar = None
+    status_text = None
+    names = {}
+    total_entities = [0]
+    completed = [0]
+
+    def on_graph(graph):
+        nonlocal progress_bar, status_text
+        for horse in graph.races[race_id].get('horses', []):
+            names[f"horse:{horse['horse_id']}"] = f"馬 {horse.get('horse_name', horse['horse_id'])} の成績取得"
+            names[f"parents:{horse['horse_id']}"] = f"馬 {horse.get('horse_name', horse['horse_id'])} の血統情報取得"
+            names[f"jockey:{horse['jockey_id']}"] = f"騎手 {horse.get('jockey_name', horse['jockey_id'])} の統計取得"
+        total_entities[0] = len(graph.entity_keys())
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+    def on_done(key, data, error, fetched):
+        completed[0] += 1
+        status_text.text(f"馬データ取得中... ({completed[0]}/{total_entities[0]} 完了)")
+        progress_bar.progress(min(completed[0] / max(total_entities[0], 1), 1.0))
+        if error is not None:
+            st.warning(f"{names.get(key, key)}に失敗: {str(error)}")
+
+    race_data = fetch_race_data(race_id, cache, track_name, history,
+                                on_error=race_errors.append, on_graph=on_graph, on_done=on_done)
+
+    if race_data is None:
+        if race_errors and race_errors[0] is not None:
+            st.error(f"レース情報の取得中にエラーが発生しました: {str(race_errors[0])}")
+        else:
+            st.error("レース情報の取得に失敗しました。レースIDが正しいか確認してください。")
+        return None
 
     # Show completion
+    horses = race_data['horses']
     progress_bar.progress(1.0)
-    status_text.text(f"馬データ取得完了! ({total_horses}/{total_horses} 完了)")
+    status_text.text(f"馬データ取得完了! ({len(horses)}/{len(horses)} 完了)")
 
     progress_bar.empty()
     status_text.empty()
 
-    race_data['horses'] = horses_detailed
+    return race_data
 
-    # Add track_name if provided
-    if track_name:
-        race_data['track_name'] = track_name
 
-    return race_data
+def create_analyzer(provider: str):
+    """
+    Create the analyzer for a provider, importing only that provider's SDK
+
+    Args:
+        provider: "claude" or "gpt"
+
+    Returns:
+        ClaudeAnalyzer or GPTAnalyzer instance
+    """
+    if provider == 'claude':
+        from analyzer.claude_analyzer import ClaudeAnalyzer
+        return ClaudeAnalyzer()
+
+    from analyzer.gpt_analyzer import GPTAnalyzer
+    return GPTAnalyzer()
+
+
+def show_profile_download(profile_result) -> None:
+    """
+    Offer the profile of an analysis run for download
+
+    Args:
+        profile_result: ProfileResult from utils.profiling.profile (None = not profiled)
+    """
+    if not profile_result or not profile_result.path:
+        return
+
+    with open(profile_result.path, 'rb') as f:
+        st.download_button(
+            f"プロファイルをダウンロード ({profile_result.format}, {profile_result.seconds:.1f}秒)",
+            f.read(),
+            file_name=os.path.basename(profile_result.path)
+        )
+
+
+@st.cache_resource
+def shared_stores():
+    """
+    Local stores shared by every session and rerun of the process
+
+    Created on the first call only; the page cache and ledger are installed
+    on BaseScraper and LLMAnalyzer here instead of on every rerun.
+
+    Returns:
+        Tuple of (HistoryStore, CostLedger)
+    """
+    from scraper.base import BaseScraper
+    from cache.history import HistoryStore
+    from cache.pages import PageCache
+    from analyzer.base import LLMAnalyzer
+    from utils.ledger import CostLedger
+
+    history = HistoryStore()
+    # Expired pages are revalidated with conditional GET instead of re-downloaded
+    BaseScraper.page_cache = PageCache()
+    ledger = CostLedger()
+    # One ledger row per provider call, next to the per-analysis total
+    LLMAnalyzer.ledger = ledger
+    return history, ledger
 
 
 def main():
@@ -180,18 +182,48 @@ def main():
     # Authentication check
     check_authentication()
 
-    # Initialize cache and analyzer
+    from cache.dynamodb import DynamoDBCache
+    from cache.race_cards import RaceCardIndex
+    from analyzer.prerank import prerank_race, prerank_savings
+    from analyzer.structured import sorted_ranking
+    from utils.ledger import call_context, new_analysis_id
+
+    # Initialize cache, ledger and analyzer
     cache = DynamoDBCache()
+    history, ledger = shared_stores()
+    race_cards = RaceCardIndex(cache)
 
     # Select analyzer type (Claude or GPT)
     analyzer_type = os.getenv('ANALYZER_TYPE', 'claude').lower()
 
-    if analyzer_type == 'claude':
-        analyzer = ClaudeAnalyzer()
-        analyzer_name = "Claude 4.5"
-    else:
-        analyzer = GPTAnalyzer()
-        analyzer_name = "GPT-5"
+    analyzer = create_analyzer('claude' if analyzer_type == 'claude' else 'gpt')
+
+    # Hedged requests: also ask the other provider when the primary is slow
+    if os.getenv('HEDGED_REQUESTS', 'false').lower() == 'true':
+        from analyzer.hedged import HedgedAnalyzer
+        secondary = create_analyzer('gpt' if analyzer_type == 'claude' else 'claude')
+        analyzer = HedgedAnalyzer(analyzer, secondary)
+
+    analyzer_name = analyzer.name
+
+    # One-shot analysis (single) or opt-in per-horse cached analysis (incremental)
+    analysis_mode = os.getenv('ANALYSIS_MODE', 'single').lower()
+    if analysis_mode == 'incremental':
+        from analyzer.incremental import IncrementalAnalyzer
+        analyzer = IncrementalAnalyzer(analyzer, cache)
+
+    # Full detail only for the top N horses of the local pre-ranking (0 = everyone)
+    prerank_top_n = int(os.getenv('PRERANK_TOP_N', '0'))
+
+    # Settings that change the analysis result are part of its cache key
+    analysis_settings = (
+        f"mode={analysis_mode};prerank={prerank_top_n};"
+        f"output={os.getenv('OUTPUT_MODE', 'markdown').lower()};"
+        f"format={os.getenv('PROMPT_FORMAT', 'markdown').lower()}"
+    )
+
+    # Profile analysis runs (PROFILE_ENABLED or ?profile=<PROFILE_TOKEN>)
+    profiling = profiling_requested(st.query_params)
 
     # App header
     st.title("🏇 競馬レース解析アプリ")
@@ -213,42 +245,45 @@ def main():
     # Format date for netkeiba (YYYYMMDD)
     date_str = race_date.strftime("%Y%m%d")
 
-    # Fetch available races
+    # Fetch available races (race card index shared across sessions, see cache/race_cards.py)
     if st.button("レース一覧を取得"):
         with st.spinner("レース一覧を取得中..."):
-            race_scraper = RaceScraper()
-            races = race_scraper.fetch_races_by_date(date_str)
+            race_card = race_cards.get(date_str)
 
-            if races:
-                st.session_state.available_races = races
-                st.success(f"{len(races)}件のレースが見つかりました")
+            if race_card.races:
+                st.session_state.race_card = race_card
+                st.success(f"{len(race_card.races)}件のレースが見つかりました")
             else:
                 st.error("レースが見つかりませんでした")
 
     # Track and race number selection
-    if 'available_races' in st.session_state and st.session_state.available_races:
+    if 'race_card' in st.session_state and st.session_state.race_card.races:
         st.subheader("2. 競馬場とレース番号を選択")
 
-        races = st.session_state.available_races
+        race_card = st.session_state.race_card
 
-        # Extract unique track names
-        track_names = sorted(set(r['track_name'] for r in races))
+        # Unique track names
+        track_names = sorted(race_card.tracks())
 
         selected_track = st.selectbox("競馬場", track_names)
 
-        # Filter races by selected track
-        track_races = [r for r in races if r['track_name'] == selected_track]
+        # Races of the selected track
+        track_races = race_card.races_at(selected_track)
         race_numbers = sorted(set(r['race_number'] for r in track_races))
 
         selected_race_number = st.selectbox("レース番号", race_numbers)
 
         # Find the selected race
-        selected_race = next((r for r in track_races if r['race_number'] == selected_race_number), None)
+        selected_race = race_card.get(race_card.get_race_id(selected_track, selected_race_number))
 
         if selected_race:
-            st.info(f"選択: {selected_race['race_name']} (ID: {selected_race['race_id']})")
+            details = [f"ID: {selected_race['race_id']}"]
+            if selected_race['post_time']:
+                details.append(f"発走 {selected_race['post_time']}")
+            if selected_race['field_size']:
+                details.append(f"{selected_race['field_size']}頭")
+            st.info(f"選択: {selected_race['race_name']} ({', '.join(details)})")
             st.session_state.selected_race_id = selected_race['race_id']
-            st.session_state.selected_track_name = selected_track
 
     # Custom prompt
     st.subheader("3. カスタムプロンプト (オプション)")
@@ -277,14 +312,11 @@ def main():
         if st.button("🚀 解析開始", type="primary"):
             race_id = st.session_state.selected_race_id
 
-            # Get the selected track name from session state
-            selected_track_name = st.session_state.get('selected_track_name', None)
-
             # Check cache first (if not forcing new analysis)
             cached_analysis = None
             if not force_new_analysis:
                 with st.spinner("キャッシュを確認中..."):
-                    cached_data = cache.get_llm_analysis(race_id, custom_prompt)
+                    cached_data = cache.get_llm_analysis(race_id, custom_prompt, analysis_settings)
                     if cached_data:
                         cached_analysis = cached_data.get('analysis_result')
                         if cached_analysis:
@@ -293,6 +325,7 @@ def main():
             if cached_analysis:
                 # Use cached result
                 analysis_result = cached_analysis
+                ledger.record_analysis(race_id, analysis_result, cache_hit=True, analysis_mode=analysis_mode)
             else:
                 # Perform new analysis
                 if not force_new_analysis:
@@ -300,25 +333,65 @@ def main():
                 else:
                     st.info("新規解析を実行します。")
 
-                with st.spinner("データを取得中..."):
-                    race_data = fetch_race_data_with_cache(race_id, cache, selected_track_name)
-
-                if not race_data:
-                    st.error("データ取得に失敗しました")
-                    st.stop()
-
-                st.success(f"データ取得完了: {len(race_data['horses'])}頭")
-
-                with st.spinner(f"{analyzer_name}で解析中... (30秒〜1分程度かかります)"):
-                    analysis_result = analyzer.analyze_horses(race_data, custom_prompt)
-
-                if not analysis_result:
-                    st.error("解析に失敗しました")
-                    st.stop()
-
-                # Save to cache
-                cache.set_llm_analysis(race_id, custom_prompt, analysis_result)
-                st.success("解析完了！結果をキャッシュに保存しました。")
+                # Opt-in profile of the whole fetch + analysis run (admins only)
+                # The link is rendered in finally, so failed runs (st.stop()) get one too
+                profile_result = None
+                try:
+                    with profile(race_id, profiling) as profile_result:
+                        with st.spinner("データを取得中..."):
+                            race_data = fetch_race_data_with_cache(race_id, cache, history=history)
+
+                        if not race_data:
+                            st.error("データ取得に失敗しました")
+                            st.stop()
+
+                        st.success(f"データ取得完了: {len(race_data['horses'])}頭")
+
+                        if 0 < prerank_top_n < len(race_data['horses']):
+                            ranked_race_data = prerank_race(race_data, prerank_top_n)
+                            savings = prerank_savings(
+                                race_data, ranked_race_data,
+                                compact=(os.getenv('PROMPT_FORMAT', 'markdown').lower() == 'compact'),
+                                analysis_mode=analysis_mode,
+                                max_workers=int(os.getenv('ANALYSIS_MAX_WORKERS', '6'))
+                            )
+                            race_data = ranked_race_data
+
+                            calls_saved = f", LLM呼び出し -{savings['horses_summarized']}回" if analysis_mode == 'incremental' else ""
+                            st.caption(
+                                f"事前ランキング: 上位{prerank_top_n}頭を詳細分析、{savings['horses_summarized']}頭は要約のみ "
+                                f"(推定入力トークン {savings['full_tokens']:,} → {savings['ranked_tokens']:,}, "
+                                f"-{savings['saved_ratio']:.0%}{calls_saved}, "
+                                f"推定所要時間 {savings['full_seconds']:.0f}秒 → {savings['ranked_seconds']:.0f}秒 "
+                                f"(初回トークン {savings['full_ttft']:.1f}秒 → {savings['ranked_ttft']:.1f}秒), "
+                                f"スコア計算 {race_data['prerank']['scoring_ms']:.1f}ms)"
+                            )
+
+                        # Every provider call of this analysis is recorded under one id
+                        analysis_id = new_analysis_id()
+                        with st.spinner(f"{analyzer_name}で解析中... (30秒〜1分程度かかります)"), \
+                                tracing.span('llm.analyze', race_id=race_id, mode=analysis_mode) as span, \
+                                call_context(analysis_id=analysis_id, race_id=race_id):
+                            analysis_result = analyzer.analyze_horses(race_data, custom_prompt)
+                            span.set(llm_calls=analysis_result.get('llm_calls', 0) if analysis_result else 0)
+
+                        if not analysis_result:
+                            st.error("解析に失敗しました")
+                            st.stop()
+
+                        ledger.record_analysis(race_id, analysis_result, cache_hit=False, analysis_mode=analysis_mode,
+                                               analysis_id=analysis_id)
+
+                        if analysis_result.get('horses_failed'):
+                            # Not cached: re-running retries only the failed horses (the rest are cached per horse)
+                            st.warning(f"{analysis_result['horses_failed']}頭の個別分析に失敗したため要約で代替しました。"
+                                       "再度解析するとその馬だけ再実行します。")
+                        else:
+                            # Save to cache
+                            cache.set_llm_analysis(race_id, custom_prompt, analysis_result, analysis_settings)
+                            st.success("解析完了！結果をキャッシュに保存しました。")
+                finally:
+                    show_profile_download(profile_result)
 
             # Store results in session
             st.session_state.analysis_result = analysis_result
@@ -335,11 +408,26 @@ def main():
             トークン使用量: 入力 {tokens.get('input', 0):,}, 出力 {tokens.get('output', 0):,}, 合計 {tokens.get('total', 0):,}
             """)
 
+            if 'horses_cached' in analysis_result and not cached_analysis:
+                st.caption(
+                    f"個別馬分析: キャッシュ再利用 {analysis_result['horses_cached']}頭 / "
+                    f"新規解析 {analysis_result['horses_analyzed']}頭"
+                )
+
     # Display results
     if 'analysis_result' in st.session_state:
         st.subheader("6. 解析結果")
 
         result = st.session_state.analysis_result
+
+        # Structured output: show the top-5 ranking without re-parsing text
+        structured = result.get('structured')
+        if structured and structured.get('ranking'):
+            st.table([
+                {'順位': entry.get('rank'), '馬番': entry.get('horse_number'), '馬名': entry.get('horse_name')}
+                for entry in sorted_ranking(structured['ranking'])
+            ])
+
         st.markdown(result.get('raw_response', 'データなし'))
 
 
@@ -352,4 +440,9 @@ if __name__ == "__main__":
         initial_sidebar_state="collapsed"
     )
 
-    main()
+    # Sidecar /metrics thread (once per process, METRICS_ENABLED only)
+    start_metrics_server()
+
+    # UI requests go ahead of any prefetch/backfill queued in this process
+    with fetch_priority(INTERACTIVE), track_session():
+        main()
@@ -0,0 +1,77 @@
+"""
+Feature extraction benchmark: per-dict Python vs cached columns + NumPy table
+Usage: python -m benchmarks.bench_features [--race race.json] [--number 200]
+"""
+
+import argparse
+import statistics
+import timeit
+
+from analyzer import features
+from benchmarks.sample_data import load_race
+
+
+def legacy_features(horses):
+    """Per-dict parsing and per-group normalization on every call"""
+    rows = []
+    for i, horse in enumerate(horses):
+        for k, result in enumerate(horse.get('recent_results', [])):
+            distance = features.parse_distance(result.get('distance'))
+            rows.append({
+                'horse_index': i,
+                'race_index': k,
+                'venue': result.get('track', ''),
+                'time_seconds': features.parse_time(result.get('time')),
+                'margin_lengths': features.parse_margin_lengths(result.get('margin')),
+                'last_3f': features.parse_float(result.get('last_3f')),
+                **distance,
+            })
+
+    groups = {}
+    for row in rows:
+        if row['time_seconds'] is not None:
+            key = (row['venue'], row['surface'], row['distance_meters'])
+            groups.setdefault(key, []).append(row['time_seconds'])
+
+    stats = {key: (statistics.mean(values), statistics.pstdev(values))
+             for key, values in groups.items() if len(values) >= 2}
+
+    for row in rows:
+        mean, std = stats.get((row['venue'], row['surface'], row['distance_meters']), (0.0, 0.0))
+        if row['time_seconds'] is not None and std > 0:
+            row['time_z'] = (row['time_seconds'] - mean) / std
+        else:
+            row['time_z'] = None
+
+    return rows
+
+
+def bench(label: str, func, number: int):
+    """Time func and print the mean per call"""
+    seconds = timeit.timeit(func, number=number) / number
+    print(f"{label:<45} {seconds * 1e3:>8.3f} ms/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--race', help='Saved race data JSON (default: 18-horse sample)')
+    parser.add_argument('--number', type=int, default=200, help='Iterations per benchmark')
+    args = parser.parse_args()
+
+    horses = load_race(args.race).get('horses', [])
+    rows = sum(len(horse.get('recent_results', [])) for horse in horses)
+    print(f"Field: {len(horses)} horses, {rows} result rows")
+
+    # Columns are parsed once per horse at fetch time and cached with the results
+    cached = [{**horse, 'result_features': features.result_columns(horse.get('recent_results', []))}
+              for horse in horses]
+
+    bench("legacy per-dict features (whole card)", lambda: legacy_features(horses), args.number)
+    bench("result_columns (all horses, at fetch time)",
+          lambda: [features.result_columns(horse.get('recent_results', [])) for horse in horses], args.number)
+    bench("build_feature_table (cached columns)", lambda: features.build_feature_table(cached), args.number)
+    bench("build_feature_table (parse on the fly)", lambda: features.build_feature_table(horses), args.number)
+
+
+if __name__ == '__main__':
+    main()
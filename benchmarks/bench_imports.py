@@ -0,0 +1,222 @@
+"""
+Import-time benchmark for the app entry points
+Imports each target in a fresh interpreter with python -X importtime and
+reports the import time on top of interpreter start-up, the slowest
+modules, and any heavy module the target must not load:
+
+    app                       - login page: no scrapers, boto3, numpy or LLM SDKs
+    analyzer.claude_analyzer  - no openai
+    analyzer.gpt_analyzer     - no anthropic
+
+Usage: python -m benchmarks.bench_imports [--number 5] [--save-baseline] [--tolerance 0.5]
+
+Exits with status 1 when a target loads a forbidden module, fails to
+import, or got slower than the baseline by more than the tolerance.
+Timings are scaled by the interpreter start-up time, but re-record the
+baseline (--save-baseline) after changing machines or dependencies.
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'baselines', 'bench_imports.json')
+
+# Modules the login page must not pay for (loaded in app.main() after authentication)
+HEAVY_MODULES = ('boto3', 'botocore', 'anthropic', 'openai', 'tiktoken', 'bs4', 'requests', 'numpy')
+
+# Target module -> top-level packages it must not import
+TARGETS = {
+    'app': HEAVY_MODULES,
+    'analyzer.claude_analyzer': ('openai',),
+    'analyzer.gpt_analyzer': ('anthropic',),
+    'cache.dynamodb': (),
+    'scraper.race': (),
+    'keiba.planner': (),
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Parse -X importtime output
+
+    Args:
+        stderr: Interpreter stderr
+
+    Returns:
+        List of (module, self us, cumulative us, nesting depth) in import order
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            # Header line ("self [us] | cumulative | imported package")
+            continue
+        name = parts[2][1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def run_import(code: str) -> Tuple[List[Tuple[str, int, int, int]], Optional[str]]:
+    """
+    Run code in a fresh interpreter with -X importtime
+
+    Args:
+        code: Python source passed to -c
+
+    Returns:
+        Tuple of (parsed rows, error message or None)
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.getenv('PYTHONPATH')])))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    error = None
+    if proc.returncode != 0:
+        lines = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')]
+        error = lines[-1] if lines else f"exit status {proc.returncode}"
+    return parse_importtime(proc.stderr), error
+
+
+def measure(target: str, startup: set, number: int) -> Dict:
+    """
+    Measure importing one module
+
+    Args:
+        target: Module name
+        startup: Modules already imported by a bare interpreter (not counted)
+        number: Runs (the fastest is reported)
+
+    Returns:
+        Dictionary with total_ms, modules, slowest (name, self ms) pairs,
+        loaded top-level packages and error
+    """
+    best = None
+    for _ in range(number):
+        rows, error = run_import(f"import {target}")
+        if error:
+            return {'error': error}
+        # Top-level entries cover everything imported beneath them
+        total_us = sum(cumulative for name, _, cumulative, depth in rows
+                       if depth == 0 and name not in startup)
+        if best is None or total_us < best[0]:
+            best = (total_us, rows)
+
+    total_us, rows = best
+    modules = [name for name, _, _, _ in rows if name not in startup]
+    slowest = sorted(((name, self_us / 1000) for name, self_us, _, _ in rows if name not in startup),
+                     key=lambda item: item[1], reverse=True)
+    return {
+        'total_ms': total_us / 1000,
+        'modules': len(modules),
+        'slowest': slowest,
+        'packages': {name.split('.', 1)[0] for name in modules},
+        'error': None
+    }
+
+
+def measure_startup(number: int) -> Tuple[set, float]:
+    """
+    Modules and time of a bare interpreter start (the calibration run)
+
+    Returns:
+        Tuple of (module names, fastest total ms)
+    """
+    best_ms = None
+    modules = set()
+    for _ in range(number):
+        rows, _ = run_import('pass')
+        modules.update(name for name, _, _, _ in rows)
+        total_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+        best_ms = total_ms if best_ms is None else min(best_ms, total_ms)
+    return modules, best_ms or 0.0
+
+
+def load_baseline(path: str) -> Dict:
+    """Load the stored baseline (empty if there is none)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict, startup_ms: float) -> None:
+    """Store results as the new baseline"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'startup_ms': round(startup_ms, 3),
+        'targets': {name: {'total_ms': round(result['total_ms'], 3), 'modules': result['modules']}
+                    for name, result in results.items()}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=5, help='Runs per target (fastest is reported)')
+    parser.add_argument('--top', type=int, default=5, help='Slowest modules shown per target')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown over the baseline (0.5 = 50%%)')
+    parser.add_argument('--only', nargs='*', help='Measure only these targets')
+    args = parser.parse_args()
+
+    stored = load_baseline(args.baseline)
+    baseline = stored.get('targets', {})
+    startup, startup_ms = measure_startup(args.number)
+    speed = startup_ms / stored['startup_ms'] if stored.get('startup_ms') else 1.0
+    print(f"Interpreter start-up: {startup_ms:.1f} ms (x{speed:.2f} of baseline machine)\n")
+
+    failed = False
+    results = {}
+    for target, forbidden in TARGETS.items():
+        if args.only and target not in args.only:
+            continue
+
+        result = measure(target, startup, args.number)
+        if result['error']:
+            print(f"{target:<26} import failed: {result['error']}")
+            failed = True
+            continue
+        results[target] = result
+
+        status = "no baseline"
+        base = baseline.get(target)
+        if base:
+            limit = base['total_ms'] * speed * (1 + args.tolerance)
+            change = (result['total_ms'] / (base['total_ms'] * speed) - 1) * 100
+            status = f"ok ({change:+.0f}%)"
+            if result['total_ms'] > limit:
+                status = f"REGRESSION ({change:+.0f}%, limit {limit:.1f} ms)"
+                failed = True
+
+        loaded = sorted(result['packages'] & set(forbidden))
+        if loaded:
+            status += f"  FORBIDDEN: {', '.join(loaded)}"
+            failed = True
+
+        print(f"{target:<26} {result['total_ms']:8.1f} ms {result['modules']:5d} modules  {status}")
+        for name, self_ms in result['slowest'][:args.top]:
+            print(f"    {self_ms:8.1f} ms  {name}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, {**baseline, **results}, startup_ms)
+        print(f"\nBaseline saved: {args.baseline}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
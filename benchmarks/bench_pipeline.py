@@ -0,0 +1,332 @@
+"""
+End-to-end race pipeline benchmark
+Runs the work behind one 解析開始 click (fetch_race_data → create_user_prompt
+→ analyze_horses → set_llm_analysis) against stand-ins: the local replay
+server (in a subprocess), an in-memory cache backend and a mock LLM with
+configurable latency and token counts. Reports wall time, CPU time and call
+counts per stage for a cold, a warm and a partially warm cache.
+
+Usage:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --latency 0.2 --llm-ttft 1.0 --llm-tps 60 --mode single
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.request import urlopen
+
+from benchmarks.fixtures import fixture_ids
+from benchmarks.replay_server import STATS_PATH, use_replay_server
+
+STAGES = ['fetch_race_data', 'create_user_prompt', 'analyze_horses', 'set_llm_analysis']
+SCENARIOS = ['cold', 'warm', 'partial']
+
+# Entity cache keys dropped for the partially warm scenario
+ENTITY_SORT_KEYS = ('RESULTS', 'PARENT', 'STATS')
+
+
+def make_memory_cache(latency: float = 0.0):
+    """
+    Create the in-memory cache backend
+
+    Imported lazily so --help works without boto3 installed.
+
+    Args:
+        latency: Seconds added to every get/set (DynamoDB round trip)
+
+    Returns:
+        MemoryCache instance
+    """
+    from cache.dynamodb import DynamoDBCache
+
+    class MemoryCache(DynamoDBCache):
+        """DynamoDBCache key scheme on a dict, JSON round-tripped like a real backend"""
+
+        def __init__(self):
+            self.ttl_seconds = int(os.getenv('CACHE_TTL_SECONDS', '604800'))
+            self.items: Dict[tuple, str] = {}
+            self.calls: Counter = Counter()
+            self._lock = threading.Lock()
+
+        def get(self, partition_key: str, sort_key: str) -> Optional[Dict]:
+            if latency:
+                time.sleep(latency)
+            with self._lock:
+                self.calls['cache_get'] += 1
+                item = self.items.get((partition_key, sort_key))
+                if item is not None:
+                    self.calls['cache_hit'] += 1
+            return json.loads(item) if item is not None else None
+
+        def set(self, partition_key: str, sort_key: str, data: Dict, ttl_seconds: Optional[int] = None) -> bool:
+            if latency:
+                time.sleep(latency)
+            item = json.dumps(data, ensure_ascii=False)
+            with self._lock:
+                self.calls['cache_set'] += 1
+                self.items[(partition_key, sort_key)] = item
+            return True
+
+        def delete(self, partition_key: str, sort_key: str) -> bool:
+            with self._lock:
+                return self.items.pop((partition_key, sort_key), None) is not None
+
+        def drop_entities(self, every: int = 2) -> int:
+            """Forget every Nth cached horse/pedigree/jockey entry (partially warm cache)"""
+            keys = sorted(key for key in self.items if key[1] in ENTITY_SORT_KEYS)[::every]
+            for key in keys:
+                del self.items[key]
+            return len(keys)
+
+        def drop_race_analyses(self) -> None:
+            """Forget race-level LLM results so the next click analyzes again (per-horse analyses stay)"""
+            for key in [key for key in self.items if key[0].startswith('ANALYSIS#')]:
+                del self.items[key]
+
+    return MemoryCache()
+
+
+def make_mock_analyzer(ttft: float, tokens_per_second: float, output_tokens: int):
+    """
+    Create the mock LLM
+
+    Args:
+        ttft: Seconds until the first output token
+        tokens_per_second: Output streaming speed (0 = instant)
+        output_tokens: Output tokens per call (capped at the call's max_tokens)
+
+    Returns:
+        MockAnalyzer instance
+    """
+    from analyzer.base import LLMAnalyzer
+    from analyzer.tokens import approximate_tokens
+
+    class MockAnalyzer(LLMAnalyzer):
+        """LLMAnalyzer that sleeps like a streaming provider and returns canned Markdown"""
+
+        name = "Mock"
+
+        def __init__(self):
+            super().__init__()
+            self.model = "mock"
+            # Canned text has no schema output
+            self.output_mode = 'markdown'
+            self.calls: Counter = Counter()
+            self._lock = threading.Lock()
+
+        def _complete(self, system_prompt, user_prompt, max_tokens, schema, cancel_event, on_first_token):
+            start_time = time.time()
+            tokens = min(output_tokens, max_tokens) if max_tokens else output_tokens
+            time.sleep(ttft)
+            if on_first_token:
+                on_first_token()
+            if tokens_per_second > 0:
+                time.sleep(tokens / tokens_per_second)
+
+            with self._lock:
+                self.calls['llm_calls'] += 1
+
+            return {
+                'text': ("## 1. 個別馬分析\n\n(mock)\n\n## 2. 比較分析\n\n(mock)\n\n"
+                         "## 3. おすすめランキング\n\n1. (mock)\n"),
+                'input_tokens': approximate_tokens(system_prompt) + approximate_tokens(user_prompt),
+                'output_tokens': tokens,
+                'cached_tokens': 0,
+                'response_time': time.time() - start_time,
+                'time_to_first_token': ttft
+            }
+
+    return MockAnalyzer()
+
+
+def start_replay_server(args) -> Tuple[subprocess.Popen, str]:
+    """Start benchmarks.replay_server in a subprocess (its CPU is not counted) and wait for it"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    command = [sys.executable, '-m', 'benchmarks.replay_server', '--port', str(port),
+               '--latency', str(args.latency), '--jitter', str(args.jitter),
+               '--error-rate', str(args.error_rate), '--seed', '1']
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+
+    for _ in range(100):
+        try:
+            urlopen(url + STATS_PATH, timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError("Replay server did not start")
+
+
+def server_requests(url: str) -> int:
+    """Requests served by the replay server so far"""
+    return json.loads(urlopen(url + STATS_PATH, timeout=5).read()).get('requests', 0)
+
+
+class StageTimer:
+    """Wall time, CPU time and call count deltas per pipeline stage"""
+
+    def __init__(self, counters: List[Callable[[], Dict[str, int]]]):
+        """
+        Initialize stage timer
+
+        Args:
+            counters: Functions returning current call counters (summed per stage)
+        """
+        self.counters = counters
+        self.stages: Dict[str, Dict] = {}
+
+    def _snapshot(self) -> Counter:
+        total: Counter = Counter()
+        for counter in self.counters:
+            total.update(counter())
+        return total
+
+    def run(self, stage: str, fn: Callable):
+        """Run one stage and record its cost"""
+        before = self._snapshot()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = fn()
+        wall_ms = (time.perf_counter() - wall) * 1000
+        # Process CPU includes fetch and analysis worker threads
+        cpu_ms = (time.process_time() - cpu) * 1000
+
+        calls = self._snapshot() - before
+        self.stages[stage] = {
+            'wall_ms': wall_ms,
+            'cpu_ms': cpu_ms,
+            **{key: calls.get(key, 0) for key in ('http', 'cache_get', 'cache_hit', 'cache_set', 'llm_calls')}
+        }
+        return result
+
+
+def run_pipeline(race_id: str, cache, analyzer, timer: StageTimer, custom_prompt: str = "") -> Optional[Dict]:
+    """
+    One 解析開始 click without the UI
+
+    Returns:
+        Analysis result, or None if a stage failed
+    """
+    from keiba.planner import fetch_race_data
+    from analyzer.prompts import create_user_prompt
+
+    race_data = timer.run('fetch_race_data', lambda: fetch_race_data(race_id, cache))
+    if not race_data:
+        return None
+
+    llm = getattr(analyzer, 'analyzer', analyzer)
+    timer.run('create_user_prompt', lambda: create_user_prompt(
+        race_data, custom_prompt, compact=(llm.prompt_format == 'compact'),
+        token_budget=llm.prompt_token_budget, structured=(llm.output_mode == 'structured')))
+
+    result = timer.run('analyze_horses', lambda: analyzer.analyze_horses(race_data, custom_prompt))
+    if not result:
+        return None
+
+    timer.run('set_llm_analysis', lambda: cache.set_llm_analysis(race_id, custom_prompt, result))
+    return result
+
+
+def print_report(scenario: str, timer: StageTimer) -> None:
+    """Print one scenario's stage table"""
+    print(f"\n[{scenario}]")
+    print(f"{'stage':<20} {'wall ms':>9} {'cpu ms':>8} {'http':>5} {'c.get':>6} {'c.hit':>6} {'c.set':>6} {'llm':>4}")
+    total = Counter()
+    for stage in STAGES:
+        row = timer.stages.get(stage)
+        if row is None:
+            continue
+        total.update(row)
+        print(f"{stage:<20} {row['wall_ms']:>9.1f} {row['cpu_ms']:>8.1f} {row['http']:>5} {row['cache_get']:>6} "
+              f"{row['cache_hit']:>6} {row['cache_set']:>6} {row['llm_calls']:>4}")
+    print(f"{'total':<20} {total['wall_ms']:>9.1f} {total['cpu_ms']:>8.1f} {total['http']:>5} {total['cache_get']:>6} "
+          f"{total['cache_hit']:>6} {total['cache_set']:>6} {total['llm_calls']:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--race-id', default=None, help='Race to analyze (default: the recorded race card)')
+    parser.add_argument('--mode', choices=['incremental', 'single'],
+                        default=os.getenv('ANALYSIS_MODE', 'single').lower(),
+                        help='Analysis mode (defaults to ANALYSIS_MODE, like the app)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Replay server latency per page (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Replay server extra random latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Replay server share of 5xx responses')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='SCRAPING_DELAY_SECONDS between request starts (default 0: measure the pipeline, not the politeness delay)')
+    parser.add_argument('--workers', type=int, default=None, help='FETCH_CONCURRENCY')
+    parser.add_argument('--cache-latency', type=float, default=0.0, help='Cache backend round trip (s)')
+    parser.add_argument('--llm-ttft', type=float, default=0.5, help='Mock LLM time to first token (s)')
+    parser.add_argument('--llm-tps', type=float, default=200.0, help='Mock LLM output tokens per second')
+    parser.add_argument('--llm-output-tokens', type=int, default=1500, help='Mock LLM output tokens per call')
+    parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS, default=SCENARIOS, help='Cache states to run')
+    parser.add_argument('--json', default=None, help='Also write the stage tables to this JSON file')
+    args = parser.parse_args()
+
+    # Scrapers read these when they are created
+    os.environ['SCRAPING_DELAY_SECONDS'] = str(args.delay)
+    if args.workers:
+        os.environ['FETCH_CONCURRENCY'] = str(args.workers)
+
+    process, url = start_replay_server(args)
+    use_replay_server(url)
+
+    try:
+        from analyzer.incremental import IncrementalAnalyzer
+
+        race_id = args.race_id or fixture_ids()['race_id']
+        cache = make_memory_cache(args.cache_latency)
+        llm = make_mock_analyzer(args.llm_ttft, args.llm_tps, args.llm_output_tokens)
+        analyzer = IncrementalAnalyzer(llm, cache) if args.mode == 'incremental' else llm
+
+        counters = [lambda: {'http': server_requests(url)}, lambda: cache.calls, lambda: llm.calls]
+        report = {}
+
+        # Scenarios build on each other: warm reuses the cold run's cache (a forced new
+        # analysis, so only the race-level result is dropped), partial then forgets half
+        # of the fetched entities
+        last = max(SCENARIOS.index(scenario) for scenario in args.scenarios)
+        for scenario in SCENARIOS[:last + 1]:
+            if scenario == 'cold':
+                cache.items.clear()
+            elif scenario == 'warm':
+                cache.drop_race_analyses()
+            else:
+                cache.drop_race_analyses()
+                dropped = cache.drop_entities()
+                print(f"\nPartial cache: dropped {dropped} horse/pedigree/jockey entries")
+
+            timer = StageTimer(counters)
+            result = run_pipeline(race_id, cache, analyzer, timer)
+            if scenario not in args.scenarios:
+                continue
+            if result is None:
+                print(f"\n[{scenario}] pipeline failed")
+            print_report(scenario, timer)
+            report[scenario] = timer.stages
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"\nSaved: {args.json}")
+
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
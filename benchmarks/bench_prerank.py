@@ -0,0 +1,55 @@
+"""
+Pre-ranking benchmark: scoring time, prompt size and estimated latency per top-N
+Usage: python -m benchmarks.bench_prerank [--race race.json] [--top-n 8 6 4] [--number 200] [--workers 6]
+
+Latency is the TTFT plus output-time estimate of analyzer.prerank
+(LATENCY_* settings), not a measurement; compare it with the ledger.
+"""
+
+import argparse
+import timeit
+
+from analyzer.prerank import prerank_race, prerank_savings, score_horses
+from analyzer.tokens import get_encoding
+from benchmarks.sample_data import load_race
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--race', help='Saved race data JSON (default: 18-horse sample)')
+    parser.add_argument('--top-n', nargs='*', type=int, default=[10, 8, 6, 4],
+                        help='Number of horses kept in full detail')
+    parser.add_argument('--number', type=int, default=200, help='Scoring iterations')
+    parser.add_argument('--workers', type=int, default=6, help='ANALYSIS_MAX_WORKERS for incremental estimates')
+    args = parser.parse_args()
+
+    race_data = load_race(args.race)
+    horses = race_data.get('horses', [])
+
+    method = 'tiktoken' if get_encoding() is not None else 'approximate'
+    print(f"Token counting: {method}")
+    print(f"Field: {len(horses)} horses")
+
+    seconds = timeit.timeit(lambda: score_horses(horses), number=args.number) / args.number
+    print(f"score_horses: {seconds * 1e6:.1f} us/call")
+
+    print(f"\n{'top-N':>5} {'mode':>9} {'full':>8} {'ranked':>8} {'saved':>7} {'LLM calls saved':>16} "
+          f"{'single s':>13} {'incremental s':>15}")
+    for top_n in args.top_n:
+        ranked = prerank_race(race_data, top_n)
+        for compact in (False, True):
+            savings = prerank_savings(race_data, ranked, compact=compact)
+            incremental = prerank_savings(race_data, ranked, compact=compact,
+                                          analysis_mode='incremental', max_workers=args.workers)
+            print(f"{top_n:>5} {'compact' if compact else 'markdown':>9} "
+                  f"{savings['full_tokens']:>8,} {savings['ranked_tokens']:>8,} "
+                  f"{savings['saved_ratio']:>6.0%} {savings['horses_summarized']:>16} "
+                  f"{savings['full_seconds']:>6.1f}->{savings['ranked_seconds']:<6.1f} "
+                  f"{incremental['full_seconds']:>7.1f}->{incremental['ranked_seconds']:<6.1f}")
+
+    print("\nLLM calls saved applies to ANALYSIS_MODE=incremental (one call per detailed horse).")
+    print("Seconds are estimated end-to-end analysis latency (TTFT + output time), full -> ranked.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Prompt assembly benchmark
+Times create_user_prompt / create_horse_prompt for the current prompt module,
+optionally side by side with analyzer/prompts.py from another git revision.
+
+Usage: python -m benchmarks.bench_prompt_build [--race race.json] [--ref HEAD~1] [--number 500]
+"""
+
+import argparse
+import importlib.util
+import subprocess
+import timeit
+
+from analyzer import prompts
+from benchmarks.sample_data import load_race
+
+
+def load_prompts_at(ref: str):
+    """
+    Load analyzer/prompts.py as it was at a git revision
+
+    Args:
+        ref: Git revision (e.g. "HEAD~1", a tag or a commit hash)
+
+    Returns:
+        Module object
+    """
+    source = subprocess.run(
+        ['git', 'show', f'{ref}:analyzer/prompts.py'],
+        capture_output=True, text=True, check=True
+    ).stdout
+
+    # Load inside the analyzer package so relative imports resolve
+    spec = importlib.util.spec_from_loader(f'analyzer._prompts_{abs(hash(ref))}', loader=None)
+    module = importlib.util.module_from_spec(spec)
+    module.__package__ = 'analyzer'
+    exec(compile(source, f'{ref}:analyzer/prompts.py', 'exec'), module.__dict__)
+    return module
+
+
+def bench_module(label: str, module, race_data: dict, number: int):
+    """Time the prompt builders of one prompt module"""
+    horses = race_data.get('horses', [])
+    version = getattr(module, 'PROMPT_VERSION', '-')
+    print(f"\n{label} (PROMPT_VERSION {version})")
+
+    cases = [
+        ('create_user_prompt', lambda: module.create_user_prompt(race_data, "前走からの期間を重視")),
+    ]
+    if hasattr(module, 'create_horse_prompt'):
+        cases.append((
+            f'create_horse_prompt x{len(horses)}',
+            lambda: [module.create_horse_prompt(race_data, i, h) for i, h in enumerate(horses, 1)]
+        ))
+
+    for name, func in cases:
+        seconds = timeit.timeit(func, number=number) / number
+        print(f"  {name:<30} {seconds * 1e6:>10.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--race', help='Saved race data JSON (default: 18-horse sample)')
+    parser.add_argument('--ref', nargs='*', default=[], help='Git revisions to compare against')
+    parser.add_argument('--number', type=int, default=500, help='Iterations per benchmark')
+    args = parser.parse_args()
+
+    race_data = load_race(args.race)
+
+    bench_module('working tree', prompts, race_data, args.number)
+    for ref in args.ref:
+        bench_module(ref, load_prompts_at(ref), race_data, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Prompt size comparison between the Markdown and compact encodings
+Usage: python -m benchmarks.bench_prompt_size [--race race1.json race2.json ...] [--budget 2000 1500]
+"""
+
+import argparse
+import os
+
+from analyzer.prompts import create_user_prompt
+from analyzer.tokens import count_tokens, get_encoding
+from benchmarks.sample_data import load_race
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--race', nargs='*', default=[None],
+                        help='Saved race data JSON files (default: 18-horse sample)')
+    parser.add_argument('--budget', nargs='*', type=int, default=[2000, 1500, 1000],
+                        help='Token budgets to try in compact mode')
+    args = parser.parse_args()
+
+    method = 'tiktoken' if get_encoding() is not None else 'approximate'
+    print(f"Token counting: {method}")
+
+    for path in args.race:
+        race_data = load_race(path)
+        label = os.path.basename(path) if path else 'sample (18 horses)'
+
+        markdown_tokens = count_tokens(create_user_prompt(race_data))
+        compact_tokens = count_tokens(create_user_prompt(race_data, compact=True))
+
+        print(f"\n{label}: {len(race_data.get('horses', []))} horses")
+        print(f"  markdown:            {markdown_tokens:>7,} tokens")
+        print(f"  compact:             {compact_tokens:>7,} tokens "
+              f"({compact_tokens / markdown_tokens:.0%} of markdown)")
+
+        for budget in args.budget:
+            tokens = count_tokens(create_user_prompt(race_data, compact=True, token_budget=budget))
+            print(f"  compact, budget {budget:>5}: {tokens:>6,} tokens")
+
+
+if __name__ == '__main__':
+    main()
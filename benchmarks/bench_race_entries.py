@@ -0,0 +1,162 @@
+"""
+Race entries benchmark: bytes transferred and parse time per race
+Compares the ways RaceScraper.fetch_race_details can get a race's entries:
+
+    full_tree      - shutuba.html parsed into a full tree (previous behaviour)
+    entry_elements - shutuba.html parsed with ENTRY_ELEMENTS only (current default)
+    sub_endpoint   - lightweight endpoint from --sub-url / SHUTUBA_SUB_URL (live only)
+
+Offline it runs on the recorded shutuba pages (debug/, USER/) and checks
+that every path extracts the same entries. With --live RACE_ID it fetches
+from netkeiba (or NETKEIBA_RACE_URL), so bytes include the real page size.
+
+Usage:
+    python -m benchmarks.bench_race_entries [--number 10]
+    python -m benchmarks.bench_race_entries --live 202505040611 --sub-url '{base}/race/...?race_id={race_id}'
+"""
+
+import os
+import time
+import argparse
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+from scraper.race import ENTRY_ELEMENTS, RaceScraper
+from benchmarks.fixtures import FIXTURE_FILES, FixtureTransport, fixture_ids, inject
+
+
+class CountingTransport:
+    """Wraps a scraper's request function and counts requests and body bytes"""
+
+    def __init__(self, request: Callable):
+        self.request = request
+        self.requests = 0
+        self.bytes = 0
+
+    def __call__(self, url: str, headers: Optional[Dict[str, str]] = None):
+        response = self.request(url, headers)
+        if response is not None:
+            self.requests += 1
+            self.bytes += len(response.content)
+        return response
+
+
+def build_paths(sub_url: str) -> List[Tuple[str, Callable]]:
+    """
+    Entry paths to compare
+
+    Args:
+        sub_url: Lightweight endpoint template ("" = not measured)
+
+    Returns:
+        List of (name, function taking scraper and race_id)
+    """
+    def full_page(strainer):
+        def run(scraper: RaceScraper, race_id: str):
+            soup = scraper.fetch(f"{scraper.BASE_URL}/race/shutuba.html?race_id={race_id}", strainer)
+            return scraper.parse_race_details(soup, race_id) if soup else None
+        return run
+
+    def sub_endpoint(scraper: RaceScraper, race_id: str):
+        soup = scraper.fetch(sub_url.format(base=scraper.BASE_URL, race_id=race_id), ENTRY_ELEMENTS)
+        return scraper.parse_race_details(soup, race_id) if soup else None
+
+    paths = [('full_tree', full_page(None)), ('entry_elements', full_page(ENTRY_ELEMENTS))]
+    if sub_url:
+        paths.append(('sub_endpoint', sub_endpoint))
+    return paths
+
+
+def measure(path: Callable, scraper: RaceScraper, counter: CountingTransport, race_id: str,
+            number: int) -> Dict:
+    """
+    Time one path
+
+    Args:
+        path: Path function
+        scraper: Race scraper whose _request is counter
+        counter: Counting transport (bytes of the warm-up call are reported)
+        race_id: Race to fetch
+        number: Timed calls
+
+    Returns:
+        Dictionary containing bytes, requests, horses, median_ms, min_ms and result
+    """
+    counter.requests = counter.bytes = 0
+    result = path(scraper, race_id)
+    transferred, requests = counter.bytes, counter.requests
+
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        path(scraper, race_id)
+        times.append(time.perf_counter() - start)
+
+    return {
+        'bytes': transferred,
+        'requests': requests,
+        'horses': len(result['horses']) if result else 0,
+        'median_ms': statistics.median(times) * 1000,
+        'min_ms': min(times) * 1000,
+        'result': result
+    }
+
+
+def report(label: str, results: Dict[str, Dict]) -> bool:
+    """
+    Print one race's comparison
+
+    Returns:
+        True if every path extracted the same race details as full_tree
+    """
+    print(f"\n[{label}]")
+    print(f"{'path':<16} {'KB':>8} {'req':>4} {'horses':>6} {'median ms':>10} {'min ms':>8}  vs full_tree")
+    reference = results['full_tree']
+    consistent = True
+    for name, result in results.items():
+        same = result['result'] == reference['result']
+        consistent = consistent and (same or name == 'sub_endpoint')
+        change = (result['min_ms'] / reference['min_ms'] - 1) * 100 if reference['min_ms'] else 0.0
+        note = f"{change:+.0f}%" + ("" if same else "  (different entries)")
+        print(f"{name:<16} {result['bytes'] / 1024:8.1f} {result['requests']:4d} {result['horses']:6d} "
+              f"{result['median_ms']:10.2f} {result['min_ms']:8.2f}  {note}")
+    return consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=10, help='Timed calls per path')
+    parser.add_argument('--live', metavar='RACE_ID', help='Fetch this race over the network instead of recordings')
+    parser.add_argument('--sub-url', default=os.getenv('SHUTUBA_SUB_URL', ''),
+                        help='Lightweight endpoint template with {base} and {race_id} (live only)')
+    args = parser.parse_args()
+
+    consistent = True
+    if args.live:
+        scraper = RaceScraper()
+        counter = CountingTransport(scraper._request)
+        inject(scraper, counter)
+        # Every timed call is a real request: keep it small and polite
+        number = min(args.number, 3)
+        results = {name: measure(path, scraper, counter, args.live, number)
+                   for name, path in build_paths(args.sub_url)}
+        report(f"live {args.live}", results)
+    else:
+        if args.sub_url:
+            print("--sub-url is measured with --live only (no recorded sub endpoint pages)")
+        race_id = fixture_ids()['race_id']
+        for variant, path in enumerate(FIXTURE_FILES['race_detail']):
+            scraper = RaceScraper()
+            counter = CountingTransport(FixtureTransport({'race_detail': variant}))
+            inject(scraper, counter)
+            results = {name: measure(run, scraper, counter, race_id, args.number)
+                       for name, run in build_paths('')}
+            consistent = report(path, results) and consistent
+
+    if not consistent:
+        print("\nEntry extraction differs between paths")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Scraper parse benchmark on the recorded netkeiba pages
+Runs each scraper method against the saved HTML (no network) and reports
+parse time, memory allocated and peak memory per call, compared with a
+stored baseline.
+
+Usage: python -m benchmarks.bench_scrapers [--number 20] [--save-baseline] [--tolerance 0.5] [--reruns 1]
+
+Baselines are machine-specific: timings are scaled by a calibration run
+taken around each case, but re-record the baseline (--save-baseline) after
+changing machines. A case only fails if it still regresses when re-run.
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from scraper.race import RaceScraper
+from scraper.horse import HorseScraper
+from scraper.jockey import JockeyScraper
+from benchmarks.fixtures import FixtureTransport, fixture_ids, inject
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'bench_scrapers.json')
+
+
+def build_cases() -> List[Tuple[str, Dict[str, int], Callable]]:
+    """
+    Benchmark cases
+
+    Returns:
+        List of (name, page variants, function taking the scrapers dict)
+    """
+    ids = fixture_ids()
+    return [
+        ('fetch_races_by_date', {}, lambda s: s['race'].fetch_races_by_date(ids['date'])),
+        ('fetch_race_details', {}, lambda s: s['race'].fetch_race_details(ids['race_id'])),
+        ('fetch_race_details[USER]', {'race_detail': 1},
+         lambda s: s['race'].fetch_race_details(ids['race_id'])),
+        ('fetch_horse_results', {}, lambda s: s['horse'].fetch_horse_results(ids['horse_id'])),
+        ('fetch_race_results', {}, lambda s: s['horse'].fetch_race_results(ids['horse_id'])),
+        ('fetch_pedigree', {}, lambda s: s['horse'].fetch_pedigree(ids['horse_id'])),
+        ('fetch_parent_details', {}, lambda s: s['horse'].fetch_parent_details(ids['horse_id'])),
+        ('fetch_parent_horses', {}, lambda s: s['horse'].fetch_parent_horses(ids['horse_id'])),
+        ('fetch_jockey_stats', {}, lambda s: s['jockey'].fetch_jockey_stats(ids['jockey_id'])),
+    ]
+
+
+def calibrate(number: int = 10) -> float:
+    """
+    Time a fixed reference workload on this machine
+
+    Timings are compared with the baseline relative to this, so a baseline
+    recorded on a faster or busier machine does not flag every case.
+
+    Returns:
+        Fastest time in ms of parsing the race list page with BeautifulSoup
+    """
+    from bs4 import BeautifulSoup
+    from benchmarks.fixtures import load_fixture
+
+    body = load_fixture('race_list').decode('utf-8')
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        BeautifulSoup(body, 'html.parser')
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def make_scrapers(transport: FixtureTransport) -> Dict:
+    """Create scrapers that read recorded pages through transport"""
+    scrapers = {'race': RaceScraper(), 'horse': HorseScraper(), 'jockey': JockeyScraper()}
+    for scraper in scrapers.values():
+        inject(scraper, transport)
+    return scrapers
+
+
+def measure(func: Callable, scrapers: Dict, transport: FixtureTransport, number: int) -> Dict:
+    """
+    Time and trace one case
+
+    Args:
+        func: Case function
+        scrapers: Scrapers with the fixture transport injected
+        transport: The injected transport (counts pages per call)
+        number: Timed calls
+
+    Returns:
+        Dictionary containing pages, median_ms, min_ms, alloc_kb, alloc_blocks and peak_kb
+    """
+    # Warm-up call also counts the pages fetched per call
+    transport.requests.clear()
+    func(scrapers)
+    pages = len(transport.requests)
+
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func(scrapers)
+        times.append(time.perf_counter() - start)
+
+    # Collector off so cyclic garbage (BeautifulSoup trees) is counted the same way every run
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base_current, _ = tracemalloc.get_traced_memory()
+    result = func(scrapers)
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    gc.enable()
+
+    # Allocations still held when the call returns (result included)
+    diff = [stat for stat in after.compare_to(before, 'lineno') if stat.size_diff > 0]
+    del result
+
+    return {
+        'pages': pages,
+        'median_ms': statistics.median(times) * 1000,
+        'min_ms': min(times) * 1000,
+        'alloc_kb': (current - base_current) / 1024,
+        'alloc_blocks': sum(stat.count_diff for stat in diff if stat.count_diff > 0),
+        'peak_kb': (peak - base_current) / 1024
+    }
+
+
+def run_case(func: Callable, variants: Dict[str, int], number: int) -> Dict:
+    """
+    Measure one case between two calibration runs
+
+    The calibration is repeated before and after the case so load that
+    changes during the run scales the case by what it actually ran under.
+
+    Args:
+        func: Case function
+        variants: Page variants served by the fixture transport
+        number: Timed calls (the calibration uses the same count)
+
+    Returns:
+        Result of measure plus calibration_ms
+    """
+    before = calibrate(number)
+    transport = FixtureTransport(variants)
+    result = measure(func, make_scrapers(transport), transport, number)
+    result['calibration_ms'] = (before + calibrate(number)) / 2
+    return result
+
+
+def load_baseline(path: str) -> Dict:
+    """Load the stored baseline (empty if there is none)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict, calibration_ms: float) -> None:
+    """Store results as the new baseline"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'calibration_ms': round(calibration_ms, 3),
+        'cases': {name: {key: round(value, 3) for key, value in values.items()}
+                  for name, values in results.items()}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def compare(result: Dict, baseline: Optional[Dict], tolerance: float, memory_tolerance: float,
+            speed: float) -> List[str]:
+    """
+    List the metrics that regressed beyond tolerance
+
+    Args:
+        result: Result of measure
+        baseline: Stored result of the same case
+        tolerance: Allowed slowdown (0.5 = 50%)
+        memory_tolerance: Allowed peak memory growth (memory is deterministic, so tighter)
+        speed: The case's calibration time / the baseline's (timings are scaled by it)
+
+    Returns:
+        Descriptions of the regressed metrics
+    """
+    if not baseline:
+        return []
+
+    regressions = []
+    # Fastest call is the least noisy timing on a shared machine
+    for key, scale, allowed in (('min_ms', speed, tolerance), ('peak_kb', 1.0, memory_tolerance)):
+        base = baseline.get(key)
+        if base and result[key] > base * scale * (1 + allowed):
+            change = (result[key] / (base * scale) - 1) * 100
+            regressions.append(f"{key} {result[key]:.1f} vs {base * scale:.1f} (+{change:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20, help='Timed calls per case')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown over the baseline (0.5 = 50%%)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1,
+                        help='Allowed peak memory growth over the baseline (0.1 = 10%%)')
+    parser.add_argument('--reruns', type=int, default=1,
+                        help='Re-runs of a regressed case before it counts as a regression')
+    parser.add_argument('--only', nargs='*', help='Run only these cases')
+    args = parser.parse_args()
+
+    stored = load_baseline(args.baseline)
+    baseline = stored.get('cases', {})
+
+    def speed_of(name: str, result: Dict) -> float:
+        # Cases recorded before per-case calibration use the run-wide one
+        base = baseline.get(name, {}).get('calibration_ms') or stored.get('calibration_ms')
+        return result['calibration_ms'] / base if base else 1.0
+
+    results = {}
+    regressed = []
+
+    print(f"{'case':<26} {'pages':>5} {'median ms':>10} {'ms/page':>8} {'min ms':>8} "
+          f"{'alloc KB':>9} {'blocks':>7} {'peak KB':>8} {'speed':>6}  vs baseline")
+    for name, variants, func in build_cases():
+        if args.only and name not in args.only:
+            continue
+
+        result = run_case(func, variants, args.number)
+        speed = speed_of(name, result)
+        regressions = compare(result, baseline.get(name), args.tolerance, args.memory_tolerance, speed)
+        # A one-off slow run is noise; only a regression that repeats counts
+        for _ in range(args.reruns):
+            if not regressions:
+                break
+            result = run_case(func, variants, args.number)
+            speed = speed_of(name, result)
+            regressions = compare(result, baseline.get(name), args.tolerance, args.memory_tolerance, speed)
+        results[name] = result
+
+        if regressions:
+            regressed.append(name)
+            status = "REGRESSION: " + ", ".join(regressions)
+        elif name in baseline:
+            status = f"ok ({result['min_ms'] / (baseline[name]['min_ms'] * speed) * 100 - 100:+.0f}%)"
+        else:
+            status = "no baseline"
+
+        print(f"{name:<26} {result['pages']:>5} {result['median_ms']:>10.2f} "
+              f"{result['median_ms'] / max(result['pages'], 1):>8.2f} {result['min_ms']:>8.2f} "
+              f"{result['alloc_kb']:>9.1f} {result['alloc_blocks']:>7} {result['peak_kb']:>8.0f} "
+              f"{speed:>5.2f}x  {status}")
+
+    if args.save_baseline:
+        calibrations = [result['calibration_ms'] for result in results.values()]
+        calibration_ms = statistics.median(calibrations) if calibrations else stored.get('calibration_ms', 0.0)
+        save_baseline(args.baseline, {**baseline, **results}, calibration_ms)
+        print(f"\nBaseline saved: {args.baseline}")
+
+    if regressed:
+        print(f"\n{len(regressed)} case(s) regressed: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
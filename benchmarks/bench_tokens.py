@@ -0,0 +1,59 @@
+"""
+Token counting microbenchmarks
+Usage: python -m benchmarks.bench_tokens [--race path/to/race.json] [--number 200]
+"""
+
+import argparse
+import timeit
+
+from analyzer.prompts import SYSTEM_PROMPT, create_user_prompt
+from analyzer import tokens
+from benchmarks.sample_data import load_race
+
+
+def legacy_estimate(text: str) -> int:
+    """Per-character loop used before the shared token service"""
+    japanese_chars = sum(1 for c in text if ord(c) > 0x3000)
+    other_chars = len(text) - japanese_chars
+    return int((japanese_chars / 2) + (other_chars / 4))
+
+
+def legacy_tiktoken(text: str) -> int:
+    """Encoding lookup on every call, as GPTAnalyzer did before"""
+    import tiktoken
+    return len(tiktoken.get_encoding("o200k_base").encode(text))
+
+
+def bench(label: str, func, number: int):
+    """Time func and print the mean per call"""
+    seconds = timeit.timeit(func, number=number) / number
+    print(f"{label:<40} {seconds * 1e6:>10.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--race', help='Saved race data JSON (default: 18-horse sample)')
+    parser.add_argument('--number', type=int, default=200, help='Iterations per benchmark')
+    args = parser.parse_args()
+
+    prompt = create_user_prompt(load_race(args.race))
+    print(f"Prompt: {len(prompt):,} chars")
+    print(f"Approximate tokens: {tokens.approximate_tokens(prompt):,} (legacy: {legacy_estimate(prompt):,})")
+
+    bench("legacy per-character estimate", lambda: legacy_estimate(prompt), args.number)
+    bench("approximate_tokens", lambda: tokens.approximate_tokens(prompt), args.number)
+    bench("estimate_prompt_tokens (approx)",
+          lambda: tokens.estimate_prompt_tokens(SYSTEM_PROMPT, prompt, exact=False), args.number)
+
+    if tokens.get_encoding() is not None:
+        print(f"Exact tokens (tiktoken): {tokens.count_tokens(prompt):,}")
+        bench("legacy get_encoding per call", lambda: legacy_tiktoken(prompt), args.number)
+        bench("count_tokens (cached encoding)", lambda: tokens.count_tokens(prompt), args.number)
+        bench("estimate_prompt_tokens (exact)",
+              lambda: tokens.estimate_prompt_tokens(SYSTEM_PROMPT, prompt), args.number)
+    else:
+        print("tiktoken not installed; skipping exact benchmarks")
+
+
+if __name__ == '__main__':
+    main()
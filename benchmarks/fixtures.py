@@ -0,0 +1,143 @@
+"""
+Recorded netkeiba pages for offline benchmarks
+Maps the real URL shapes to the HTML pages saved under USER/ and debug/,
+and injects them into scrapers in place of the HTTP request.
+"""
+
+import os
+import re
+from typing import Callable, Dict, List, Optional
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Page kind -> recorded pages (first = default variant)
+FIXTURE_FILES: Dict[str, List[str]] = {
+    'race_list': [
+        'debug/race_data_scraping_problem/race_list_sub_response.html',
+        'USER/test1_race_list.html',
+    ],
+    'race_detail': [
+        'debug/race_details_html.html',
+        'USER/test2_race_detail.html',
+    ],
+    'horse_results': [
+        'debug/detail_horse_jockey_problem/horse_race_results.html',
+    ],
+    'pedigree': [
+        'debug/detail_horse_jockey_problem/pedigree_page.html',
+    ],
+    'horse_profile': [
+        'debug/detail_horse_jockey_problem/horse_page.html',
+        'USER/test3_horse.html',
+    ],
+    'jockey': [
+        'debug/detail_horse_jockey_problem/jockey_page.html',
+        'USER/test4_jockey.html',
+    ],
+}
+
+# URL path patterns -> page kind (checked in order)
+ROUTES = [
+    (re.compile(r'/top/race_list_sub\.html'), 'race_list'),
+    (re.compile(r'/race/shutuba\.html'), 'race_detail'),
+    (re.compile(r'/horse/result/[^/]+/?'), 'horse_results'),
+    (re.compile(r'/horse/ped/[^/]+/?'), 'pedigree'),
+    (re.compile(r'/horse/[^/]+/?$'), 'horse_profile'),
+    (re.compile(r'/jockey/(?:result/recent/)?[^/]+/?$'), 'jockey'),
+]
+
+_cache: Dict[str, bytes] = {}
+
+
+def route(url: str) -> Optional[str]:
+    """
+    Find the page kind of a netkeiba URL
+
+    Args:
+        url: Absolute URL or path
+
+    Returns:
+        Page kind (key of FIXTURE_FILES), or None if no recorded page matches
+    """
+    path = re.sub(r'^https?://[^/]+', '', url)
+    for pattern, kind in ROUTES:
+        if pattern.search(path.split('?', 1)[0]) or pattern.search(path):
+            return kind
+    return None
+
+
+def load_fixture(kind: str, variant: int = 0) -> bytes:
+    """
+    Read a recorded page
+
+    Args:
+        kind: Page kind (key of FIXTURE_FILES)
+        variant: Index into the recorded pages of that kind
+
+    Returns:
+        Page body as bytes
+    """
+    path = os.path.join(ROOT, FIXTURE_FILES[kind][variant])
+    if path not in _cache:
+        with open(path, 'rb') as f:
+            _cache[path] = f.read()
+    return _cache[path]
+
+
+def make_response(url: str, body: bytes, status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Build a requests.Response as returned by requests.get"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+class FixtureTransport:
+    """Stand-in for BaseScraper._request that serves recorded pages"""
+
+    def __init__(self, variants: Optional[Dict[str, int]] = None):
+        """
+        Initialize transport
+
+        Args:
+            variants: Page kind -> variant index (default 0 for every kind)
+        """
+        self.variants = variants or {}
+        self.requests: List[str] = []
+
+    def __call__(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Return the recorded page for a URL"""
+        kind = route(url)
+        if kind is None:
+            raise Exception(f"No recorded page for {url}")
+
+        self.requests.append(url)
+        return make_response(url, load_fixture(kind, self.variants.get(kind, 0)))
+
+
+def inject(scraper, transport: Callable) -> None:
+    """Replace a scraper's HTTP request (rate limiting included) with transport"""
+    scraper._request = transport
+
+
+def fixture_ids() -> Dict[str, str]:
+    """
+    Pick IDs that appear in the recorded pages
+
+    Returns:
+        Dictionary with race_id, horse_id, jockey_id and date (YYYYMMDD)
+    """
+    race_detail = load_fixture('race_detail').decode('utf-8', 'replace')
+    race_id = re.search(r'race_id=(\d{12})', race_detail)
+    horse_id = re.search(r'/horse/(\d{10})', race_detail)
+    jockey_id = re.search(r'/jockey/(?:result/recent/)?(\d{5})', race_detail)
+    return {
+        'race_id': race_id.group(1) if race_id else '202505040704',
+        'horse_id': horse_id.group(1) if horse_id else '2021105898',
+        'jockey_id': jockey_id.group(1) if jockey_id else '01170',
+        'date': '20251019',
+    }
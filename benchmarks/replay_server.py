@@ -0,0 +1,309 @@
+"""
+Local netkeiba replay server for end-to-end load testing
+Serves the recorded pages (see benchmarks/fixtures.py) under the real URL
+shapes with the requested ids templated in, and injects latency, 5xx
+errors, timeouts and a throughput cap, so concurrency, retries and rate
+limiting can be exercised offline.
+
+Point the scrapers at it with NETKEIBA_RACE_URL / NETKEIBA_DB_URL
+(or use_replay_server()).
+
+Usage:
+    python -m benchmarks.replay_server --port 8765
+    python -m benchmarks.replay_server --latency 0.3 --jitter 0.2 --error-rate 0.05 --timeout-rate 0.01 --max-rps 5
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.fixtures import load_fixture, route
+
+STATS_PATH = '/__replay/stats'
+
+# Id of the page a recording was saved from (replaced with the requested id)
+_CANONICAL = re.compile(rb'<link href="[^"]*?(?:race_id=(\d{12})|/(?:horse|jockey)/(\d+))/?" rel="canonical"')
+_HORSE_LINK = re.compile(rb'(/horse/)(\d{10})')
+
+
+class ReplayConfig:
+    """Fault and latency settings of the replay server"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 30.0, max_rps: float = 0.0,
+                 distinct_horses: bool = True, seed: Optional[int] = None):
+        """
+        Initialize replay settings
+
+        Args:
+            latency: Seconds added to every response
+            jitter: Extra random seconds (uniform 0..jitter) added to every response
+            error_rate: Share of requests answered with 500/502/503
+            timeout_rate: Share of requests held for hang_seconds (longer than REQUEST_TIMEOUT)
+            hang_seconds: How long a timed-out request is held
+            max_rps: Requests per second served before answering 503 (0 = unlimited)
+            distinct_horses: Give every race its own horse ids (jockeys and sires stay shared)
+            seed: Random seed for reproducible fault injection
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.max_rps = max_rps
+        self.distinct_horses = distinct_horses
+        self.seed = seed
+
+
+class ReplayServer:
+    """Threaded HTTP server replaying recorded netkeiba pages"""
+
+    def __init__(self, config: Optional[ReplayConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Initialize replay server
+
+        Args:
+            config: Latency and fault settings (defaults to none)
+            host: Bind address
+            port: Bind port (0 = pick a free port)
+        """
+        self.config = config or ReplayConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._tokens = self.config.max_rps
+        self._last_refill = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+
+        handler = type('ReplayHandler', (_ReplayHandler,), {'replay': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """Base URL to use instead of https://race.netkeiba.com and https://db.netkeiba.com"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'ReplayServer':
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get request counters
+
+        Returns:
+            Dictionary of counters: requests, kind:<page kind>, status:<code>,
+            throttled, timeouts and errors
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_stats(self) -> None:
+        """Clear request counters"""
+        with self._lock:
+            self._counts.clear()
+
+    def count(self, *keys: str) -> None:
+        """Increment counters"""
+        with self._lock:
+            for key in keys:
+                self._counts[key] += 1
+
+    def roll(self) -> float:
+        """Draw a uniform random number (thread-safe, seeded)"""
+        with self._lock:
+            return self._random.random()
+
+    def take_token(self) -> bool:
+        """Take one request from the throughput budget (always True when uncapped)"""
+        if self.config.max_rps <= 0:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.config.max_rps,
+                               self._tokens + (now - self._last_refill) * self.config.max_rps)
+            self._last_refill = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def render(self, kind: str, path: str, query: Dict[str, list]) -> bytes:
+        """
+        Build the page for a request from its recording
+
+        Args:
+            kind: Page kind from benchmarks.fixtures.route
+            path: Request path
+            query: Parsed query string
+
+        Returns:
+            Page body with the requested ids templated in
+        """
+        body = load_fixture(kind)
+
+        if kind == 'race_detail':
+            requested = (query.get('race_id') or [''])[0]
+        elif kind == 'race_list':
+            requested = ''
+        else:
+            ids = re.findall(r'/(\d+)/?$', path)
+            requested = ids[0] if ids else ''
+
+        recorded = _CANONICAL.search(body)
+        if requested and recorded:
+            recorded_id = recorded.group(1) or recorded.group(2)
+            body = re.sub(rb'(?<!\d)' + recorded_id + rb'(?!\d)', requested.encode(), body)
+
+        if kind == 'race_detail' and requested and self.config.distinct_horses:
+            body = _HORSE_LINK.sub(lambda m: m.group(1) + _horse_id_for(requested, m.group(2)), body)
+
+        return body
+
+
+def _horse_id_for(race_id: str, horse_id: bytes) -> bytes:
+    """Derive a stable horse id unique to a race (keeps the 4-digit birth year)"""
+    digest = hashlib.md5(race_id.encode() + horse_id).hexdigest()
+    return horse_id[:4] + f"{int(digest, 16) % 1000000:06d}".encode()
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Request handler; the server instance is attached as the replay class attribute"""
+
+    replay: ReplayServer = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Per-request logging would dominate load test output
+        pass
+
+    def do_GET(self):
+        replay = self.replay
+        config = replay.config
+        parts = urlsplit(self.path)
+
+        if parts.path == STATS_PATH:
+            self._send(200, json.dumps(replay.stats()).encode(), 'application/json')
+            return
+
+        kind = route(parts.path)
+        replay.count('requests', f"kind:{kind}")
+
+        if not replay.take_token():
+            replay.count('throttled', 'status:503')
+            self._send(503, b'throttled')
+            return
+
+        delay = config.latency + config.jitter * replay.roll()
+        if delay > 0:
+            time.sleep(delay)
+
+        if kind is None:
+            replay.count('status:404')
+            self._send(404, b'not found')
+            return
+
+        if replay.roll() < config.timeout_rate:
+            replay.count('timeouts')
+            time.sleep(config.hang_seconds)
+            self.close_connection = True
+            return
+
+        if replay.roll() < config.error_rate:
+            status = (500, 502, 503)[int(replay.roll() * 3)]
+            replay.count('errors', f"status:{status}")
+            self._send(status, b'server error')
+            return
+
+        body = replay.render(kind, parts.path, parse_qs(parts.query))
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            replay.count('status:304')
+            self._send(304, b'', headers={'ETag': etag})
+            return
+
+        replay.count('status:200')
+        self._send(200, body, headers={'ETag': etag})
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/html; charset=UTF-8',
+              headers: Optional[Dict[str, str]] = None):
+        """Write a complete response, ignoring clients that already gave up"""
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def use_replay_server(url: str) -> None:
+    """Point scrapers created from now on at a replay server"""
+    os.environ['NETKEIBA_RACE_URL'] = url
+    os.environ['NETKEIBA_DB_URL'] = url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address')
+    parser.add_argument('--port', type=int, default=8765, help='Bind port')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random seconds (0..jitter)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of 500/502/503 responses')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of requests that hang')
+    parser.add_argument('--hang-seconds', type=float, default=30.0, help='How long a hanging request is held')
+    parser.add_argument('--max-rps', type=float, default=0.0, help='Throughput cap, excess gets 503 (0 = none)')
+    parser.add_argument('--shared-horses', action='store_true',
+                        help='Serve the recorded horse ids in every race instead of per-race ids')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for fault injection')
+    args = parser.parse_args()
+
+    config = ReplayConfig(args.latency, args.jitter, args.error_rate, args.timeout_rate, args.hang_seconds,
+                          args.max_rps, not args.shared_horses, args.seed)
+    server = ReplayServer(config, args.host, args.port)
+
+    print(f"Replaying netkeiba on {server.url}")
+    print(f"  export NETKEIBA_RACE_URL={server.url} NETKEIBA_DB_URL={server.url}")
+    print(f"  stats: {server.url}{STATS_PATH}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from typing import Optional, Dict, Any
 from decimal import Decimal
 import boto3
 from botocore.exceptions import ClientError
+from utils import tracing
 
 
 class DynamoDBCache:
@@ -80,6 +81,13 @@ class DynamoDBCache:
         Returns:
             Cached data dictionary or None if not found/expired
         """
+        with tracing.span('cache.get', tier='dynamodb', key_prefix=partition_key.split('#', 1)[0]) as span:
+            data = self._get_item(partition_key, sort_key)
+            span.set(hit=data is not None)
+            return data
+
+    def _get_item(self, partition_key: str, sort_key: str) -> Optional[Dict[str, Any]]:
+        """Read one item, checking its TTL"""
         try:
             response = self.table.get_item(
                 Key={
@@ -114,7 +122,8 @@ class DynamoDBCache:
             print(f"Unexpected error retrieving from cache: {e}")
             return None
 
-    def set(self, partition_key: str, sort_key: str, data: Dict[str, Any]) -> bool:
+    def set(self, partition_key: str, sort_key: str, data: Dict[str, Any],
+            ttl_seconds: Optional[int] = None) -> bool:
         """
         Store data in cache with TTL
 
@@ -122,13 +131,22 @@ class DynamoDBCache:
             partition_key: Primary partition key (PK)
             sort_key: Sort key (SK)
             data: Data to store
+            ttl_seconds: Lifetime of this item (defaults to CACHE_TTL_SECONDS)
 
         Returns:
             True if successful, False otherwise
         """
+        with tracing.span('cache.set', tier='dynamodb', key_prefix=partition_key.split('#', 1)[0]) as span:
+            stored = self._put_item(partition_key, sort_key, data, ttl_seconds)
+            span.set(stored=stored)
+            return stored
+
+    def _put_item(self, partition_key: str, sort_key: str, data: Dict[str, Any],
+                  ttl_seconds: Optional[int] = None) -> bool:
+        """Write one item with its TTL"""
         try:
             current_time = int(time.time())
-            ttl = current_time + self.ttl_seconds
+            ttl = current_time + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
 
             # Convert all floats to Decimal for DynamoDB compatibility
             converted_data = self._convert_floats_to_decimal(data)
@@ -190,11 +208,11 @@ class DynamoDBCache:
         sk = "IDS"
         return self.get(pk, sk)
 
-    def set_race_ids(self, date: str, track: str, race_ids: Dict) -> bool:
+    def set_race_ids(self, date: str, track: str, race_ids: Dict, ttl_seconds: Optional[int] = None) -> bool:
         """Store race IDs for a specific date and track"""
         pk = f"RACE#{date}#{track}"
         sk = "IDS"
-        return self.set(pk, sk, race_ids)
+        return self.set(pk, sk, race_ids, ttl_seconds)
 
     def get_race_metadata(self, race_id: str) -> Optional[Dict]:
         """Get race metadata by race ID"""
@@ -244,39 +262,55 @@ class DynamoDBCache:
         sk = "STATS"
         return self.set(pk, sk, stats)
 
-    def _generate_prompt_hash(self, custom_prompt: str) -> str:
+    def get_horse_analysis(self, horse_id: str, fingerprint: str) -> Optional[Dict]:
+        """Get cached individual analysis for a horse by data fingerprint"""
+        pk = f"HORSE#{horse_id}"
+        sk = f"ANALYSIS#{fingerprint}"
+        return self.get(pk, sk)
+
+    def set_horse_analysis(self, horse_id: str, fingerprint: str, analysis: Dict) -> bool:
+        """Store individual analysis for a horse by data fingerprint"""
+        pk = f"HORSE#{horse_id}"
+        sk = f"ANALYSIS#{fingerprint}"
+        return self.set(pk, sk, analysis)
+
+    def _generate_prompt_hash(self, custom_prompt: str, settings: str = "") -> str:
         """
-        Generate a hash for custom prompt
+        Generate a hash for custom prompt and analysis settings
 
         Args:
             custom_prompt: Custom prompt string (empty string if no custom prompt)
+            settings: Analysis settings that change the result (e.g. "mode=single;prerank=0")
 
         Returns:
-            MD5 hash of the prompt (or "default" if empty)
+            MD5 hash of the prompt and settings (or "default" if both are empty)
         """
-        if not custom_prompt or custom_prompt.strip() == "":
+        if (not custom_prompt or custom_prompt.strip() == "") and not settings:
             return "default"
 
-        # Generate MD5 hash of the prompt
-        return hashlib.md5(custom_prompt.encode('utf-8')).hexdigest()
+        # Generate MD5 hash of the prompt (settings first, so prompts cannot collide with them)
+        key = f"{settings}\n{custom_prompt}" if settings else custom_prompt
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
 
-    def get_llm_analysis(self, race_id: str, custom_prompt: str = "") -> Optional[Dict]:
+    def get_llm_analysis(self, race_id: str, custom_prompt: str = "", settings: str = "") -> Optional[Dict]:
         """
         Get cached LLM analysis result
 
         Args:
             race_id: Race identifier
             custom_prompt: Custom prompt used for analysis (empty string if none)
+            settings: Analysis settings the result was built with
 
         Returns:
             Cached analysis result or None if not found/expired
         """
-        prompt_hash = self._generate_prompt_hash(custom_prompt)
+        prompt_hash = self._generate_prompt_hash(custom_prompt, settings)
         pk = f"ANALYSIS#{race_id}"
         sk = f"PROMPT#{prompt_hash}"
         return self.get(pk, sk)
 
-    def set_llm_analysis(self, race_id: str, custom_prompt: str, analysis_result: Dict) -> bool:
+    def set_llm_analysis(self, race_id: str, custom_prompt: str, analysis_result: Dict,
+                         settings: str = "") -> bool:
         """
         Store LLM analysis result in cache
 
@@ -284,11 +318,12 @@ class DynamoDBCache:
             race_id: Race identifier
             custom_prompt: Custom prompt used for analysis (empty string if none)
             analysis_result: Complete analysis result including raw_response, tokens_used, cost_usd
+            settings: Analysis settings the result was built with
 
         Returns:
             True if successful, False otherwise
         """
-        prompt_hash = self._generate_prompt_hash(custom_prompt)
+        prompt_hash = self._generate_prompt_hash(custom_prompt, settings)
         pk = f"ANALYSIS#{race_id}"
         sk = f"PROMPT#{prompt_hash}"
 
@@ -296,7 +331,8 @@ class DynamoDBCache:
         data = {
             'analysis_result': analysis_result,
             'custom_prompt': custom_prompt,
-            'prompt_hash': prompt_hash
+            'prompt_hash': prompt_hash,
+            'settings': settings
         }
 
         return self.set(pk, sk, data)
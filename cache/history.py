@@ -0,0 +1,307 @@
+"""
+Local historical results store
+Keeps every scraped race-result row per horse in SQLite, deduplicated by
+(horse_id, date, race), with indexes for horse, jockey, course and date
+lookups.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from analyzer.features import parse_distance, parse_float, parse_position, parse_time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS race_results (
+    horse_id TEXT NOT NULL,
+    race_date TEXT NOT NULL,
+    race_key TEXT NOT NULL,
+    race_id TEXT,
+    race_name TEXT,
+    venue TEXT,
+    surface INTEGER,
+    distance_meters INTEGER,
+    position INTEGER,
+    time_seconds REAL,
+    margin TEXT,
+    jockey TEXT,
+    odds REAL,
+    popularity INTEGER,
+    last_3f REAL,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (horse_id, race_date, race_key)
+);
+CREATE INDEX IF NOT EXISTS idx_results_jockey ON race_results (jockey, race_date);
+CREATE INDEX IF NOT EXISTS idx_results_course ON race_results (venue, surface, distance_meters);
+CREATE INDEX IF NOT EXISTS idx_results_date ON race_results (race_date);
+"""
+
+_COLUMNS = [
+    'horse_id', 'race_date', 'race_key', 'race_id', 'race_name', 'venue', 'surface',
+    'distance_meters', 'position', 'time_seconds', 'margin', 'jockey', 'odds',
+    'popularity', 'last_3f', 'data', 'updated_at'
+]
+
+# Later fetches replace the stored row so corrections and richer rows win
+_UPSERT = (
+    f"INSERT INTO race_results ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+    f"ON CONFLICT (horse_id, race_date, race_key) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[3:])
+)
+
+
+def normalize_date(date_str: str) -> str:
+    """
+    Normalize a result date to ISO format
+
+    Args:
+        date_str: Date text (e.g. "2025/10/05", "2025.10.05")
+
+    Returns:
+        Date as YYYY-MM-DD, or the stripped input if it cannot be parsed
+    """
+    text = (date_str or '').strip().replace('.', '/').replace('-', '/')
+    try:
+        return datetime.strptime(text, '%Y/%m/%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return (date_str or '').strip()
+
+
+def venue_name(venue: str) -> str:
+    """Strip the meeting/day numbers from a venue cell (e.g. "2東京8" -> "東京")"""
+    return ''.join(c for c in (venue or '') if not c.isdigit())
+
+
+def race_key(result: Dict) -> str:
+    """
+    Identify the race of a result row
+
+    Args:
+        result: Result row from HorseScraper
+
+    Returns:
+        race_id when the row links to the race, otherwise venue + race number/name
+    """
+    if result.get('race_id'):
+        return result['race_id']
+
+    venue = result.get('venue', result.get('track', ''))
+    return f"{venue}#{result.get('race_number', '') or result.get('race_name', '') or result.get('distance', '')}"
+
+
+class HistoryStore:
+    """SQLite store of individual race-result rows for every scraped horse"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize history store
+
+        Args:
+            path: SQLite file (defaults to HISTORY_DB_PATH)
+        """
+        self.path = path or os.getenv('HISTORY_DB_PATH', 'data/history.sqlite3')
+        self.enabled = os.getenv('HISTORY_ENABLED', 'true').lower() == 'true'
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a SQLite connection that commits and closes on exit"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _to_row(self, horse_id: str, result: Dict, updated_at: str) -> List:
+        """Convert a scraper result row to table values"""
+        get = result.get
+        distance = parse_distance(get('distance'))
+        position = parse_position(get('finish_position', get('position')))
+        popularity = parse_float(get('popularity'))
+
+        values = {
+            'horse_id': horse_id,
+            'race_date': normalize_date(get('date', '')),
+            'race_key': race_key(result),
+            'race_id': get('race_id') or None,
+            'race_name': get('race_name') or None,
+            'venue': venue_name(get('venue', get('track', ''))),
+            'surface': int(distance['surface']) if distance['surface'] is not None else None,
+            'distance_meters': int(distance['distance_meters']) if distance['distance_meters'] else None,
+            'position': int(position) if position is not None else None,
+            'time_seconds': parse_time(get('time')),
+            'margin': get('margin') or None,
+            'jockey': get('jockey') or None,
+            'odds': parse_float(get('odds')),
+            'popularity': int(popularity) if popularity is not None else None,
+            'last_3f': parse_float(get('last_3f')),
+            'data': json.dumps(result, ensure_ascii=False, default=str),
+            'updated_at': updated_at
+        }
+        return [values[column] for column in _COLUMNS]
+
+    def add_results(self, horse_id: str, results: List[Dict]) -> int:
+        """
+        Insert or update result rows for a horse
+
+        Args:
+            horse_id: Horse identifier
+            results: Result rows from HorseScraper (any order)
+
+        Returns:
+            Number of rows written (0 if disabled or on error)
+        """
+        if not self.enabled or not results:
+            return 0
+
+        updated_at = datetime.now().isoformat(timespec='seconds')
+        rows = [self._to_row(horse_id, result, updated_at) for result in results if result.get('date')]
+
+        try:
+            with self._lock, self._connect() as conn:
+                conn.executemany(_UPSERT, rows)
+            return len(rows)
+
+        except Exception as e:
+            print(f"Error writing history for {horse_id}: {e}")
+            return 0
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        """Run a query and decode the stored result rows (most recent first)"""
+        if not self.enabled:
+            return []
+
+        try:
+            with self._connect() as conn:
+                return [json.loads(row['data']) for row in conn.execute(sql, params)]
+        except Exception as e:
+            print(f"Error reading history: {e}")
+            return []
+
+    def get_horse_history(self, horse_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get stored results for a horse
+
+        Args:
+            horse_id: Horse identifier
+            limit: Maximum number of rows (None = all)
+
+        Returns:
+            Result rows in scraper format, most recent first
+        """
+        sql = "SELECT data FROM race_results WHERE horse_id = ? ORDER BY race_date DESC"
+        params: tuple = (horse_id,)
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        return self._query(sql, params)
+
+    def get_jockey_results(self, jockey: str, since: Optional[str] = None) -> List[Dict]:
+        """
+        Get stored results ridden by a jockey
+
+        Args:
+            jockey: Jockey name as shown in the results table
+            since: Only rows on or after this date (YYYY-MM-DD)
+
+        Returns:
+            Result rows in scraper format, most recent first
+        """
+        return self._query(
+            "SELECT data FROM race_results WHERE jockey = ? AND race_date >= ? ORDER BY race_date DESC",
+            (jockey, since or '')
+        )
+
+    def get_course_record(self, horse_id: str, venue: str, distance_meters: int,
+                          surface: Optional[int] = None) -> Dict:
+        """
+        Get a horse's record at a course and distance
+
+        Args:
+            horse_id: Horse identifier
+            venue: Venue name (e.g. "東京")
+            distance_meters: Distance in meters
+            surface: Surface code (0 芝, 1 ダート, 2 障害; None = any)
+
+        Returns:
+            Dictionary with runs, first, second, third, fourth_or_lower
+        """
+        record = {'runs': 0, 'first': 0, 'second': 0, 'third': 0, 'fourth_or_lower': 0}
+        if not self.enabled:
+            return record
+
+        sql = ("SELECT position FROM race_results "
+               "WHERE horse_id = ? AND venue = ? AND distance_meters = ?")
+        params: tuple = (horse_id, venue_name(venue), distance_meters)
+        if surface is not None:
+            sql += " AND surface = ?"
+            params += (surface,)
+
+        with self._connect() as conn:
+            for row in conn.execute(sql, params):
+                record['runs'] += 1
+                position = row['position']
+                if position == 1:
+                    record['first'] += 1
+                elif position == 2:
+                    record['second'] += 1
+                elif position == 3:
+                    record['third'] += 1
+                else:
+                    record['fourth_or_lower'] += 1
+
+        return record
+
+    def last_race_date(self, horse_id: str) -> Optional[str]:
+        """
+        Get the date of a horse's most recent stored race
+
+        Args:
+            horse_id: Horse identifier
+
+        Returns:
+            Date as YYYY-MM-DD, or None if the horse has no stored results
+        """
+        if not self.enabled:
+            return None
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MAX(race_date) AS last_date FROM race_results WHERE horse_id = ?",
+                (horse_id,)
+            ).fetchone()
+
+        return row['last_date'] if row else None
+
+    def race_dates(self, since: str) -> List[str]:
+        """
+        Get the distinct race dates in the store
+
+        Args:
+            since: Only dates on or after this date (YYYY-MM-DD)
+
+        Returns:
+            Dates as YYYY-MM-DD, ascending
+        """
+        if not self.enabled:
+            return []
+
+        with self._connect() as conn:
+            return [row['race_date'] for row in conn.execute(
+                "SELECT DISTINCT race_date FROM race_results WHERE race_date >= ? ORDER BY race_date",
+                (since,)
+            )]
@@ -0,0 +1,310 @@
+"""
+Page validator cache for conditional GET revalidation
+Stores the ETag/Last-Modified validators of fetched netkeiba pages together
+with the parsed result, so an expired page is revalidated with
+If-None-Match/If-Modified-Since and a 304 reuses the parsed result without
+downloading or parsing the page again.
+
+Usage:
+    python -m cache.pages            # revalidation report per day
+    python -m cache.pages --days 7
+"""
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from utils import tracing
+
+# Outcomes of a fetch through the page cache
+FRESH = 'fresh'                # Served from cache without a request
+NOT_MODIFIED = 'not_modified'  # Revalidated, 304
+MODIFIED = 'modified'          # Revalidated, 200 with a new page
+MISS = 'miss'                  # No usable entry (or no validators), full download
+
+OUTCOMES = [FRESH, NOT_MODIFIED, MODIFIED, MISS]
+
+# Outcome counts are kept in memory and written with the next page write, or
+# after this many fetches / seconds, instead of one commit per fetch
+STATS_FLUSH_COUNT = 100
+STATS_FLUSH_SECONDS = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    parser TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_length INTEGER,
+    parsed TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (url, parser)
+);
+CREATE TABLE IF NOT EXISTS page_stats (
+    day TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    bytes_saved INTEGER NOT NULL,
+    PRIMARY KEY (day, outcome)
+);
+"""
+
+
+class PageCache:
+    """SQLite store of page validators and parsed results"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize page cache
+
+        Args:
+            path: SQLite file (defaults to PAGE_CACHE_PATH)
+        """
+        self.path = path or os.getenv('PAGE_CACHE_PATH', 'data/pages.sqlite3')
+        self.enabled = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+        self.ttl_seconds = int(os.getenv('PAGE_CACHE_TTL_SECONDS', '86400'))  # 1 day default
+        self._lock = threading.Lock()
+
+        # (day, outcome) -> [requests, bytes_saved] not yet written
+        self._pending_stats: Dict[tuple, List[int]] = {}
+        self._pending_count = 0
+        self._last_flush = time.time()
+
+        if self.enabled:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            atexit.register(self.flush_stats)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a SQLite connection that commits and closes on exit"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, url: str, parser: str) -> Optional[Dict]:
+        """
+        Get a cached page entry
+
+        Args:
+            url: Page URL
+            parser: Name of the parser whose result is stored
+
+        Returns:
+            Dictionary containing etag, last_modified, content_length, parsed,
+            fetched_at, expires_at and fresh (bool), or None
+        """
+        if not self.enabled:
+            return None
+
+        with tracing.span('cache.get', tier='pages', key_prefix=parser) as span:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT * FROM pages WHERE url = ? AND parser = ?", (url, parser)
+                    ).fetchone()
+            except Exception as e:
+                print(f"Error reading page cache: {e}")
+                return None
+            span.set(hit=row is not None)
+
+        if not row:
+            return None
+
+        entry = dict(row)
+        entry['parsed'] = json.loads(entry['parsed'])
+        entry['fresh'] = entry['expires_at'] > time.time()
+        return entry
+
+    def put(self, url: str, parser: str, parsed: Dict, etag: Optional[str] = None,
+            last_modified: Optional[str] = None, content_length: int = 0,
+            ttl: Optional[int] = None) -> bool:
+        """
+        Store a parsed page with its validators
+
+        Args:
+            url: Page URL
+            parser: Name of the parser that produced parsed
+            parsed: Parsed result (JSON serializable)
+            etag: ETag response header
+            last_modified: Last-Modified response header
+            content_length: Downloaded size in bytes (counted as saved on later 304s)
+            ttl: Seconds until revalidation (defaults to PAGE_CACHE_TTL_SECONDS)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.enabled:
+            return False
+
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO pages (url, parser, etag, last_modified, content_length, "
+                    "parsed, fetched_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, parser, etag, last_modified, content_length,
+                     json.dumps(parsed, ensure_ascii=False), now, now + (ttl or self.ttl_seconds))
+                )
+                self._write_stats(conn)
+            return True
+
+        except Exception as e:
+            print(f"Error writing page cache: {e}")
+            return False
+
+    def touch(self, url: str, parser: str, ttl: Optional[int] = None) -> bool:
+        """
+        Extend the TTL of an entry after a 304
+
+        Args:
+            url: Page URL
+            parser: Parser name
+            ttl: Seconds until the next revalidation (defaults to PAGE_CACHE_TTL_SECONDS)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "UPDATE pages SET expires_at = ? WHERE url = ? AND parser = ?",
+                    (time.time() + (ttl or self.ttl_seconds), url, parser)
+                )
+                self._write_stats(conn)
+            return True
+
+        except Exception as e:
+            print(f"Error updating page cache: {e}")
+            return False
+
+    def record(self, outcome: str, bytes_saved: int = 0) -> None:
+        """
+        Count a fetch outcome for the revalidation report
+
+        Counts are buffered in memory and written together with the next
+        put/touch, or every STATS_FLUSH_COUNT fetches / STATS_FLUSH_SECONDS.
+
+        Args:
+            outcome: One of OUTCOMES
+            bytes_saved: Transfer avoided (page size for fresh hits and 304s)
+        """
+        if not self.enabled:
+            return
+
+        day = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            counts = self._pending_stats.setdefault((day, outcome), [0, 0])
+            counts[0] += 1
+            counts[1] += bytes_saved
+            self._pending_count += 1
+            due = (self._pending_count >= STATS_FLUSH_COUNT
+                   or time.time() - self._last_flush >= STATS_FLUSH_SECONDS)
+
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self) -> None:
+        """Write the buffered outcome counts"""
+        if not self.enabled:
+            return
+
+        try:
+            with self._lock, self._connect() as conn:
+                self._write_stats(conn)
+        except Exception as e:
+            print(f"Error writing page cache stats: {e}")
+
+    def _write_stats(self, conn: sqlite3.Connection) -> None:
+        """Add the buffered counts in conn's transaction (caller holds the lock)"""
+        self._last_flush = time.time()
+        if not self._pending_stats:
+            return
+
+        conn.executemany(
+            "INSERT INTO page_stats (day, outcome, requests, bytes_saved) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, outcome) DO UPDATE SET requests = requests + excluded.requests, "
+            "bytes_saved = bytes_saved + excluded.bytes_saved",
+            [(day, outcome, requests, saved) for (day, outcome), (requests, saved) in self._pending_stats.items()]
+        )
+        self._pending_stats = {}
+        self._pending_count = 0
+
+    def report(self, since: Optional[str] = None) -> List[Dict]:
+        """
+        Summarize fetch outcomes per day
+
+        Args:
+            since: Only days on or after this date (YYYY-MM-DD)
+
+        Returns:
+            List of dictionaries sorted by day, each containing day, one count per
+            OUTCOMES entry, revalidations, saved_ratio (304s / revalidations),
+            requests_avoided_ratio ((fresh + 304) / all fetches) and bytes_saved
+        """
+        if not self.enabled or not os.path.exists(self.path):
+            return []
+
+        self.flush_stats()
+        days: Dict[str, Dict] = {}
+        with self._connect() as conn:
+            for row in conn.execute(
+                "SELECT day, outcome, requests, bytes_saved FROM page_stats WHERE day >= ? ORDER BY day",
+                (since or '',)
+            ):
+                day = days.setdefault(row['day'], {'day': row['day'], 'bytes_saved': 0,
+                                                   **{outcome: 0 for outcome in OUTCOMES}})
+                day[row['outcome']] = row['requests']
+                day['bytes_saved'] += row['bytes_saved']
+
+        for day in days.values():
+            revalidations = day[NOT_MODIFIED] + day[MODIFIED]
+            total = sum(day[outcome] for outcome in OUTCOMES)
+            day['revalidations'] = revalidations
+            day['saved_ratio'] = day[NOT_MODIFIED] / revalidations if revalidations else 0.0
+            day['requests_avoided_ratio'] = (day[FRESH] + day[NOT_MODIFIED]) / total if total else 0.0
+
+        return [days[key] for key in sorted(days)]
+
+
+def main():
+    """Print the revalidation report"""
+    parser = argparse.ArgumentParser(description="Page cache revalidation report")
+    parser.add_argument('--days', type=int, default=None, help="Only include the last N days")
+    parser.add_argument('--path', default=None, help="Page cache file (defaults to PAGE_CACHE_PATH)")
+    args = parser.parse_args()
+
+    since = (datetime.now() - timedelta(days=args.days)).strftime('%Y-%m-%d') if args.days else None
+    report = PageCache(args.path).report(since)
+
+    if not report:
+        print("No page cache statistics")
+        return
+
+    print(f"{'day':<10} {'fresh':>7} {'304':>7} {'200':>7} {'miss':>7} {'304 rate':>9} {'avoided':>8} {'saved MB':>9}")
+    for r in report:
+        print(f"{r['day']:<10} {r[FRESH]:>7} {r[NOT_MODIFIED]:>7} {r[MODIFIED]:>7} {r[MISS]:>7} "
+              f"{r['saved_ratio'] * 100:>8.1f}% {r['requests_avoided_ratio'] * 100:>7.1f}% "
+              f"{r['bytes_saved'] / 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
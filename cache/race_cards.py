@@ -0,0 +1,194 @@
+"""
+Race card index per date
+Keeps the race list of a date (race_id, track, race number, name, post time
+and field size) in process memory and in DynamoDB, so every session and the
+warm job share one list fetch per date. Lists of today and later dates
+expire quickly (entries and post times still change); past dates are kept
+for a long time.
+
+Lookups by race_id and by (track, race number) are dictionary hits.
+"""
+
+import os
+import re
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from keiba.race_id import parse_race_id, track_code
+
+# DynamoDB sort-key "track" under which the whole day's list is stored
+ALL_TRACKS = 'ALL'
+
+_MEETING_DAY = re.compile(r'\d+回|\d+日目')
+
+
+def track_key(track_name: str) -> str:
+    """
+    Lookup key of a track
+
+    Args:
+        track_name: Track name ("東京") or race list header ("4回東京6日目")
+
+    Returns:
+        JRA track code ("05"), or the name without meeting/day numbers for other tracks
+    """
+    return track_code(track_name) or _MEETING_DAY.sub('', track_name or '').strip()
+
+
+class RaceCard:
+    """Races of one date with constant-time lookups"""
+
+    def __init__(self, date: str, races: List[Dict], fetched_at: Optional[float] = None):
+        """
+        Build the lookup tables
+
+        Args:
+            date: Date in YYYYMMDD format
+            races: Races from RaceScraper.fetch_races_by_date
+            fetched_at: Unix time the list was scraped (defaults to now)
+        """
+        self.date = date
+        self.fetched_at = float(fetched_at) if fetched_at is not None else time.time()
+        # DynamoDB returns numbers as Decimal
+        self.races = [{**race, 'race_number': int(race['race_number']),
+                       'field_size': int(race.get('field_size') or 0),
+                       'post_time': race.get('post_time', '')} for race in races]
+
+        self.by_id: Dict[str, Dict] = {race['race_id']: race for race in self.races}
+        self.by_slot: Dict[Tuple[str, int], Dict] = {}
+        self.by_track: Dict[str, List[Dict]] = {}
+        for race in self.races:
+            # The race_id encodes the track, so headers in any format map to the same key
+            parsed = parse_race_id(race['race_id'])
+            key = parsed['track_code'] if parsed and parsed['track_name'] else track_key(race['track_name'])
+            self.by_slot[(key, race['race_number'])] = race
+            self.by_track.setdefault(race['track_name'], []).append(race)
+
+    def tracks(self) -> List[str]:
+        """Track names in list order"""
+        return list(self.by_track)
+
+    def races_at(self, track_name: str) -> List[Dict]:
+        """Races of one track (as listed in the race list header)"""
+        return self.by_track.get(track_name, [])
+
+    def get(self, race_id: str) -> Optional[Dict]:
+        """Race entry by race_id"""
+        return self.by_id.get(race_id)
+
+    def get_race_id(self, track_name: str, race_number: int) -> Optional[str]:
+        """
+        Look up a race_id by track and race number
+
+        Args:
+            track_name: Track name, plain ("東京") or as listed ("4回東京6日目")
+            race_number: Race number (1-12)
+
+        Returns:
+            race_id string or None if not on this card
+        """
+        race = self.by_slot.get((track_key(track_name), int(race_number)))
+        return race['race_id'] if race else None
+
+    def to_dict(self) -> Dict:
+        """Cache representation"""
+        return {'date': self.date, 'fetched_at': int(self.fetched_at), 'races': self.races}
+
+
+class RaceCardIndex:
+    """Date -> RaceCard, cached in memory (per process) and in DynamoDB (shared)"""
+
+    # Shared by every session of the process, like BaseScraper.rate_limiter
+    _memory: Dict[str, Tuple[float, RaceCard]] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache=None, scraper=None):
+        """
+        Initialize race card index
+
+        Args:
+            cache: DynamoDBCache for the shared tier (None = memory only)
+            scraper: RaceScraper used on a miss (created on first use)
+        """
+        self.cache = cache
+        self._scraper = scraper
+        self.ttl_today = int(os.getenv('RACE_CARD_TTL_SECONDS', '600'))
+        self.ttl_past = int(os.getenv('RACE_CARD_PAST_TTL_SECONDS', '2592000'))
+
+    @property
+    def scraper(self):
+        if self._scraper is None:
+            from scraper.race import RaceScraper
+            self._scraper = RaceScraper()
+        return self._scraper
+
+    def ttl_for(self, date: str) -> int:
+        """Seconds a date's list stays valid (long for past dates, short from today on)"""
+        if date < datetime.now().strftime('%Y%m%d'):
+            return self.ttl_past
+        return self.ttl_today
+
+    def get(self, date: str, refresh: bool = False) -> RaceCard:
+        """
+        Get the race card of a date
+
+        Args:
+            date: Date in YYYYMMDD format
+            refresh: Ignore cached lists and fetch again
+
+        Returns:
+            RaceCard (empty if netkeiba lists no races; empty lists are not cached)
+        """
+        ttl = self.ttl_for(date)
+        now = time.time()
+
+        if not refresh:
+            with self._lock:
+                entry = self._memory.get(date)
+            if entry and entry[0] > now:
+                return entry[1]
+
+            stored = self.cache.get_race_ids(date, ALL_TRACKS) if self.cache is not None else None
+            if stored and stored.get('races') and float(stored.get('fetched_at', 0)) + ttl > now:
+                card = RaceCard(date, stored['races'], stored.get('fetched_at'))
+                self._remember(card, ttl)
+                return card
+
+        card = RaceCard(date, self.scraper.fetch_races_by_date(date))
+        if card.races:
+            self._remember(card, ttl)
+            if self.cache is not None:
+                self.cache.set_race_ids(date, ALL_TRACKS, card.to_dict(), ttl)
+        return card
+
+    def get_race_id(self, date: str, track_name: str, race_number: int) -> Optional[str]:
+        """
+        Look up a race_id by date, track and race number
+
+        Args:
+            date: Date in YYYYMMDD format
+            track_name: Track name (e.g. "東京")
+            race_number: Race number (1-12)
+
+        Returns:
+            race_id string or None if not found
+        """
+        return self.get(date).get_race_id(track_name, race_number)
+
+    @classmethod
+    def race_dates(cls) -> List[str]:
+        """
+        Dates (YYYY-MM-DD) of the race cards held in process memory
+
+        Returns:
+            Sorted dates whose card lists at least one race
+        """
+        with cls._lock:
+            dates = [date for date, (_, card) in cls._memory.items() if card.races]
+        return sorted(f"{date[:4]}-{date[4:6]}-{date[6:8]}" for date in dates)
+
+    def _remember(self, card: RaceCard, ttl: int) -> None:
+        """Keep a card in process memory until it expires"""
+        with self._lock:
+            self._memory[card.date] = (card.fetched_at + ttl, card)
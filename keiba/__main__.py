@@ -0,0 +1,54 @@
+"""
+Headless command line entry point
+
+Usage:
+    python -m keiba warm --date 20251019
+    python -m keiba warm --date 20251019 --tracks 東京,京都 --workers 4
+"""
+
+import sys
+import argparse
+from datetime import datetime
+
+
+def _date_arg(value: str) -> str:
+    """Validate a YYYYMMDD date argument"""
+    try:
+        datetime.strptime(value, '%Y%m%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYYMMDD, got {value!r}")
+    return value
+
+
+def main(argv=None) -> int:
+    """Parse arguments and run the selected command"""
+    parser = argparse.ArgumentParser(prog='python -m keiba', description="Keiba data jobs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    warm = subparsers.add_parser('warm', help="Fetch all race-day data into the cache")
+    warm.add_argument('--date', type=_date_arg, default=datetime.now().strftime('%Y%m%d'),
+                      help="Race date YYYYMMDD (default: today)")
+    warm.add_argument('--tracks', default=None, help="Comma-separated tracks (e.g. 東京,京都)")
+    warm.add_argument('--workers', type=int, default=None,
+                      help="Concurrent fetches (default: FETCH_CONCURRENCY)")
+    warm.add_argument('--manifest', default=None,
+                      help="Job manifest path (default: JOB_MANIFEST_DIR/warm-DATE.json)")
+    warm.add_argument('--max-attempts', type=int, default=3,
+                      help="Attempts per entity across runs before giving up")
+    warm.add_argument('--priority', choices=['prefetch', 'backfill'], default='prefetch',
+                      help="Scheduler class; backfill yields to prefetch and interactive requests")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'warm':
+        # Imported here so --help works without scraper/AWS dependencies
+        from .warm import run_warm
+        _, exit_code = run_warm(args.date, args.tracks, args.manifest, args.workers,
+                               args.max_attempts, args.priority)
+        return exit_code
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
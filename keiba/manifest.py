@@ -0,0 +1,123 @@
+"""
+Persistent job manifest
+Records the status of every entity of a batch job in a JSON file so an
+interrupted run can resume without redoing finished work.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobManifest:
+    """JSON file of entity statuses for one batch job"""
+
+    def __init__(self, path: str, job: Optional[Dict] = None, save_every: int = 20):
+        """
+        Load or create a manifest
+
+        Args:
+            path: Manifest file
+            job: Job parameters stored with a new manifest (e.g. command, date)
+            save_every: Write the file after this many status changes
+        """
+        self.path = path
+        self.save_every = save_every
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {
+                'job': job or {},
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'entities': {}
+            }
+
+    @property
+    def entities(self) -> Dict[str, Dict]:
+        """Entity key to status record"""
+        return self.data['entities']
+
+    def status(self, key: str) -> Optional[str]:
+        """Get the status of an entity (None if never run)"""
+        return self.entities.get(key, {}).get('status')
+
+    def is_done(self, key: str) -> bool:
+        """Whether an entity finished successfully in this or an earlier run"""
+        return self.status(key) == DONE
+
+    def pending(self, keys: Iterable[str], max_attempts: int = 3) -> List[str]:
+        """
+        Filter entities that still need to run
+
+        Args:
+            keys: Entity keys
+            max_attempts: Failed entities are retried until they reach this many attempts
+
+        Returns:
+            Keys that are neither done nor out of attempts, in input order
+        """
+        result = []
+        for key in keys:
+            record = self.entities.get(key, {})
+            if record.get('status') == DONE:
+                continue
+            if record.get('status') == FAILED and record.get('attempts', 0) >= max_attempts:
+                continue
+            result.append(key)
+        return result
+
+    def mark_done(self, key: str, **info) -> None:
+        """Record a successful entity"""
+        self._mark(key, DONE, None, info)
+
+    def mark_failed(self, key: str, error: str) -> None:
+        """Record a failed entity"""
+        self._mark(key, FAILED, error, {})
+
+    def _mark(self, key: str, status: str, error: Optional[str], info: Dict) -> None:
+        """Update an entity record and save periodically"""
+        with self._lock:
+            record = self.entities.setdefault(key, {'attempts': 0})
+            record['attempts'] = record.get('attempts', 0) + 1
+            record['status'] = status
+            record['error'] = error
+            record['updated_at'] = datetime.now().isoformat(timespec='seconds')
+            record.update(info)
+
+            self._pending += 1
+            if self._pending >= self.save_every:
+                self._save_locked()
+
+    def counts(self) -> Dict[str, int]:
+        """Count entities per status"""
+        counts = {DONE: 0, FAILED: 0}
+        for record in self.entities.values():
+            counts[record.get('status')] = counts.get(record.get('status'), 0) + 1
+        return counts
+
+    def save(self) -> None:
+        """Write the manifest atomically"""
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self) -> None:
+        """Write the manifest (caller holds the lock)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.data['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
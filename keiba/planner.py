@@ -0,0 +1,420 @@
+"""
+Deduplicated entity graph planner for multi-race fetching
+Builds the entity graph of a set of races (race -> horses and jockeys,
+horse -> results page and pedigree page, pedigree -> sire/dam pages),
+collapses duplicates so every unique page is fetched once, and fans the
+results back out to every race that needs them.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+from scraper.race import RaceScraper
+from scraper.horse import HorseScraper
+from scraper.jockey import JockeyScraper
+from scraper.engine import FetchEngine
+from cache.dynamodb import DynamoDBCache
+from cache.history import HistoryStore
+from cache.race_cards import RaceCardIndex
+from analyzer.features import ensure_result_columns
+from utils import tracing
+from .race_id import is_valid_race_id, track_name as race_track_name
+
+# Entity kinds: horse results page, pedigree (+ parent pages), jockey page
+ENTITY_KINDS = ('horse', 'parents', 'jockey')
+
+# on_done(key, data, error, fetched): called once per entity; fetched is False for cache hits
+DoneCallback = Callable[[str, Optional[Dict], Optional[Exception], bool], None]
+
+
+class EntityGraph:
+    """Races and the unique horse/jockey entities they need"""
+
+    def __init__(self):
+        """Initialize empty graph"""
+        self.races: Dict[str, Dict] = {}
+        self.race_ids: List[str] = []
+        # Entity id -> race_ids that need it (insertion ordered)
+        self.horses: Dict[str, List[str]] = {}
+        self.jockeys: Dict[str, List[str]] = {}
+        # Runner slots before deduplication
+        self.horse_slots = 0
+        self.jockey_slots = 0
+
+    def add_race(self, race_id: str, metadata: Optional[Dict] = None,
+                 horse_ids: Optional[List[str]] = None, jockey_ids: Optional[List[str]] = None) -> None:
+        """
+        Add a race and link its runners
+
+        Args:
+            race_id: Race identifier
+            metadata: Race data from RaceScraper.fetch_race_details (horse/jockey IDs are taken from it)
+            horse_ids: Horse IDs when metadata is not available
+            jockey_ids: Jockey IDs when metadata is not available
+        """
+        if race_id not in self.race_ids:
+            self.race_ids.append(race_id)
+
+        if metadata is not None:
+            self.races[race_id] = metadata
+            horses = metadata.get('horses', [])
+            horse_ids = [horse.get('horse_id') for horse in horses]
+            jockey_ids = [horse.get('jockey_id') for horse in horses]
+
+        for horse_id in horse_ids or []:
+            if horse_id:
+                self.horse_slots += 1
+                self.horses.setdefault(horse_id, []).append(race_id)
+        for jockey_id in jockey_ids or []:
+            if jockey_id:
+                self.jockey_slots += 1
+                self.jockeys.setdefault(jockey_id, []).append(race_id)
+
+    def entity_keys(self) -> List[str]:
+        """Unique entity keys ("horse:<id>", "parents:<id>", "jockey:<id>")"""
+        keys = []
+        for horse_id in self.horses:
+            keys.append(f"horse:{horse_id}")
+            keys.append(f"parents:{horse_id}")
+        keys.extend(f"jockey:{jockey_id}" for jockey_id in self.jockeys)
+        return keys
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get deduplication statistics
+
+        Returns:
+            Dictionary containing races, horse_slots, unique_horses, jockey_slots, unique_jockeys
+        """
+        return {
+            'races': len(self.race_ids),
+            'horse_slots': self.horse_slots,
+            'unique_horses': len(self.horses),
+            'jockey_slots': self.jockey_slots,
+            'unique_jockeys': len(self.jockeys)
+        }
+
+
+def build_horse_detailed(horse: Dict, horse_results: Optional[Dict], parent_horses: Optional[Dict],
+                         jockey_stats: Optional[Dict]) -> Dict:
+    """
+    Combine a runner with its fetched entities
+
+    Args:
+        horse: Runner from the race metadata
+        horse_results: Result of fetch_horse_results (or None)
+        parent_horses: Result of fetch_parent_horses (or None)
+        jockey_stats: Result of fetch_jockey_stats (or None)
+
+    Returns:
+        Horse data dictionary used by the analyzers
+    """
+    # Extract jockey stats from nested structure
+    jockey_overall_stats = jockey_stats.get('overall_stats', {}) if jockey_stats else {}
+    sire = parent_horses.get('sire', {}) if parent_horses else {}
+    dam = parent_horses.get('dam', {}) if parent_horses else {}
+
+    return {
+        **horse,
+        'recent_results': horse_results.get('recent_results', []) if horse_results else [],
+        'result_features': ensure_result_columns(horse_results)['features'] if horse_results else None,
+        'days_since_last_race': horse_results.get('days_since_last_race', 999) if horse_results else 999,
+        'jockey_win_rate': jockey_overall_stats.get('win_rate', 0),
+        'jockey_place_rate': jockey_overall_stats.get('place_rate', 0),  # 連対率 (1着+2着)
+        'jockey_show_rate': jockey_overall_stats.get('show_rate', 0),    # 複勝率 (1着+2着+3着)
+        'sire_name': sire.get('name', ''),
+        'sire_earnings': sire.get('earnings', ''),
+        'sire_first': sire.get('first', 0),
+        'sire_second': sire.get('second', 0),
+        'sire_third': sire.get('third', 0),
+        'sire_fourth_or_lower': sire.get('fourth_or_lower', 0),
+        'dam_name': dam.get('name', ''),
+        'dam_earnings': dam.get('earnings', ''),
+        'dam_first': dam.get('first', 0),
+        'dam_second': dam.get('second', 0),
+        'dam_third': dam.get('third', 0),
+        'dam_fourth_or_lower': dam.get('fourth_or_lower', 0)
+    }
+
+
+class EntityPlanner:
+    """Fetches the entities of several races with every unique page fetched once"""
+
+    def __init__(self, cache: DynamoDBCache, history: Optional[HistoryStore] = None,
+                 engine: Optional[FetchEngine] = None, known_race_dates: Optional[List[str]] = None):
+        """
+        Initialize planner
+
+        Args:
+            cache: DynamoDB cache consulted before and updated after every fetch
+            history: Optional HistoryStore that receives scraped result rows
+            engine: Fetch engine (defaults to FetchEngine())
+            known_race_dates: Race dates used to decide whether cached results are stale
+                (dates of the race cards in memory are added, so today's races count
+                before their results reach the history store)
+        """
+        self.cache = cache
+        self.engine = engine or FetchEngine()
+        self.known_race_dates = sorted(set(known_race_dates or []) | set(RaceCardIndex.race_dates()))
+
+        self.race_scraper = RaceScraper()
+        self.horse_scraper = HorseScraper(history=history)
+        self.jockey_scraper = JockeyScraper()
+
+    def load_races(self, race_ids: List[str], track_names: Optional[Dict[str, str]] = None,
+                   on_error: Optional[Callable[[str, Optional[Exception]], None]] = None) -> EntityGraph:
+        """
+        Build the entity graph from race metadata (cache first, then netkeiba)
+
+        Args:
+            race_ids: Race identifiers (duplicates are ignored)
+            track_names: Optional race_id -> track name (defaults to the track decoded from the race_id)
+            on_error: Called with (race_id, error) for races that could not be loaded
+                      (error is None when the page had no race data)
+
+        Returns:
+            EntityGraph of the loaded races
+        """
+        track_names = track_names or {}
+        graph = EntityGraph()
+        tasks = []
+
+        for race_id in dict.fromkeys(race_ids):
+            # Malformed ids cannot exist on netkeiba: no cache lookup or fetch
+            if not is_valid_race_id(race_id):
+                if on_error:
+                    on_error(race_id, None)
+                continue
+
+            metadata = self.cache.get_race_metadata(race_id)
+            if metadata:
+                graph.add_race(race_id, metadata)
+            else:
+                track_name = track_names.get(race_id)
+                tasks.append((race_id, lambda race_id=race_id, track_name=track_name:
+                              self.race_scraper.fetch_race_details(race_id, track_name)))
+
+        for race_id, metadata, error in self.engine.run(tasks):
+            if error is None and metadata:
+                self.cache.set_race_metadata(race_id, metadata)
+                graph.add_race(race_id, metadata)
+            elif on_error:
+                on_error(race_id, error)
+
+        # Keep the requested race order
+        graph.races = {race_id: graph.races[race_id] for race_id in race_ids if race_id in graph.races}
+        return graph
+
+    def fetch_entities(self, graph: EntityGraph, skip: Optional[Set[str]] = None,
+                       on_done: Optional[DoneCallback] = None) -> Dict[str, Dict[str, Optional[Dict]]]:
+        """
+        Fetch every unique entity of the graph once
+
+        Horse results, pedigree and jockey pages run in one batch; sire/dam
+        pages run in a second batch after deduplicating parent IDs across all
+        pedigrees (popular sires appear many times a day).
+
+        Args:
+            graph: Entity graph from load_races
+            skip: Entity keys not to fetch (e.g. done in an earlier run)
+            on_done: Called once per entity when it is cached or finished
+
+        Returns:
+            Dictionary of kind ("horse", "parents", "jockey") to entity id to data (None on failure)
+        """
+        skip = skip or set()
+        results: Dict[str, Dict[str, Optional[Dict]]] = {kind: {} for kind in ENTITY_KINDS}
+        cached_results: Dict[str, Dict] = {}
+        pedigrees: Dict[str, Dict] = {}
+        tasks = []
+
+        def done(kind: str, entity_id: str, data: Optional[Dict], error: Optional[Exception], fetched: bool):
+            results[kind][entity_id] = data
+            if on_done:
+                on_done(f"{kind}:{entity_id}", data, error, fetched)
+
+        # Batch 1: results, pedigree and jockey pages
+        for horse_id in graph.horses:
+            if f"horse:{horse_id}" not in skip:
+                cached = self.cache.get_horse_results(horse_id)
+                if cached:
+                    # Fetches only when a race day has passed since the last refresh
+                    cached_results[horse_id] = cached
+                    tasks.append((f"horse:{horse_id}", lambda horse_id=horse_id, cached=cached:
+                                  self.horse_scraper.refresh_horse_results(horse_id, cached, self.known_race_dates)))
+                else:
+                    tasks.append((f"horse:{horse_id}", lambda horse_id=horse_id:
+                                  self.horse_scraper.fetch_horse_results(horse_id)))
+
+            if f"parents:{horse_id}" not in skip:
+                cached = self.cache.get_horse_parents(horse_id)
+                if cached:
+                    done('parents', horse_id, cached, None, False)
+                else:
+                    tasks.append((f"pedigree:{horse_id}", lambda horse_id=horse_id:
+                                  self.horse_scraper.fetch_pedigree(horse_id)))
+
+        for jockey_id in graph.jockeys:
+            if f"jockey:{jockey_id}" in skip:
+                continue
+            cached = self.cache.get_jockey_stats(jockey_id)
+            if cached:
+                done('jockey', jockey_id, cached, None, False)
+            else:
+                tasks.append((f"jockey:{jockey_id}", lambda jockey_id=jockey_id:
+                              self.jockey_scraper.fetch_jockey_stats(jockey_id)))
+
+        for key, data, error in self.engine.run(tasks):
+            kind, entity_id = key.split(':', 1)
+            if error is None and not data:
+                error = Exception("no data")
+
+            if kind == 'pedigree':
+                if error is None:
+                    pedigrees[entity_id] = data
+                else:
+                    done('parents', entity_id, None, error, True)
+                continue
+
+            if error is None:
+                self._store(kind, entity_id, data, cached_results.get(entity_id))
+                fetched = kind != 'horse' or entity_id not in cached_results or \
+                    data.get('refreshed_at') != cached_results[entity_id].get('refreshed_at')
+                done(kind, entity_id, data, None, fetched)
+            else:
+                done(kind, entity_id, None, error, True)
+
+        # Batch 2: each unique sire/dam page once
+        parent_ids = {}
+        for pedigree in pedigrees.values():
+            for parent_type in ('sire', 'dam'):
+                parent_id = pedigree[parent_type]['id']
+                if parent_id:
+                    parent_ids[parent_id] = None
+
+        details: Dict[str, Dict] = {}
+        detail_errors: Dict[str, Exception] = {}
+        detail_tasks = [(parent_id, lambda parent_id=parent_id: self.horse_scraper.fetch_parent_details(parent_id))
+                        for parent_id in parent_ids]
+        for parent_id, data, error in self.engine.run(detail_tasks):
+            if error is None:
+                details[parent_id] = data
+            else:
+                detail_errors[parent_id] = error
+
+        # Fan the parent pages back out to every horse
+        for horse_id, pedigree in pedigrees.items():
+            ids = [pedigree['sire']['id'], pedigree['dam']['id']]
+            error = next((detail_errors[parent_id] for parent_id in ids if parent_id in detail_errors), None)
+            if error is not None:
+                done('parents', horse_id, None, error, True)
+                continue
+
+            parents = self.horse_scraper.apply_parent_details(
+                pedigree, details.get(ids[0]), details.get(ids[1]))
+            self._store('parents', horse_id, parents, None)
+            done('parents', horse_id, parents, None, True)
+
+        return results
+
+    def _store(self, kind: str, entity_id: str, data: Dict, cached: Optional[Dict]) -> None:
+        """Write a fetched entity to the cache (runs on the calling thread)"""
+        if kind == 'horse':
+            if cached is None or data.get('refreshed_at') != cached.get('refreshed_at'):
+                # Numeric feature columns are parsed once and cached with the results
+                ensure_result_columns(data)
+                self.cache.set_horse_results(entity_id, data)
+        elif kind == 'parents':
+            self.cache.set_horse_parents(entity_id, data)
+        elif kind == 'jockey':
+            self.cache.set_jockey_stats(entity_id, data)
+
+    def assemble(self, graph: EntityGraph, entities: Dict[str, Dict[str, Optional[Dict]]]) -> Dict[str, Dict]:
+        """
+        Fan fetched entities back out to every race
+
+        Args:
+            graph: Entity graph from load_races
+            entities: Result of fetch_entities
+
+        Returns:
+            Dictionary of race_id to complete race data (horses replaced by detailed horses)
+        """
+        races = {}
+        for race_id, metadata in graph.races.items():
+            horses = [
+                build_horse_detailed(
+                    horse,
+                    entities['horse'].get(horse.get('horse_id')),
+                    entities['parents'].get(horse.get('horse_id')),
+                    entities['jockey'].get(horse.get('jockey_id'))
+                )
+                for horse in metadata.get('horses', [])
+            ]
+            races[race_id] = {**metadata, 'horses': horses}
+        return races
+
+    def fetch_races(self, race_ids: List[str], track_names: Optional[Dict[str, str]] = None,
+                    on_done: Optional[DoneCallback] = None) -> Dict[str, Dict]:
+        """
+        Fetch complete race data for several races
+
+        Args:
+            race_ids: Race identifiers
+            track_names: Optional race_id -> track name
+            on_done: Called once per entity when it is cached or finished
+
+        Returns:
+            Dictionary of race_id to complete race data (races that failed to load are missing)
+        """
+        graph = self.load_races(race_ids, track_names)
+        stats = graph.stats()
+        print(f"Entity plan - Races: {len(graph.races)}, "
+              f"Horses: {stats['unique_horses']}/{stats['horse_slots']}, "
+              f"Jockeys: {stats['unique_jockeys']}/{stats['jockey_slots']} (unique/slots)")
+
+        entities = self.fetch_entities(graph, on_done=on_done)
+        return self.assemble(graph, entities)
+
+
+def fetch_race_data(race_id: str, cache: DynamoDBCache, track_name: Optional[str] = None,
+                    history: Optional[HistoryStore] = None,
+                    on_error: Optional[Callable[[Optional[Exception]], None]] = None,
+                    on_graph: Optional[Callable[[EntityGraph], None]] = None,
+                    on_done: Optional[DoneCallback] = None) -> Optional[Dict]:
+    """
+    Fetch complete data of one race with caching (the fetch behind 解析開始)
+
+    Args:
+        race_id: Race identifier
+        cache: DynamoDB cache instance
+        track_name: Track name (e.g., "東京", "中山") - optional, overrides the track decoded from the race_id
+        history: Optional HistoryStore that receives every scraped result row
+        on_error: Called with the error when the race could not be loaded (None = page had no race data)
+        on_graph: Called with the entity graph before its entities are fetched
+        on_done: Called once per entity when it is cached or finished
+
+    Returns:
+        Complete race data dictionary, or None if the race could not be loaded
+    """
+    with tracing.span('race.fetch', race_id=race_id) as span:
+        # Race dates in our data decide whether cached horse results can be stale
+        known_race_dates = history.race_dates((datetime.now() - timedelta(days=14)).strftime('%Y-%m-%d')) if history else []
+        planner = EntityPlanner(cache, history=history, known_race_dates=known_race_dates)
+
+        graph = planner.load_races([race_id], {race_id: track_name} if track_name else None,
+                                   on_error=(lambda _, error: on_error(error)) if on_error else None)
+        if race_id not in graph.races:
+            return None
+
+        span.set(entities=len(graph.entity_keys()))
+        if on_graph:
+            on_graph(graph)
+
+        # Fetch each unique horse/pedigree/parent/jockey page once
+        entities = planner.fetch_entities(graph, on_done=on_done)
+        race_data = planner.assemble(graph, entities)[race_id]
+
+        # Metadata cached before track names were decoded from the race_id has none
+        race_data['track_name'] = track_name or race_data.get('track_name') or race_track_name(race_id)
+
+        return race_data
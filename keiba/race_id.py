@@ -0,0 +1,98 @@
+"""
+netkeiba race_id codec
+A JRA race_id is 12 digits: year (4), track code (2), kai (2, meeting of
+the year at that track), nichi (2, day of the meeting) and race number (2).
+
+    202505040611 -> 2025, 05 東京, 4回, 6日目, 11R
+
+Parsing an id is pure computation, so its track name needs no list page
+fetch.
+"""
+
+import re
+from typing import Dict, Optional
+
+# JRA track codes
+TRACKS = {
+    '01': '札幌',
+    '02': '函館',
+    '03': '福島',
+    '04': '新潟',
+    '05': '東京',
+    '06': '中山',
+    '07': '中京',
+    '08': '京都',
+    '09': '阪神',
+    '10': '小倉',
+}
+
+TRACK_CODES = {name: code for code, name in TRACKS.items()}
+
+RACES_PER_DAY = 12
+
+_RACE_ID = re.compile(r'^(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})$')
+
+
+def parse_race_id(race_id: str) -> Optional[Dict]:
+    """
+    Decode a race_id
+
+    Args:
+        race_id: 12-digit race identifier
+
+    Returns:
+        Dictionary containing race_id, year, track_code, track_name ("" for
+        non-JRA codes), kai, nichi, race_number and meeting_id (first 10
+        digits, netkeiba's kaisai_id), or None if race_id is malformed
+    """
+    match = _RACE_ID.match(str(race_id or ''))
+    if not match:
+        return None
+
+    year, code, kai, nichi, race_number = match.groups()
+    if int(kai) == 0 or int(nichi) == 0 or not 1 <= int(race_number) <= RACES_PER_DAY:
+        return None
+
+    return {
+        'race_id': race_id,
+        'year': int(year),
+        'track_code': code,
+        'track_name': TRACKS.get(code, ''),
+        'kai': int(kai),
+        'nichi': int(nichi),
+        'race_number': int(race_number),
+        'meeting_id': race_id[:10]
+    }
+
+
+def is_valid_race_id(race_id: str) -> bool:
+    """Whether race_id is a well-formed 12-digit race_id"""
+    return parse_race_id(race_id) is not None
+
+
+def track_code(track: str) -> Optional[str]:
+    """
+    Find the track code of a track name
+
+    Args:
+        track: Track name ("東京"), race list header ("4回東京6日目") or code ("05")
+
+    Returns:
+        Two-digit code, or None if no JRA track matches
+    """
+    track = (track or '').strip()
+    if track in TRACKS:
+        return track
+    if track in TRACK_CODES:
+        return TRACK_CODES[track]
+    for name, code in TRACK_CODES.items():
+        if name in track:
+            return code
+    return None
+
+
+def track_name(race_id: str) -> str:
+    """Track name of a race_id ("" if malformed or not a JRA track)"""
+    parsed = parse_race_id(race_id)
+    return parsed['track_name'] if parsed else ''
+
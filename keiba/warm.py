@@ -0,0 +1,205 @@
+"""
+Race-day cache warming
+Enumerates the races of a date and fetches every horse/parent/jockey entity
+missing from the cache once through the entity planner and the concurrent
+fetch engine. Progress is kept in a job manifest so an
+interrupted run resumes where it stopped.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from scraper.base import BaseScraper
+from scraper.engine import FetchEngine, Progress, format_duration
+from scraper.scheduler import PREFETCH, fetch_priority, format_stats
+from cache.dynamodb import DynamoDBCache
+from cache.history import HistoryStore
+from cache.pages import PageCache
+from cache.race_cards import RaceCardIndex
+from .manifest import JobManifest
+from .planner import EntityGraph, EntityPlanner
+from .race_id import parse_race_id, track_code
+
+
+def default_manifest_path(date: str) -> str:
+    """Manifest file for a warm run (JOB_MANIFEST_DIR/warm-YYYYMMDD.json)"""
+    return os.path.join(os.getenv('JOB_MANIFEST_DIR', 'data/jobs'), f"warm-{date}.json")
+
+
+def filter_races(races: List[Dict], tracks: Optional[List[str]]) -> List[Dict]:
+    """
+    Keep the races of the given tracks
+
+    Args:
+        races: Races of a RaceCard (or RaceScraper.fetch_races_by_date)
+        tracks: Track names (e.g. ["東京", "京都"]); None or empty keeps all
+
+    Returns:
+        Matching races (by the track code in the race_id, or if the listed name contains a given name)
+    """
+    if not tracks:
+        return races
+    codes = {track_code(track) for track in tracks} - {None}
+    return [race for race in races
+            if (parse_race_id(race['race_id']) or {}).get('track_code') in codes
+            or any(track in race.get('track_name', '') for track in tracks)]
+
+
+class Warmer:
+    """Fetches race-day data into the cache with a resumable manifest"""
+
+    def __init__(self, cache: Optional[DynamoDBCache] = None, history: Optional[HistoryStore] = None,
+                 max_workers: Optional[int] = None, max_attempts: int = 3, priority: str = PREFETCH):
+        """
+        Initialize warmer
+
+        Args:
+            cache: DynamoDB cache (created if omitted)
+            history: History store that receives scraped result rows (created if omitted)
+            max_workers: Concurrent fetches (defaults to FETCH_CONCURRENCY)
+            max_attempts: Attempts per entity across runs before it is given up
+            priority: Scheduler class of every fetch ("prefetch" or "backfill")
+        """
+        self.cache = cache if cache is not None else DynamoDBCache()
+        self.history = history if history is not None else HistoryStore()
+        self.max_attempts = max_attempts
+        if BaseScraper.page_cache is None:
+            BaseScraper.page_cache = PageCache()
+
+        since = (datetime.now() - timedelta(days=14)).strftime('%Y-%m-%d')
+        self.planner = EntityPlanner(self.cache, history=self.history, engine=FetchEngine(max_workers, priority=priority),
+                                     known_race_dates=self.history.race_dates(since))
+        self.race_scraper = self.planner.race_scraper
+        self.race_cards = RaceCardIndex(self.cache, self.race_scraper)
+
+    def warm(self, date: str, tracks: Optional[List[str]] = None,
+             manifest_path: Optional[str] = None) -> Dict:
+        """
+        Warm the cache for all races on a date
+
+        Args:
+            date: Date in YYYYMMDD format
+            tracks: Only these tracks (None = all)
+            manifest_path: Job manifest (defaults to default_manifest_path(date))
+
+        Returns:
+            Dictionary containing races, entities, skipped, fetched, failed and elapsed
+        """
+        manifest = JobManifest(manifest_path or default_manifest_path(date),
+                               job={'command': 'warm', 'date': date, 'tracks': tracks or []})
+        print(f"Manifest: {manifest.path}")
+
+        try:
+            with fetch_priority(self.planner.engine.priority):
+                races = filter_races(self.race_cards.get(date).races, tracks)
+            print(f"Races: {len(races)}")
+
+            graph = self._load_races(races, manifest)
+            summary = self._run_entities(graph, manifest)
+        finally:
+            manifest.save()
+
+        counts = manifest.counts()
+        print(f"Done: {summary['fetched']} fetched, {summary['skipped']} already done/cached, "
+              f"{summary['failed']} failed in {format_duration(summary['elapsed'])} "
+              f"(manifest: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed)")
+        print(format_stats(self.planner.engine.rate_limiter.stats()))
+        for day in BaseScraper.page_cache.report(datetime.now().strftime('%Y-%m-%d')):
+            print(f"Page cache today: {day['fresh']} fresh, {day['not_modified']} not modified, "
+                  f"{day['modified']} modified, {day['miss']} downloaded "
+                  f"({day['requests_avoided_ratio'] * 100:.0f}% of page fetches avoided)")
+        return summary
+
+    def _load_races(self, races: List[Dict], manifest: JobManifest) -> EntityGraph:
+        """Build the entity graph from the manifest, the cache or netkeiba"""
+        recorded = {}
+        to_load = []
+        for race in races:
+            record = manifest.entities.get(f"race:{race['race_id']}", {})
+            if manifest.is_done(f"race:{race['race_id']}") and 'horse_ids' in record:
+                recorded[race['race_id']] = record
+            else:
+                to_load.append(race)
+
+        graph = self.planner.load_races(
+            [race['race_id'] for race in to_load],
+            on_error=lambda race_id, error: manifest.mark_failed(
+                f"race:{race_id}", str(error) if error else "no data")
+        )
+
+        # Record each race's entities so resumed runs need no lookup
+        for race_id, metadata in graph.races.items():
+            horses = metadata.get('horses', [])
+            manifest.mark_done(
+                f"race:{race_id}",
+                horse_ids=[horse['horse_id'] for horse in horses if horse.get('horse_id')],
+                jockey_ids=[horse['jockey_id'] for horse in horses if horse.get('jockey_id')]
+            )
+
+        for race_id, record in recorded.items():
+            graph.add_race(race_id, horse_ids=record['horse_ids'], jockey_ids=record['jockey_ids'])
+
+        return graph
+
+    def _run_entities(self, graph: EntityGraph, manifest: JobManifest) -> Dict:
+        """Fetch and cache all entities that are not done yet"""
+        keys = graph.entity_keys()
+        pending = manifest.pending(keys, self.max_attempts)
+        skip = set(keys) - set(pending)
+
+        stats = graph.stats()
+        print(f"Entities: {len(keys)} unique ({stats['unique_horses']}/{stats['horse_slots']} horses, "
+              f"{stats['unique_jockeys']}/{stats['jockey_slots']} jockeys), "
+              f"{len(pending)} to run, {len(skip)} already done")
+
+        progress = Progress(len(pending))
+        counts = {'fetched': 0, 'cached': 0, 'failed': 0}
+
+        def on_done(key, data, error, fetched):
+            if error is not None:
+                counts['failed'] += 1
+                manifest.mark_failed(key, str(error))
+            else:
+                counts['fetched' if fetched else 'cached'] += 1
+                manifest.mark_done(key, cached=not fetched)
+            progress.update(failed=error is not None)
+
+        self.planner.fetch_entities(graph, skip=skip, on_done=on_done)
+
+        return {
+            'races': stats['races'],
+            'entities': len(keys),
+            'skipped': len(skip) + counts['cached'],
+            'fetched': counts['fetched'],
+            'failed': counts['failed'],
+            'elapsed': progress.stats()['elapsed']
+        }
+
+
+def parse_tracks(value: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated track list (e.g. "東京,京都")"""
+    if not value:
+        return None
+    return [track.strip() for track in value.split(',') if track.strip()]
+
+
+def run_warm(date: str, tracks: Optional[str] = None, manifest_path: Optional[str] = None,
+             max_workers: Optional[int] = None, max_attempts: int = 3,
+             priority: str = PREFETCH) -> Tuple[Dict, int]:
+    """
+    Run a warm job from CLI arguments
+
+    Args:
+        date: Date in YYYYMMDD format
+        tracks: Comma-separated track names
+        manifest_path: Job manifest path
+        max_workers: Concurrent fetches
+        max_attempts: Attempts per entity across runs
+        priority: Scheduler class ("prefetch" or "backfill")
+
+    Returns:
+        (summary, exit code) - exit code 1 if any entity failed
+    """
+    warmer = Warmer(max_workers=max_workers, max_attempts=max_attempts, priority=priority)
+    summary = warmer.warm(date, parse_tracks(tracks), manifest_path)
+    return summary, 1 if summary['failed'] else 0
@@ -3,11 +3,32 @@ Base scraper module for netkeiba.com
 Provides common HTTP request functionality with retry logic, rate limiting, and error handling.
 """
 
+import re
 import time
 import os
-from typing import Optional
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from cache.pages import FRESH, MISS, MODIFIED, NOT_MODIFIED
+from utils import tracing
+
+
+# <meta charset="EUC-JP"> or <meta http-equiv="content-type" content="text/html; charset=euc-jp">
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_-]+)', re.IGNORECASE)
+
+
+def url_class(url: str) -> str:
+    """
+    Low-cardinality page type of a netkeiba URL
+
+    Args:
+        url: Page URL
+
+    Returns:
+        URL path with ids replaced (e.g. "/horse/result/{id}/")
+    """
+    return re.sub(r'\d+', '{id}', urlsplit(url).path) or '/'
 
 
 class BaseScraper:
@@ -18,6 +39,17 @@ class BaseScraper:
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     }
 
+    # Site root of the subclass and the environment variable that overrides it
+    # (e.g. a local replay server, see benchmarks/replay_server.py)
+    BASE_URL = ""
+    BASE_URL_ENV = None
+
+    # Shared scheduler for concurrent fetching, see scraper.scheduler (None = per-instance delay)
+    rate_limiter = None
+
+    # Shared cache.pages.PageCache for conditional GET revalidation (None = always download)
+    page_cache = None
+
     def __init__(self):
         """Initialize base scraper with configuration"""
         self.timeout = int(os.getenv('REQUEST_TIMEOUT', '10'))
@@ -25,8 +57,15 @@ class BaseScraper:
         self.delay = float(os.getenv('SCRAPING_DELAY_SECONDS', '1.0'))
         self.last_request_time = 0
 
+        if self.BASE_URL_ENV:
+            self.BASE_URL = os.getenv(self.BASE_URL_ENV, self.BASE_URL).rstrip('/')
+
     def _rate_limit(self):
         """Ensure minimum delay between requests"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+            return
+
         current_time = time.time()
         time_since_last_request = current_time - self.last_request_time
 
@@ -46,7 +85,18 @@ class BaseScraper:
         Returns:
             Detected encoding string
         """
-        # Try apparent_encoding first
+        # Charset declared in the page (netkeiba: EUC-JP or UTF-8), if the body really decodes with it;
+        # apparent_encoding runs charset detection over the whole body (tens of ms on a shutuba page)
+        declared = _META_CHARSET.search(response.content[:4096])
+        if declared:
+            encoding = declared.group(1).decode('ascii').lower()
+            try:
+                response.content.decode(encoding)
+                return encoding
+            except (UnicodeDecodeError, LookupError):
+                pass
+
+        # Try apparent_encoding next
         if response.apparent_encoding:
             return response.apparent_encoding
 
@@ -61,77 +111,174 @@ class BaseScraper:
         # Default to utf-8
         return 'utf-8'
 
-    def fetch(self, url: str) -> Optional[BeautifulSoup]:
+    def _request(self, url: str, headers: Optional[Dict[str, str]] = None) -> Optional[requests.Response]:
         """
-        Fetch and parse HTML from a URL with retry logic
+        GET a URL with rate limiting and retry logic
 
         Args:
             url: URL to fetch
+            headers: Extra request headers (e.g. conditional GET validators)
 
         Returns:
-            BeautifulSoup object or None if failed after retries
+            Response (status 2xx or 304) or None if failed after retries
 
         Raises:
             Exception: If all retry attempts fail
         """
-        # Apply rate limiting
-        self._rate_limit()
-
-        last_error = None
-
-        for attempt in range(self.max_retries):
-            try:
-                response = requests.get(
-                    url,
-                    headers=self.HEADERS,
-                    timeout=self.timeout
-                )
-
-                # Check for HTTP errors
-                response.raise_for_status()
-
-                # Detect and set proper encoding
-                encoding = self._detect_encoding(response)
-                response.encoding = encoding
-
-                # Parse HTML
-                soup = BeautifulSoup(response.text, 'html.parser')
+        with tracing.span('http.request', url_class=url_class(url), conditional=bool(headers)) as span:
+            # Apply rate limiting
+            wait_start = time.time()
+            self._rate_limit()
+            span.set(wait_ms=round((time.time() - wait_start) * 1000, 1))
+
+            last_error = None
+            failures = {}
+
+            for attempt in range(self.max_retries):
+                span.set(retries=attempt)
+                try:
+                    response = requests.get(
+                        url,
+                        headers={**self.HEADERS, **(headers or {})},
+                        timeout=self.timeout
+                    )
+                    span.set(status=response.status_code, bytes=len(response.content))
+
+                    # Check for HTTP errors
+                    response.raise_for_status()
+
+                    return response
+
+                except requests.exceptions.Timeout as e:
+                    last_error = e
+                    failures['timeout'] = failures.get('timeout', 0) + 1
+                    print(f"Timeout error on attempt {attempt + 1}/{self.max_retries}: {url}")
+
+                except requests.exceptions.HTTPError as e:
+                    # Don't retry on 4xx errors (client errors)
+                    if 400 <= e.response.status_code < 500:
+                        print(f"Client error {e.response.status_code}: {url}")
+                        raise
+
+                    last_error = e
+                    failures['5xx'] = failures.get('5xx', 0) + 1
+                    print(f"HTTP error on attempt {attempt + 1}/{self.max_retries}: {e}")
+
+                except requests.exceptions.RequestException as e:
+                    last_error = e
+                    failures['connection'] = failures.get('connection', 0) + 1
+                    print(f"Request error on attempt {attempt + 1}/{self.max_retries}: {e}")
+
+                except Exception as e:
+                    last_error = e
+                    print(f"Unexpected error on attempt {attempt + 1}/{self.max_retries}: {e}")
+
+                span.set(failures=dict(failures))
+
+                # Wait before retrying (exponential backoff)
+                if attempt < self.max_retries - 1:
+                    wait_time = self.delay * (2 ** attempt)
+                    print(f"Waiting {wait_time:.1f}s before retry...")
+                    time.sleep(wait_time)
+
+            # All retries failed
+            print(f"Failed to fetch after {self.max_retries} attempts: {url}")
+            if last_error:
+                raise Exception(f"Failed to fetch {url}: {last_error}")
+
+            return None
+
+    def _parse_response(self, response: requests.Response,
+                        parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        """Decode a response with the detected encoding and parse the HTML (only matching elements if parse_only)"""
+        with tracing.span('html.parse', url_class=url_class(response.url or ''), bytes=len(response.content)):
+            # Detect and set proper encoding
+            encoding = self._detect_encoding(response)
+            response.encoding = encoding
+
+            return BeautifulSoup(response.text, 'html.parser', parse_only=parse_only)
+
+    def fetch(self, url: str, parse_only: Optional[SoupStrainer] = None) -> Optional[BeautifulSoup]:
+        """
+        Fetch and parse HTML from a URL with retry logic
 
-                return soup
+        Args:
+            url: URL to fetch
+            parse_only: Build the tree only from matching elements (and their
+                        contents); much faster on large pages
 
-            except requests.exceptions.Timeout as e:
-                last_error = e
-                print(f"Timeout error on attempt {attempt + 1}/{self.max_retries}: {url}")
+        Returns:
+            BeautifulSoup object or None if failed after retries
 
-            except requests.exceptions.HTTPError as e:
-                # Don't retry on 4xx errors (client errors)
-                if 400 <= e.response.status_code < 500:
-                    print(f"Client error {e.response.status_code}: {url}")
-                    raise
+        Raises:
+            Exception: If all retry attempts fail
+        """
+        response = self._request(url)
+        if response is None:
+            return None
 
-                last_error = e
-                print(f"HTTP error on attempt {attempt + 1}/{self.max_retries}: {e}")
+        return self._parse_response(response, parse_only)
 
-            except requests.exceptions.RequestException as e:
-                last_error = e
-                print(f"Request error on attempt {attempt + 1}/{self.max_retries}: {e}")
+    def fetch_parsed(self, url: str, parse: Callable[[BeautifulSoup], Optional[Dict]], parser: str,
+                     ttl: Optional[int] = None) -> Optional[Dict]:
+        """
+        Fetch a page and parse it, revalidating cached results with conditional GET
 
-            except Exception as e:
-                last_error = e
-                print(f"Unexpected error on attempt {attempt + 1}/{self.max_retries}: {e}")
+        With a page cache attached, a fresh entry is returned without a
+        request; an expired entry is revalidated with If-None-Match /
+        If-Modified-Since and a 304 reuses the stored result without parsing.
 
-            # Wait before retrying (exponential backoff)
-            if attempt < self.max_retries - 1:
-                wait_time = self.delay * (2 ** attempt)
-                print(f"Waiting {wait_time:.1f}s before retry...")
-                time.sleep(wait_time)
+        Args:
+            url: URL to fetch
+            parse: Function that turns the page into a JSON-serializable dict (None = no data)
+            parser: Name stored with the result (change it when the parsed format changes)
+            ttl: Seconds until the next revalidation (defaults to PAGE_CACHE_TTL_SECONDS)
 
-        # All retries failed
-        print(f"Failed to fetch after {self.max_retries} attempts: {url}")
-        if last_error:
-            raise Exception(f"Failed to fetch {url}: {last_error}")
+        Returns:
+            Parsed result, or None if fetching failed or the page had no data
 
-        return None
+        Raises:
+            Exception: If all retry attempts fail
+        """
+        with tracing.span('page_cache.fetch', parser=parser) as span:
+            page_cache = self.page_cache
+            entry = page_cache.get(url, parser) if page_cache is not None else None
+
+            if entry and entry['fresh']:
+                page_cache.record(FRESH, entry['content_length'] or 0)
+                span.set(outcome=FRESH)
+                return entry['parsed']
+
+            headers = {}
+            if entry:
+                if entry['etag']:
+                    headers['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    headers['If-Modified-Since'] = entry['last_modified']
+
+            response = self._request(url, headers)
+            if response is None:
+                return None
+
+            if response.status_code == 304 and entry:
+                page_cache.touch(url, parser, ttl)
+                page_cache.record(NOT_MODIFIED, entry['content_length'] or 0)
+                span.set(outcome=NOT_MODIFIED)
+                return entry['parsed']
+
+            data = parse(self._parse_response(response))
+            span.set(outcome=MODIFIED if headers else MISS)
+
+            if page_cache is not None:
+                page_cache.record(MODIFIED if headers else MISS)
+                if data is not None:
+                    page_cache.put(url, parser, data,
+                                   etag=response.headers.get('ETag'),
+                                   last_modified=response.headers.get('Last-Modified'),
+                                   content_length=len(response.content),
+                                   ttl=ttl)
+
+            return data
 
     def safe_extract_text(self, element, selector: str, default: str = "") -> str:
         """
@@ -0,0 +1,176 @@
+"""
+Concurrent fetch engine
+Runs scraper calls on a thread pool while every scraper shares one
+priority scheduler, so request latency overlaps but netkeiba still sees at
+most one request start per SCRAPING_DELAY_SECONDS.
+"""
+
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .base import BaseScraper
+from .scheduler import PriorityScheduler, SharedRequestBudget, fetch_priority
+
+
+def install_shared_rate_limiter(delay: Optional[float] = None) -> PriorityScheduler:
+    """
+    Make every scraper instance share one priority scheduler
+
+    An installed scheduler with the same delay is reused, so all producers in
+    the process (UI requests, prefetch, backfill) compete in one queue. Slots
+    are shared with other processes through REQUEST_BUDGET_PATH ("" = this
+    process only).
+
+    Args:
+        delay: Minimum seconds between request starts (defaults to SCRAPING_DELAY_SECONDS)
+
+    Returns:
+        The installed PriorityScheduler
+    """
+    if delay is None:
+        delay = float(os.getenv('SCRAPING_DELAY_SECONDS', '1.0'))
+
+    limiter = BaseScraper.rate_limiter
+    if not isinstance(limiter, PriorityScheduler) or limiter.delay != delay:
+        budget = None
+        budget_path = os.getenv('REQUEST_BUDGET_PATH', 'data/request_budget.sqlite3')
+        if budget_path:
+            try:
+                budget = SharedRequestBudget(budget_path, delay)
+            except Exception as e:
+                print(f"Shared request budget unavailable, limiting this process only: {e}")
+        BaseScraper.rate_limiter = PriorityScheduler(delay, budget=budget)
+    return BaseScraper.rate_limiter
+
+
+class FetchEngine:
+    """Thread pool for scraper calls with a shared rate limit"""
+
+    def __init__(self, max_workers: Optional[int] = None, delay: Optional[float] = None,
+                 priority: Optional[str] = None):
+        """
+        Initialize fetch engine
+
+        Args:
+            max_workers: Concurrent fetches (defaults to FETCH_CONCURRENCY)
+            delay: Minimum seconds between request starts (defaults to SCRAPING_DELAY_SECONDS)
+            priority: Priority class for every task (None = the caller's current class)
+        """
+        self.max_workers = max_workers or int(os.getenv('FETCH_CONCURRENCY', '4'))
+        self.priority = priority
+        self.rate_limiter = install_shared_rate_limiter(delay)
+
+    def run(self, tasks: List[Tuple[str, Callable[[], Any]]]) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+        """
+        Execute tasks concurrently
+
+        Results are yielded in completion order on the calling thread, so the
+        caller can write caches and manifests without extra locking.
+
+        Args:
+            tasks: (key, function) pairs; each function performs one fetch
+
+        Yields:
+            (key, result, error) per task; error is None on success
+        """
+        if not tasks:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            futures = {executor.submit(self._in_context(fn)): key for key, fn in tasks}
+            try:
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        yield key, future.result(), None
+                    except Exception as e:
+                        yield key, None, e
+            finally:
+                # Interrupted or abandoned: drop tasks that have not started yet
+                for future in futures:
+                    future.cancel()
+
+    def _in_context(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap a task so it runs with the submitting thread's context (priority class)"""
+        context = contextvars.copy_context()
+
+        def run():
+            if self.priority is None:
+                return fn()
+            with fetch_priority(self.priority):
+                return fn()
+
+        return lambda: context.run(run)
+
+
+class Progress:
+    """Throughput and ETA reporting for long fetch runs"""
+
+    def __init__(self, total: int, label: str = "entities", interval: float = 5.0):
+        """
+        Initialize progress reporter
+
+        Args:
+            total: Number of tasks to run
+            label: Unit printed in progress lines
+            interval: Minimum seconds between progress lines
+        """
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.start_time = time.time()
+        self._last_print = 0.0
+
+    def update(self, failed: bool = False) -> None:
+        """Count one finished task and print a progress line if due"""
+        self.done += 1
+        if failed:
+            self.failed += 1
+
+        now = time.time()
+        if now - self._last_print >= self.interval or self.done == self.total:
+            self._last_print = now
+            print(self.format_line())
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get current progress statistics
+
+        Returns:
+            Dictionary containing done, failed, total, elapsed (s), rate (tasks/s)
+            and eta (s, None until the first task finishes)
+        """
+        elapsed = time.time() - self.start_time
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        return {
+            'done': self.done,
+            'failed': self.failed,
+            'total': self.total,
+            'elapsed': elapsed,
+            'rate': rate,
+            'eta': remaining / rate if rate > 0 else None
+        }
+
+    def format_line(self) -> str:
+        """Format the current progress as one line"""
+        stats = self.stats()
+        eta = format_duration(stats['eta']) if stats['eta'] is not None else '-'
+        return (f"[{stats['done']}/{stats['total']}] {stats['rate']:.2f} {self.label}/s, "
+                f"failed {stats['failed']}, elapsed {format_duration(stats['elapsed'])}, ETA {eta}")
+
+
+def format_duration(seconds: float) -> str:
+    """Format seconds as 1h02m03s / 2m03s / 3s"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
@@ -3,8 +3,9 @@ Horse scraper module for netkeiba.com
 Handles fetching horse performance data and parent horse information.
 """
 
+import os
 from typing import Dict, List, Optional
-from datetime import datetime
+from datetime import date, datetime
 import re
 from .base import BaseScraper
 
@@ -13,17 +14,35 @@ class HorseScraper(BaseScraper):
     """Scraper for horse information from netkeiba.com"""
 
     BASE_URL = "https://db.netkeiba.com"
+    BASE_URL_ENV = "NETKEIBA_DB_URL"
 
-    def __init__(self):
-        """Initialize horse scraper"""
+    # Rows kept in recent_results (the full table goes to the history store)
+    RECENT_RESULTS_LIMIT = 10
+
+    # Seconds before a cached pedigree page is revalidated
+    PEDIGREE_TTL_SECONDS = 30 * 24 * 3600
+
+    def __init__(self, history=None):
+        """
+        Initialize horse scraper
+
+        Args:
+            history: Optional HistoryStore that receives every scraped result row
+        """
         super().__init__()
+        self.history = history
 
-    def fetch_horse_results(self, horse_id: str) -> Optional[Dict]:
+    def fetch_horse_results(self, horse_id: str, known_results: Optional[List[Dict]] = None) -> Optional[Dict]:
         """
         Fetch past race results for a specific horse
 
+        With known_results, rows are parsed only down to the first race already
+        known (new rows only appear at the top of the table) and merged with
+        the known rows.
+
         Args:
             horse_id: Horse identifier
+            known_results: Previously fetched results (most recent first)
 
         Returns:
             Dictionary containing:
@@ -36,7 +55,17 @@ class HorseScraper(BaseScraper):
                 - position: int
                 - time: str
                 - margin: str
+                - odds: str
+                - popularity: str
+                - passing: str
+                - last_3f: str
+                - horse_weight: str
+                - jockey: str
+                - race_id: str
+                - race_name: str
             - days_since_last_race: int
+            - new_results: int - Rows not in known_results
+            - refreshed_at: str - ISO timestamp of this fetch
         """
         url = f"{self.BASE_URL}/horse/result/{horse_id}/"
 
@@ -53,21 +82,35 @@ class HorseScraper(BaseScraper):
             return {
                 'horse_id': horse_id,
                 'horse_name': horse_name,
-                'recent_results': [],
-                'days_since_last_race': 999
+                'recent_results': known_results or [],
+                'days_since_last_race': self._calculate_days_since_last_race(known_results or []),
+                'new_results': 0,
+                'refreshed_at': datetime.now().isoformat(timespec='seconds')
             }
 
         results = []
         result_rows = results_table.select('tbody tr')
 
-        for row in result_rows[:10]:  # Get latest 10 races
+        # Parse the full table only when the history store keeps it
+        if not self.history and not known_results:
+            result_rows = result_rows[:self.RECENT_RESULTS_LIMIT]
+
+        # Most recent known race date; rows on or before it are already known
+        last_known_date = self._parse_date(known_results[0].get('date', '')) if known_results else None
+
+        for row in result_rows:
             # Column mapping based on actual HTML structure:
-            # 0: 日付, 1: 開催, 2: 天気, 3: R, 4: レース名,
-            # 11: 着順, 14: 距離, 18: タイム, 19: 着差
+            # 0: 日付, 1: 開催, 2: 天気, 3: R, 4: レース名, 9: オッズ, 10: 人気,
+            # 11: 着順, 12: 騎手, 14: 距離, 18: タイム, 19: 着差, 21: 通過, 23: 上り, 24: 馬体重
 
             # Extract date (Column 0)
             date_str = self.safe_extract_text(row, 'td:nth-of-type(1)', '')
 
+            if last_known_date:
+                row_date = self._parse_date(date_str)
+                if row_date and row_date <= last_known_date:
+                    break
+
             # Extract track name (Column 1)
             track_name = self.safe_extract_text(row, 'td:nth-of-type(2) a', '')
             if not track_name:
@@ -86,25 +129,114 @@ class HorseScraper(BaseScraper):
             # Extract margin (Column 19)
             margin = self.safe_extract_text(row, 'td:nth-of-type(20)', '')
 
+            # Extract race name and race_id from the race link (Column 4)
+            race_link = row.select_one('td:nth-of-type(5) a')
+            race_name = race_link.get_text(strip=True) if race_link else ''
+            race_id = self._extract_race_id_from_url(race_link.get('href', '')) if race_link else ''
+
             results.append({
                 'date': date_str,
+                'race_id': race_id,
+                'race_name': race_name,
                 'track': track_name,
                 'distance': distance_data,
                 'position': position,
                 'time': time_str,
-                'margin': margin
+                'margin': margin,
+                'odds': self.safe_extract_text(row, 'td:nth-of-type(10)', ''),          # Column 9
+                'popularity': self.safe_extract_text(row, 'td:nth-of-type(11)', ''),    # Column 10
+                'passing': self.safe_extract_text(row, 'td:nth-of-type(22)', ''),       # Column 21
+                'last_3f': self.safe_extract_text(row, 'td:nth-of-type(24)', ''),       # Column 23
+                'horse_weight': self.safe_extract_text(row, 'td:nth-of-type(25)', ''),  # Column 24
+                'jockey': self.safe_extract_text(row, 'td:nth-of-type(13)', '')         # Column 12
             })
 
+        if self.history and results:
+            self.history.add_results(horse_id, results)
+
+        new_results = len(results)
+        if known_results:
+            results = results + known_results
+
         # Calculate days since last race
         days_since_last_race = self._calculate_days_since_last_race(results)
 
         return {
             'horse_id': horse_id,
             'horse_name': horse_name,
-            'recent_results': results,
-            'days_since_last_race': days_since_last_race
+            'recent_results': results[:self.RECENT_RESULTS_LIMIT],
+            'days_since_last_race': days_since_last_race,
+            'new_results': new_results,
+            'refreshed_at': datetime.now().isoformat(timespec='seconds')
         }
 
+    def refresh_horse_results(self, horse_id: str, cached: Dict,
+                              known_race_dates: Optional[List[str]] = None) -> Dict:
+        """
+        Bring cached horse results up to date with as little work as possible
+
+        The fetch is skipped unless the results of a known race date were
+        published after the last refresh. Otherwise only rows newer than the
+        cached ones are parsed and merged.
+
+        Args:
+            horse_id: Horse identifier
+            cached: Results dictionary from fetch_horse_results (e.g. from cache)
+            known_race_dates: Race dates seen in our data (YYYY-MM-DD or YYYY/MM/DD)
+
+        Returns:
+            Updated results dictionary; 'refreshed_at' is unchanged when the
+            fetch was skipped or failed
+        """
+        if not self.needs_refresh(cached.get('refreshed_at'), known_race_dates):
+            cached['days_since_last_race'] = self._calculate_days_since_last_race(cached.get('recent_results', []))
+            cached['new_results'] = 0
+            return cached
+
+        refreshed = self.fetch_horse_results(horse_id, known_results=cached.get('recent_results', []))
+        if not refreshed:
+            return cached
+
+        if not refreshed['horse_name']:
+            refreshed['horse_name'] = cached.get('horse_name', '')
+
+        return refreshed
+
+    def needs_refresh(self, refreshed_at: Optional[str], known_race_dates: Optional[List[str]] = None,
+                      now: Optional[datetime] = None) -> bool:
+        """
+        Check whether race results were published since the last refresh
+
+        A race day's results count as published at RESULTS_PUBLISHED_HOUR
+        (after the last race), so a refresh made on a race day before that
+        hour is stale once it passes, and one made after it is not.
+
+        Args:
+            refreshed_at: ISO timestamp of the last refresh (None = never)
+            known_race_dates: Race dates seen in our data (history store and race cards)
+            now: Current time (defaults to now)
+
+        Returns:
+            True if new results may exist
+        """
+        if not refreshed_at:
+            return True
+
+        try:
+            last_refresh = datetime.fromisoformat(str(refreshed_at))
+        except ValueError:
+            return True
+
+        now = now or datetime.now()
+        published_hour = int(os.getenv('RESULTS_PUBLISHED_HOUR', '17'))
+
+        for race_date in filter(None, (self._parse_date(date_str) for date_str in (known_race_dates or []))):
+            published = datetime.combine(race_date, datetime.min.time()).replace(hour=published_hour)
+            if last_refresh < published <= now:
+                return True
+
+        return False
+
     def fetch_parent_horses(self, horse_id: str) -> Optional[Dict]:
         """
         Fetch parent horse information (sire and dam)
@@ -132,13 +264,35 @@ class HorseScraper(BaseScraper):
                 - third: int
                 - fourth_or_lower: int
         """
+        pedigree = self.fetch_pedigree(horse_id)
+        if not pedigree:
+            return None
+
+        sire_stats = self.fetch_parent_details(pedigree['sire']['id']) if pedigree['sire']['id'] else None
+        dam_stats = self.fetch_parent_details(pedigree['dam']['id']) if pedigree['dam']['id'] else None
+
+        return self.apply_parent_details(pedigree, sire_stats, dam_stats)
+
+    def fetch_pedigree(self, horse_id: str) -> Optional[Dict]:
+        """
+        Fetch sire and dam names and IDs from the pedigree page
+
+        Args:
+            horse_id: Horse identifier
+
+        Returns:
+            Dictionary in fetch_parent_horses format with zero stats
+            (fill them with apply_parent_details), or None if fetching fails
+        """
         # Access pedigree page
         url = f"{self.BASE_URL}/horse/ped/{horse_id}/"
 
-        soup = self.fetch(url)
-        if not soup:
-            return None
+        # A pedigree never changes, so it is only revalidated monthly
+        return self.fetch_parsed(url, lambda soup: self._parse_pedigree(soup, horse_id), 'pedigree',
+                                 ttl=self.PEDIGREE_TTL_SECONDS)
 
+    def _parse_pedigree(self, soup, horse_id: str) -> Dict:
+        """Parse sire and dam names and IDs from a pedigree page"""
         # Extract pedigree information from blood_table
         blood_table = soup.select_one('.blood_table')
         sire_info = {'name': '', 'id': '', 'earnings': '', 'first': 0, 'second': 0, 'third': 0, 'fourth_or_lower': 0}
@@ -173,32 +327,37 @@ class HorseScraper(BaseScraper):
                                 dam_info['id'] = horse_id_candidate
                                 break
 
-        # Fetch detailed stats for sire
-        if sire_info['id']:
-            sire_stats = self._fetch_parent_details(sire_info['id'])
-            if sire_stats:
-                sire_info['earnings'] = sire_stats.get('earnings', '')
-                sire_info['first'] = sire_stats.get('first', 0)
-                sire_info['second'] = sire_stats.get('second', 0)
-                sire_info['third'] = sire_stats.get('third', 0)
-                sire_info['fourth_or_lower'] = sire_stats.get('fourth_or_lower', 0)
-
-        # Fetch detailed stats for dam
-        if dam_info['id']:
-            dam_stats = self._fetch_parent_details(dam_info['id'])
-            if dam_stats:
-                dam_info['earnings'] = dam_stats.get('earnings', '')
-                dam_info['first'] = dam_stats.get('first', 0)
-                dam_info['second'] = dam_stats.get('second', 0)
-                dam_info['third'] = dam_stats.get('third', 0)
-                dam_info['fourth_or_lower'] = dam_stats.get('fourth_or_lower', 0)
-
         return {
             'horse_id': horse_id,
             'sire': sire_info,
             'dam': dam_info
         }
 
+    @staticmethod
+    def apply_parent_details(pedigree: Dict, sire_stats: Optional[Dict], dam_stats: Optional[Dict]) -> Dict:
+        """
+        Fill parent stats into a pedigree from fetch_pedigree
+
+        Args:
+            pedigree: Result of fetch_pedigree
+            sire_stats: Result of fetch_parent_details for the sire (None keeps zeros)
+            dam_stats: Result of fetch_parent_details for the dam (None keeps zeros)
+
+        Returns:
+            Dictionary in fetch_parent_horses format
+        """
+        parents = {'horse_id': pedigree['horse_id']}
+        for parent_type, stats in (('sire', sire_stats), ('dam', dam_stats)):
+            info = dict(pedigree[parent_type])
+            if stats:
+                info['earnings'] = stats.get('earnings', '')
+                info['first'] = stats.get('first', 0)
+                info['second'] = stats.get('second', 0)
+                info['third'] = stats.get('third', 0)
+                info['fourth_or_lower'] = stats.get('fourth_or_lower', 0)
+            parents[parent_type] = info
+        return parents
+
 
     def _extract_horse_id_from_url(self, url: str) -> str:
         """
@@ -223,7 +382,20 @@ class HorseScraper(BaseScraper):
 
         return ""
 
-    def _fetch_parent_details(self, parent_id: str) -> Optional[Dict]:
+    def _extract_race_id_from_url(self, url: str) -> str:
+        """
+        Extract race ID from a netkeiba race URL
+
+        Args:
+            url: URL string (e.g. "/race/202405020811/")
+
+        Returns:
+            Race ID string or empty string
+        """
+        match = re.search(r'/race/(\d{12})', url or '')
+        return match.group(1) if match else ""
+
+    def fetch_parent_details(self, parent_id: str) -> Optional[Dict]:
         """
         Fetch detailed information for a parent horse (earnings and record)
 
@@ -240,10 +412,10 @@ class HorseScraper(BaseScraper):
             Returns None if fetching fails
         """
         url = f"{self.BASE_URL}/horse/{parent_id}/"
-        soup = self.fetch(url)
-        if not soup:
-            return None
+        return self.fetch_parsed(url, self._parse_parent_details, 'parent_details')
 
+    def _parse_parent_details(self, soup) -> Dict:
+        """Parse earnings and record from a horse profile page"""
         earnings = ""
         first = 0
         second = 0
@@ -442,8 +614,14 @@ class HorseScraper(BaseScraper):
             race_data['track_type'] = distance_info['track_type']
             race_data['distance_meters'] = distance_info['distance_meters']
 
+            race_link = cells[4].select_one('a')
+            race_data['race_id'] = self._extract_race_id_from_url(race_link.get('href', '')) if race_link else ''
+
             results.append(race_data)
 
+        if self.history:
+            self.history.add_results(horse_id, results)
+
         return {
             'horse_id': horse_id,
             'results': results
@@ -518,3 +696,18 @@ class HorseScraper(BaseScraper):
 
         except (ValueError, IndexError, KeyError):
             return 999
+
+    def _parse_date(self, date_str: str) -> Optional[date]:
+        """
+        Parse a result date
+
+        Args:
+            date_str: Date string (YYYY/MM/DD, YYYY.MM.DD or YYYY-MM-DD)
+
+        Returns:
+            date object, or None if parsing fails
+        """
+        try:
+            return datetime.strptime(str(date_str).strip().replace('.', '/').replace('-', '/'), '%Y/%m/%d').date()
+        except ValueError:
+            return None
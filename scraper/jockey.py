@@ -12,6 +12,7 @@ class JockeyScraper(BaseScraper):
     """Scraper for jockey information from netkeiba.com"""
 
     BASE_URL = "https://db.netkeiba.com"
+    BASE_URL_ENV = "NETKEIBA_DB_URL"
 
     def __init__(self):
         """Initialize jockey scraper"""
@@ -46,11 +47,10 @@ class JockeyScraper(BaseScraper):
                 - total_races: int
         """
         url = f"{self.BASE_URL}/jockey/{jockey_id}/"
+        return self.fetch_parsed(url, lambda soup: self._parse_jockey_stats(soup, jockey_id), 'jockey_stats')
 
-        soup = self.fetch(url)
-        if not soup:
-            return None
-
+    def _parse_jockey_stats(self, soup, jockey_id: str) -> Dict:
+        """Parse name and statistics from a jockey page"""
         # Extract jockey name
         jockey_name_elem = soup.select_one('.db_head_name h1')
         jockey_name = ""
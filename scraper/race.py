@@ -3,19 +3,33 @@ Race scraper module for netkeiba.com
 Handles fetching race lists and race details including horse and jockey information.
 """
 
+import os
 from typing import Dict, List, Optional
 from datetime import datetime
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from cache.race_cards import RaceCardIndex
+from keiba.race_id import parse_race_id
 from .base import BaseScraper
 
+# Parts of an entries page that fetch_race_details reads (race name, distance
+# and the entry rows); everything else of the 250-330 KB page is skipped
+# while parsing, which roughly halves parse time
+ENTRY_ELEMENTS = SoupStrainer(class_=['RaceName', 'RaceData01', 'HorseList'])
+
 
 class RaceScraper(BaseScraper):
     """Scraper for race information from netkeiba.com"""
 
     BASE_URL = "https://race.netkeiba.com"
+    BASE_URL_ENV = "NETKEIBA_RACE_URL"
 
     def __init__(self):
         """Initialize race scraper"""
         super().__init__()
+        # Lightweight entries endpoint tried before shutuba.html, as a URL template
+        # with {base} and {race_id}; it must serve the same Shutuba_Table rows
+        self.entries_url = os.getenv('SHUTUBA_SUB_URL', '')
 
     def fetch_races_by_date(self, date: str) -> List[Dict[str, str]]:
         """
@@ -30,6 +44,8 @@ class RaceScraper(BaseScraper):
             - track_name: str - Name of the racing track
             - race_number: int - Race number (1-12)
             - race_name: str - Name of the race
+            - post_time: str - Post time (e.g., "10:05"), empty if not listed
+            - field_size: int - Number of runners, 0 if not listed
         """
         # Build URL for race calendar (use race_list_sub.html which contains the actual race data)
         url = f"{self.BASE_URL}/top/race_list_sub.html?kaisai_date={date}"
@@ -65,20 +81,26 @@ class RaceScraper(BaseScraper):
                 # Extract race_id from href
                 # Format: /race/shutuba.html?race_id=202305040101
                 race_id = self._extract_race_id_from_url(href)
-                if not race_id:
+                parsed = parse_race_id(race_id)
+                if not parsed:
                     continue
 
-                # Extract race number from race_id (last 2 digits)
-                race_number = int(race_id[-2:])
+                race_number = parsed['race_number']
 
                 # Extract race name
                 race_name = self.safe_extract_text(race_item, '.RaceList_ItemTitle .ItemTitle', '')
 
+                # Post time and field size ("10:05", "11頭")
+                post_time = self.safe_extract_text(race_item, '.RaceList_Itemtime', '')
+                field_size = self.safe_extract_text(race_item, '.RaceList_Itemnumber', '').replace('頭', '')
+
                 races.append({
                     'race_id': race_id,
                     'track_name': track_name,
                     'race_number': race_number,
-                    'race_name': race_name
+                    'race_name': race_name,
+                    'post_time': post_time,
+                    'field_size': int(field_size) if field_size.isdigit() else 0
                 })
 
         return races
@@ -95,13 +117,8 @@ class RaceScraper(BaseScraper):
         Returns:
             race_id string or None if not found
         """
-        races = self.fetch_races_by_date(date)
-
-        for race in races:
-            if track_name in race['track_name'] and race['race_number'] == race_number:
-                return race['race_id']
-
-        return None
+        # Index hit once the date's list has been fetched in this process
+        return RaceCardIndex(scraper=self).get_race_id(date, track_name, race_number)
 
     def fetch_race_details(self, race_id: str, track_name: str = None) -> Optional[Dict]:
         """
@@ -109,7 +126,7 @@ class RaceScraper(BaseScraper):
 
         Args:
             race_id: Race identifier (12-digit string)
-            track_name: Name of the racing track (optional, will be included in return value if provided)
+            track_name: Name of the racing track (optional, defaults to the track decoded from race_id)
 
         Returns:
             Dictionary containing:
@@ -117,7 +134,7 @@ class RaceScraper(BaseScraper):
             - race_name: str
             - distance: str (e.g., "1600m")
             - track_type: str (e.g., "芝", "ダート")
-            - track_name: str (if provided in args)
+            - track_name: str (from args or race_id; omitted for unknown track codes)
             - horses: List[Dict] - List of horse dictionaries
                 - horse_id: str
                 - horse_name: str
@@ -126,12 +143,67 @@ class RaceScraper(BaseScraper):
                 - frame_number: int
                 - horse_number: int
         """
+        parsed = parse_race_id(race_id)
+        if not parsed:
+            print(f"Invalid race_id: {race_id}")
+            return None
+
+        # Track from args, otherwise decoded from race_id
+        track_name = track_name or parsed['track_name']
+
+        # Fast path: lightweight endpoint. It is switched off for good only when it
+        # is unusable (4xx or bad template); an empty entry list, or a 5xx or timeout
+        # that already went through the retries, falls back to shutuba.html for this race
+        if self.entries_url:
+            unusable = None
+            try:
+                entries_url = self.entries_url.format(base=self.BASE_URL, race_id=race_id)
+            except (KeyError, IndexError) as e:
+                entries_url = None
+                unusable = f"invalid SHUTUBA_SUB_URL template: {e}"
+
+            if entries_url:
+                try:
+                    soup = self.fetch(entries_url, ENTRY_ELEMENTS)
+                    result = self.parse_race_details(soup, race_id, track_name) if soup else None
+                    if result and result['horses']:
+                        return result
+                    # e.g. a card that is not published yet
+                    print(f"Entries endpoint had no entries for {race_id}, using shutuba.html")
+                except requests.exceptions.HTTPError as e:
+                    # _request re-raises 4xx without retrying; 5xx arrive wrapped after the retries
+                    status = e.response.status_code if e.response is not None else None
+                    if status is not None and 400 <= status < 500:
+                        unusable = f"HTTP {status}"
+                    else:
+                        print(f"Entries endpoint failed for {race_id}, using shutuba.html: {e}")
+                except Exception as e:
+                    print(f"Entries endpoint failed for {race_id}, using shutuba.html: {e}")
+
+            if unusable:
+                print(f"Entries endpoint unusable ({unusable}), using shutuba.html from now on")
+                self.entries_url = ''
+
         url = f"{self.BASE_URL}/race/shutuba.html?race_id={race_id}"
 
-        soup = self.fetch(url)
+        soup = self.fetch(url, ENTRY_ELEMENTS)
         if not soup:
             return None
 
+        return self.parse_race_details(soup, race_id, track_name)
+
+    def parse_race_details(self, soup: BeautifulSoup, race_id: str, track_name: str = None) -> Dict:
+        """
+        Extract race metadata and entries from a shutuba page
+
+        Args:
+            soup: Parsed page (the full page or only ENTRY_ELEMENTS)
+            race_id: Race identifier
+            track_name: Track name to include (omitted if empty)
+
+        Returns:
+            Race details dictionary (see fetch_race_details)
+        """
         # Extract race metadata
         race_name = self.safe_extract_text(soup, '.RaceName', '')
 
@@ -207,7 +279,6 @@ class RaceScraper(BaseScraper):
             'horses': horses
         }
 
-        # Include track_name if provided
         if track_name:
             result['track_name'] = track_name
 
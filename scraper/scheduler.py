@@ -0,0 +1,303 @@
+"""
+Priority-aware request scheduler
+Hands out netkeiba request slots (one per SCRAPING_DELAY_SECONDS) to the
+waiting scraper threads by priority class: interactive requests jump ahead
+of every queued prefetch/backfill request, and the remaining classes share
+the budget by weighted fair queuing.
+
+The class of a request is taken from a context variable, so callers mark a
+whole job with `with fetch_priority('backfill'):` and FetchEngine carries it
+into its worker threads.
+
+Queues are per process. Processes on one machine (the Streamlit app and the
+warm CLI) share the request slots themselves through SharedRequestBudget, a
+small SQLite file: slot starts stay SCRAPING_DELAY_SECONDS apart across all
+of them, and while any process is serving interactive requests the others
+leave every other slot free for it.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+INTERACTIVE = 'interactive'
+PREFETCH = 'prefetch'
+BACKFILL = 'backfill'
+
+# Slot share between classes that are waiting at the same time
+CLASS_WEIGHTS = {
+    INTERACTIVE: 8.0,
+    PREFETCH: 3.0,
+    BACKFILL: 1.0,
+}
+
+# Classes served before any other queued request regardless of weights
+PREEMPTIVE_CLASSES = (INTERACTIVE,)
+
+DEFAULT_CLASS = PREFETCH
+
+# Recent wait times kept per class for percentiles
+WAIT_SAMPLE_WINDOW = 500
+
+# Slots after an interactive request during which other processes yield every other slot
+INTERACTIVE_HOLD_SLOTS = 3
+
+_priority: contextvars.ContextVar = contextvars.ContextVar('fetch_priority', default=DEFAULT_CLASS)
+
+
+def current_priority() -> str:
+    """Get the priority class of the current context"""
+    return _priority.get()
+
+
+@contextmanager
+def fetch_priority(priority_class: str) -> Iterator[None]:
+    """
+    Run the enclosed fetches with a priority class
+
+    Args:
+        priority_class: One of CLASS_WEIGHTS (e.g. "interactive", "backfill")
+    """
+    if priority_class not in CLASS_WEIGHTS:
+        raise ValueError(f"Unknown priority class: {priority_class}")
+
+    token = _priority.set(priority_class)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class SharedRequestBudget:
+    """Request slots shared by every process that uses the same SQLite file"""
+
+    def __init__(self, path: str, delay: float):
+        """
+        Initialize shared budget
+
+        Args:
+            path: SQLite file (created if missing)
+            delay: Minimum seconds between two request starts in any process
+        """
+        self.path = path
+        self.delay = delay
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS budget (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a SQLite connection that commits and closes on exit"""
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def reserve(self, priority_class: str, not_before: float) -> float:
+        """
+        Reserve the next request slot
+
+        Args:
+            priority_class: Class of the request
+            not_before: Earliest acceptable start time (Unix time)
+
+        Returns:
+            Unix time at which the request may start
+        """
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock, so reservations are serialized across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = dict(conn.execute("SELECT name, value FROM budget").fetchall())
+                # Waiting for the write lock may have taken not_before into the past
+                next_slot = max(not_before, time.time(), state.get('next_slot', 0.0))
+                free_slot = state.get('free_slot', 0.0)
+
+                if priority_class in PREEMPTIVE_CLASSES:
+                    state['interactive_at'] = not_before
+                    if not_before <= free_slot < next_slot:
+                        # Take the slot another process left free
+                        start = free_slot
+                        state['free_slot'] = 0.0
+                    else:
+                        start = next_slot
+                        state['next_slot'] = start + self.delay
+                elif state.get('interactive_at', 0.0) + INTERACTIVE_HOLD_SLOTS * self.delay > not_before:
+                    # An interactive request is running elsewhere: leave it the slot before ours
+                    state['free_slot'] = next_slot
+                    start = next_slot + self.delay
+                    state['next_slot'] = start + self.delay
+                else:
+                    start = next_slot
+                    state['next_slot'] = start + self.delay
+
+                conn.executemany("INSERT OR REPLACE INTO budget (name, value) VALUES (?, ?)", state.items())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return start
+
+
+class PriorityScheduler:
+    """Rate limiter that orders waiting requests by priority class"""
+
+    def __init__(self, delay: float, weights: Optional[Dict[str, float]] = None,
+                 budget: Optional[SharedRequestBudget] = None):
+        """
+        Initialize scheduler
+
+        Args:
+            delay: Minimum seconds between two request starts
+            weights: Class weights (defaults to CLASS_WEIGHTS)
+            budget: Slots shared with other processes (None = this process only)
+        """
+        self.delay = delay
+        self.weights = dict(weights or CLASS_WEIGHTS)
+        self.budget = budget
+        self._next_slot = 0.0
+        self._cond = threading.Condition()
+
+        self._queues: Dict[str, Deque] = {name: deque() for name in self.weights}
+        # Weighted fair queuing: per-class virtual finish time and the global virtual clock
+        self._virtual_time = {name: 0.0 for name in self.weights}
+        self._virtual_clock = 0.0
+
+        self._served = {name: 0 for name in self.weights}
+        self._max_depth = {name: 0 for name in self.weights}
+        self._preempted = {name: 0 for name in self.weights}
+        self._waits: Dict[str, Deque[float]] = {name: deque(maxlen=WAIT_SAMPLE_WINDOW) for name in self.weights}
+        self._wait_totals = {name: 0.0 for name in self.weights}
+
+    def _select(self) -> Optional[list]:
+        """Pick the ticket to serve next (caller holds the lock)"""
+        for name in PREEMPTIVE_CLASSES:
+            if self._queues.get(name):
+                return self._queues[name][0]
+
+        waiting = [name for name, queue in self._queues.items() if queue]
+        if not waiting:
+            return None
+        name = min(waiting, key=lambda n: self._virtual_time[n])
+        return self._queues[name][0]
+
+    def wait(self) -> None:
+        """Block until the current context's class is granted the next request slot"""
+        priority_class = current_priority()
+        if priority_class not in self._queues:
+            priority_class = DEFAULT_CLASS
+
+        # [class, enqueue time]
+        ticket = [priority_class, time.time()]
+
+        with self._cond:
+            queue = self._queues[priority_class]
+            if not queue:
+                # A class that was idle does not keep credit for the time it was idle
+                self._virtual_time[priority_class] = max(self._virtual_time[priority_class], self._virtual_clock)
+            queue.append(ticket)
+            self._max_depth[priority_class] = max(self._max_depth[priority_class], len(queue))
+
+            if priority_class in PREEMPTIVE_CLASSES:
+                for name, other in self._queues.items():
+                    if other and name not in PREEMPTIVE_CLASSES:
+                        self._preempted[name] += len(other)
+
+            # Wake the current head so it re-checks whether it is still first
+            self._cond.notify_all()
+
+            while True:
+                now = time.time()
+                if self._select() is ticket:
+                    if now >= self._next_slot:
+                        break
+                    self._cond.wait(self._next_slot - now)
+                else:
+                    self._cond.wait()
+
+            start = max(now, self._next_slot)
+            # Claim the local slot first, so arrivals while the lock is released wait for the next one
+            self._next_slot = start + self.delay
+            if self.budget is not None:
+                # The SQLite write lock can take seconds under contention: reserve without
+                # holding the lock so other threads (interactive arrivals too) can queue and go
+                self._cond.release()
+                try:
+                    start = self.budget.reserve(priority_class, start)
+                except Exception as e:
+                    print(f"Shared request budget unavailable, using this process's schedule: {e}")
+                finally:
+                    self._cond.acquire()
+                # The slot is ours: the ticket stays at the head of its queue until it starts
+                while time.time() < start:
+                    self._cond.wait(start - time.time())
+                now = time.time()
+
+            queue.popleft()
+            self._next_slot = max(self._next_slot, start + self.delay)
+            self._virtual_clock = self._virtual_time[priority_class]
+            self._virtual_time[priority_class] += 1.0 / self.weights[priority_class]
+
+            waited = now - ticket[1]
+            self._served[priority_class] += 1
+            self._waits[priority_class].append(waited)
+            self._wait_totals[priority_class] += waited
+
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Get per-class scheduling metrics
+
+        Returns:
+            Dictionary of class name to:
+            - queued: int - Requests waiting now
+            - max_queued: int - Highest queue depth seen
+            - served: int - Requests granted a slot
+            - preempted: int - Queued requests overtaken by a preemptive class
+            - wait_avg: float - Mean seconds from request to slot
+            - wait_p50, wait_p95: float - Recent wait percentiles (None without samples)
+        """
+        with self._cond:
+            result = {}
+            for name in self.weights:
+                waits = sorted(self._waits[name])
+                served = self._served[name]
+                result[name] = {
+                    'queued': len(self._queues[name]),
+                    'max_queued': self._max_depth[name],
+                    'served': served,
+                    'preempted': self._preempted[name],
+                    'wait_avg': self._wait_totals[name] / served if served else 0.0,
+                    'wait_p50': _percentile(waits, 0.5),
+                    'wait_p95': _percentile(waits, 0.95)
+                }
+            return result
+
+
+def _percentile(ordered, pct: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted values"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def format_stats(stats: Dict[str, Dict]) -> str:
+    """Format scheduler metrics as one line per class"""
+    lines = []
+    for name, values in stats.items():
+        p95 = f"{values['wait_p95']:.2f}s" if values['wait_p95'] is not None else '-'
+        lines.append(f"{name:<12} served {values['served']:>6}  queued {values['queued']:>4} "
+                     f"(max {values['max_queued']:>4})  preempted {values['preempted']:>6}  "
+                     f"wait avg {values['wait_avg']:.2f}s p95 {p95}")
+    return "\n".join(lines)
@@ -0,0 +1,506 @@
+"""
+Cost and latency ledger for LLM analysis calls
+Append-only record with a local SQLite or JSONL sink and rollups for tuning:
+
+    llm_calls   - one row per provider call, written by LLMAnalyzer.complete()
+                  (hedge legs and cancelled calls included)
+    llm_ledger  - one row per analysis request (including analysis cache
+                  hits), the total of its calls
+
+Rows of one analysis share an analysis_id, taken from call_context().
+
+Usage:
+    python -m utils.ledger                # rollup per day
+    python -m utils.ledger --by model     # rollup per provider/model
+    python -m utils.ledger --calls        # per-call rollup per provider/model/hedge leg
+    python -m utils.ledger --days 7
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import argparse
+import threading
+import contextvars
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Ledger columns in write order
+FIELDS = [
+    'timestamp', 'race_id', 'provider', 'model', 'analysis_mode',
+    'input_tokens', 'output_tokens', 'cached_tokens', 'llm_calls',
+    'latency_seconds', 'ttft_seconds', 'cost_usd', 'saved_usd',
+    'cache_hit', 'horses_cached', 'horses_analyzed', 'analysis_id'
+]
+
+# Per-call columns in write order
+CALL_FIELDS = [
+    'timestamp', 'analysis_id', 'race_id', 'provider', 'model', 'hedge', 'cancelled', 'error',
+    'input_tokens', 'output_tokens', 'cached_tokens', 'latency_seconds', 'ttft_seconds', 'cost_usd'
+]
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS llm_ledger (
+    timestamp TEXT NOT NULL,
+    race_id TEXT,
+    provider TEXT,
+    model TEXT,
+    analysis_mode TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cached_tokens INTEGER,
+    llm_calls INTEGER,
+    latency_seconds REAL,
+    ttft_seconds REAL,
+    cost_usd REAL,
+    saved_usd REAL,
+    cache_hit INTEGER,
+    horses_cached INTEGER,
+    horses_analyzed INTEGER,
+    analysis_id TEXT
+)
+"""
+
+_CREATE_CALLS_TABLE = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    timestamp TEXT NOT NULL,
+    analysis_id TEXT,
+    race_id TEXT,
+    provider TEXT,
+    model TEXT,
+    hedge TEXT,
+    cancelled INTEGER,
+    error TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cached_tokens INTEGER,
+    latency_seconds REAL,
+    ttft_seconds REAL,
+    cost_usd REAL
+)
+"""
+
+# Fields attached to the call rows written in the current context
+_call_context: contextvars.ContextVar = contextvars.ContextVar('ledger_call_context', default={})
+
+
+@contextmanager
+def call_context(**fields) -> Iterator[Dict]:
+    """
+    Attach fields to the ledger rows of the LLM calls made inside
+
+    Worker threads started with tracing.bind inherit the fields.
+
+    Args:
+        **fields: Row fields, e.g. analysis_id, race_id or hedge ("primary"/"secondary")
+
+    Yields:
+        The merged fields
+    """
+    token = _call_context.set({**_call_context.get(), **fields})
+    try:
+        yield _call_context.get()
+    finally:
+        _call_context.reset(token)
+
+
+def current_call_context() -> Dict:
+    """Get the fields attached by the enclosing call_context()"""
+    return _call_context.get()
+
+
+def new_analysis_id() -> str:
+    """Generate an id linking the call rows of one analysis to its total"""
+    return uuid.uuid4().hex[:16]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile
+
+    Args:
+        values: Sample values
+        pct: Percentile between 0 and 1
+
+    Returns:
+        Percentile value, or None if there are no samples
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _int_or_none(value) -> Optional[int]:
+    """Convert a numeric value (e.g. DynamoDB Decimal) to int, keeping None"""
+    return int(value) if value is not None else None
+
+
+class CostLedger:
+    """Append-only ledger of LLM analysis calls"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize ledger
+
+        Args:
+            path: Ledger file (".jsonl" for JSONL, anything else for SQLite).
+                  Defaults to LEDGER_PATH.
+        """
+        self.path = path or os.getenv('LEDGER_PATH', 'data/llm_ledger.sqlite3')
+        self.enabled = os.getenv('LEDGER_ENABLED', 'true').lower() == 'true'
+        self.use_jsonl = self.path.endswith('.jsonl')
+        # JSONL sink keeps call rows in a sibling file
+        self.calls_path = self.path[:-len('.jsonl')] + '.calls.jsonl' if self.use_jsonl else self.path
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if not self.use_jsonl:
+                with self._connect() as conn:
+                    conn.execute(_CREATE_TABLE)
+                    conn.execute(_CREATE_CALLS_TABLE)
+                    # Ledgers created before analysis_id existed
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(llm_ledger)")}
+                    if 'analysis_id' not in columns:
+                        conn.execute("ALTER TABLE llm_ledger ADD COLUMN analysis_id TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a SQLite connection that commits and closes on exit"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, entry: Dict) -> bool:
+        """
+        Append one analysis entry to the ledger
+
+        Args:
+            entry: Dictionary with keys from FIELDS (missing keys are stored as null)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        row = {field: entry.get(field) for field in FIELDS}
+        row['cache_hit'] = bool(row['cache_hit'])
+        return self._append('llm_ledger', FIELDS, row, self.path)
+
+    def record_call(self, entry: Dict) -> bool:
+        """
+        Append one provider call to the ledger
+
+        Fields of the enclosing call_context() (analysis_id, race_id, hedge)
+        fill in keys the entry does not set.
+
+        Args:
+            entry: Dictionary with keys from CALL_FIELDS (missing keys are stored as null)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        merged = {**current_call_context(), **{key: value for key, value in entry.items() if value is not None}}
+        row = {field: merged.get(field) for field in CALL_FIELDS}
+        row['hedge'] = row['hedge'] or ''
+        row['cancelled'] = bool(row['cancelled'])
+        return self._append('llm_calls', CALL_FIELDS, row, self.calls_path)
+
+    def _append(self, table: str, fields: List[str], row: Dict, jsonl_path: str) -> bool:
+        """Write one row to the SQLite table or the JSONL file"""
+        if not self.enabled:
+            return False
+
+        row['timestamp'] = row['timestamp'] or datetime.now().isoformat(timespec='seconds')
+
+        try:
+            with self._lock:
+                if self.use_jsonl:
+                    with open(jsonl_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                else:
+                    with self._connect() as conn:
+                        conn.execute(
+                            f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                            [row[field] for field in fields]
+                        )
+            return True
+
+        except Exception as e:
+            print(f"Error writing ledger entry: {e}")
+            return False
+
+    def record_analysis(self, race_id: str, analysis_result: Dict, cache_hit: bool = False,
+                        analysis_mode: str = "", analysis_id: Optional[str] = None) -> bool:
+        """
+        Record an analysis result returned by an analyzer or the analysis cache
+
+        A cache hit costs nothing; its original cost is recorded as saved_usd.
+        A new analysis is the total of its llm_calls rows, linked by analysis_id.
+
+        Args:
+            race_id: Race identifier
+            analysis_result: Result dictionary from analyze_horses
+            cache_hit: Whether the result came from the analysis cache
+            analysis_mode: ANALYSIS_MODE used ("incremental" or "single")
+            analysis_id: Id its calls were recorded under (defaults to the enclosing call_context())
+
+        Returns:
+            True if successful, False otherwise
+        """
+        tokens = analysis_result.get('tokens_used', {})
+        cost_usd = float(analysis_result.get('cost_usd', 0) or 0)
+
+        entry = {
+            'race_id': race_id,
+            'provider': analysis_result.get('provider', ''),
+            'model': analysis_result.get('model', ''),
+            'analysis_mode': analysis_mode,
+            'cache_hit': cache_hit,
+            'horses_cached': _int_or_none(analysis_result.get('horses_cached')),
+            'horses_analyzed': _int_or_none(analysis_result.get('horses_analyzed')),
+            'analysis_id': analysis_id or current_call_context().get('analysis_id')
+        }
+
+        if cache_hit:
+            entry.update({
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'cached_tokens': 0,
+                'llm_calls': 0,
+                'cost_usd': 0.0,
+                'saved_usd': cost_usd
+            })
+        else:
+            ttft = analysis_result.get('time_to_first_token')
+            entry.update({
+                'input_tokens': int(tokens.get('input', 0)),
+                'output_tokens': int(tokens.get('output', 0)),
+                'cached_tokens': int(tokens.get('cached', 0)),
+                'llm_calls': _int_or_none(analysis_result.get('llm_calls')),
+                'latency_seconds': float(analysis_result.get('response_time', 0) or 0),
+                'ttft_seconds': float(ttft) if ttft is not None else None,
+                'cost_usd': cost_usd,
+                'saved_usd': 0.0
+            })
+
+        return self.record(entry)
+
+    def entries(self, since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Load analysis entries
+
+        Args:
+            since: Only return entries at or after this time
+
+        Returns:
+            List of entry dictionaries in write order
+        """
+        rows = self._load('llm_ledger', FIELDS, self.path, since)
+        for row in rows:
+            row['cache_hit'] = bool(row['cache_hit'])
+        return rows
+
+    def calls(self, since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Load per-call entries
+
+        Args:
+            since: Only return entries at or after this time
+
+        Returns:
+            List of call dictionaries in write order
+        """
+        rows = self._load('llm_calls', CALL_FIELDS, self.calls_path, since)
+        for row in rows:
+            row['cancelled'] = bool(row['cancelled'])
+        return rows
+
+    def _load(self, table: str, fields: List[str], jsonl_path: str, since: Optional[datetime]) -> List[Dict]:
+        """Read rows of one table (or JSONL file) at or after since"""
+        if not self.enabled or not os.path.exists(jsonl_path):
+            return []
+
+        since_text = since.isoformat(timespec='seconds') if since else ''
+
+        if self.use_jsonl:
+            rows = []
+            with open(jsonl_path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        rows.append(json.loads(line))
+            return [{field: row.get(field) for field in fields} for row in rows
+                    if row.get('timestamp', '') >= since_text]
+
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                f"SELECT {', '.join(fields)} FROM {table} WHERE timestamp >= ? ORDER BY rowid",
+                (since_text,)
+            )
+            return [dict(row) for row in cursor]
+
+    def rollup(self, by: str = 'day', since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Aggregate ledger entries
+
+        Args:
+            by: Grouping key ("day" or "model")
+            since: Only include entries at or after this time
+
+        Returns:
+            List of rollup dictionaries sorted by key, each containing:
+            - key: str - Day (YYYY-MM-DD) or "provider/model"
+            - requests: int - Analysis requests (including cache hits)
+            - cache_hits: int - Requests served from the analysis cache
+            - hit_rate: float - cache_hits / requests
+            - llm_calls, input_tokens, output_tokens, cached_tokens: int
+            - cost_usd: float - Total spend
+            - saved_usd: float - Spend avoided by analysis cache hits
+            - latency_p50, latency_p95, ttft_p50, ttft_p95: float - Seconds (cache misses only)
+        """
+        groups: Dict[str, List[Dict]] = {}
+        for row in self.entries(since):
+            if by == 'model':
+                key = f"{row.get('provider') or '-'}/{row.get('model') or '-'}"
+            else:
+                key = (row.get('timestamp') or '')[:10]
+            groups.setdefault(key, []).append(row)
+
+        rollups = []
+        for key in sorted(groups):
+            rows = groups[key]
+            misses = [row for row in rows if not row.get('cache_hit')]
+            latencies = [row['latency_seconds'] for row in misses if row.get('latency_seconds') is not None]
+            ttfts = [row['ttft_seconds'] for row in misses if row.get('ttft_seconds') is not None]
+            cache_hits = len(rows) - len(misses)
+
+            rollups.append({
+                'key': key,
+                'requests': len(rows),
+                'cache_hits': cache_hits,
+                'hit_rate': cache_hits / len(rows),
+                'llm_calls': sum(row.get('llm_calls') or 0 for row in rows),
+                'input_tokens': sum(row.get('input_tokens') or 0 for row in rows),
+                'output_tokens': sum(row.get('output_tokens') or 0 for row in rows),
+                'cached_tokens': sum(row.get('cached_tokens') or 0 for row in rows),
+                'cost_usd': sum(row.get('cost_usd') or 0 for row in rows),
+                'saved_usd': sum(row.get('saved_usd') or 0 for row in rows),
+                'latency_p50': percentile(latencies, 0.5),
+                'latency_p95': percentile(latencies, 0.95),
+                'ttft_p50': percentile(ttfts, 0.5),
+                'ttft_p95': percentile(ttfts, 0.95)
+            })
+
+        return rollups
+
+
+def call_rollup(ledger: CostLedger, since: Optional[datetime] = None) -> List[Dict]:
+    """
+    Aggregate per-call entries by provider, model and hedge leg
+
+    Args:
+        ledger: Ledger to read
+        since: Only include calls at or after this time
+
+    Returns:
+        List of rollup dictionaries sorted by key, each containing:
+        - key: str - "provider/model" plus " [primary]" / " [secondary]" for hedge legs
+        - calls: int - Provider calls
+        - cancelled: int - Calls cancelled (hedge losers and caller cancels)
+        - errors: int - Calls that failed
+        - input_tokens, output_tokens, cached_tokens: int
+        - cost_usd: float - Spend of the completed calls
+        - latency_p50, latency_p95, ttft_p50, ttft_p95: float - Seconds (completed calls only)
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for row in ledger.calls(since):
+        key = f"{row.get('provider') or '-'}/{row.get('model') or '-'}"
+        if row.get('hedge'):
+            key += f" [{row['hedge']}]"
+        groups.setdefault(key, []).append(row)
+
+    rollups = []
+    for key in sorted(groups):
+        rows = groups[key]
+        completed = [row for row in rows if not row.get('cancelled') and not row.get('error')]
+        latencies = [row['latency_seconds'] for row in completed if row.get('latency_seconds') is not None]
+        ttfts = [row['ttft_seconds'] for row in completed if row.get('ttft_seconds') is not None]
+
+        rollups.append({
+            'key': key,
+            'calls': len(rows),
+            'cancelled': sum(1 for row in rows if row.get('cancelled')),
+            'errors': sum(1 for row in rows if row.get('error') and not row.get('cancelled')),
+            'input_tokens': sum(row.get('input_tokens') or 0 for row in rows),
+            'output_tokens': sum(row.get('output_tokens') or 0 for row in rows),
+            'cached_tokens': sum(row.get('cached_tokens') or 0 for row in rows),
+            'cost_usd': sum(row.get('cost_usd') or 0 for row in rows),
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'ttft_p50': percentile(ttfts, 0.5),
+            'ttft_p95': percentile(ttfts, 0.95)
+        })
+
+    return rollups
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    """Format an optional number of seconds for the rollup table"""
+    return f"{value:.1f}s" if value is not None else "-"
+
+
+def main():
+    """Print ledger rollups"""
+    parser = argparse.ArgumentParser(description="LLM cost/latency ledger rollups")
+    parser.add_argument('--by', choices=['day', 'model'], default='day', help="Grouping key")
+    parser.add_argument('--days', type=int, default=None, help="Only include the last N days")
+    parser.add_argument('--path', default=None, help="Ledger file (defaults to LEDGER_PATH)")
+    parser.add_argument('--calls', action='store_true', help="Roll up individual provider calls")
+    args = parser.parse_args()
+
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    ledger = CostLedger(args.path)
+
+    if args.calls:
+        rollups = call_rollup(ledger, since=since)
+        if not rollups:
+            print("No ledger entries")
+            return
+
+        print(f"{'key':<50} {'calls':>6} {'cancel':>6} {'error':>6} {'input':>9} {'output':>8} "
+              f"{'cached':>8} {'cost$':>9} {'p50':>7} {'p95':>7} {'ttft50':>7} {'ttft95':>7}")
+        for r in rollups:
+            print(f"{r['key']:<50} {r['calls']:>6} {r['cancelled']:>6} {r['errors']:>6} "
+                  f"{r['input_tokens']:>9,} {r['output_tokens']:>8,} {r['cached_tokens']:>8,} {r['cost_usd']:>9.4f} "
+                  f"{_format_seconds(r['latency_p50']):>7} {_format_seconds(r['latency_p95']):>7} "
+                  f"{_format_seconds(r['ttft_p50']):>7} {_format_seconds(r['ttft_p95']):>7}")
+        return
+
+    rollups = ledger.rollup(by=args.by, since=since)
+
+    if not rollups:
+        print("No ledger entries")
+        return
+
+    print(f"{'key':<40} {'req':>5} {'hit%':>6} {'calls':>6} {'input':>9} {'output':>8} "
+          f"{'cached':>8} {'cost$':>9} {'saved$':>9} {'p50':>7} {'p95':>7} {'ttft50':>7} {'ttft95':>7}")
+    for r in rollups:
+        print(f"{r['key']:<40} {r['requests']:>5} {r['hit_rate'] * 100:>5.1f}% {r['llm_calls']:>6} "
+              f"{r['input_tokens']:>9,} {r['output_tokens']:>8,} {r['cached_tokens']:>8,} "
+              f"{r['cost_usd']:>9.4f} {r['saved_usd']:>9.4f} "
+              f"{_format_seconds(r['latency_p50']):>7} {_format_seconds(r['latency_p95']):>7} "
+              f"{_format_seconds(r['ttft_p50']):>7} {_format_seconds(r['ttft_p95']):>7}")
+
+
+if __name__ == "__main__":
+    main()
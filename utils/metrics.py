@@ -0,0 +1,303 @@
+"""
+Prometheus metrics for the app process
+Counters, gauges and histograms in the Prometheus text format, served from
+a sidecar HTTP thread in the same process. Fetch, cache and LLM metrics are
+derived from the utils.tracing spans, so instrumented code needs no extra
+calls.
+
+Enabled with METRICS_ENABLED=true; scrape http://<host>:METRICS_PORT/metrics
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from utils import tracing
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LLM_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class _Metric:
+    """Metric family with one value per label combination"""
+
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize metric
+
+        Args:
+            name: Metric name
+            help_text: HELP line
+            labelnames: Label names (values are passed as keyword arguments)
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        """Text format lines of this family"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(self._labels(key), value))
+        return lines
+
+    def _render_value(self, labels: Dict[str, str], value) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {value}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            # Stored values are replaced, never mutated, so render() can read them unlocked
+            counts = list(counts)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (tuple(counts), total + value, count + 1)
+
+    def _render_value(self, labels: Dict[str, str], value) -> List[str]:
+        # Bucket counts are cumulative (each observation is counted in every bucket >= value)
+        counts, total, count = value
+        lines = [f"{self.name}_bucket{_format_labels({**labels, 'le': repr(bound)})} {bucket_count}"
+                 for bound, bucket_count in zip(self.buckets, counts)]
+        lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metric families"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All families in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+FETCH_DURATION = REGISTRY.histogram(
+    'keiba_fetch_duration_seconds', 'Page request latency including retries and rate-limit wait', ['url_class'])
+FETCH_RESPONSES = REGISTRY.counter(
+    'keiba_fetch_responses_total', 'Page requests by final status class (2xx/3xx/4xx/5xx/error)',
+    ['url_class', 'status'])
+FETCH_RETRIES = REGISTRY.counter('keiba_fetch_retries_total', 'Page request retries', ['url_class'])
+FETCH_FAILURES = REGISTRY.counter(
+    'keiba_fetch_failed_attempts_total', 'Failed request attempts (timeout/5xx/connection), retried or not',
+    ['url_class', 'reason'])
+RATE_LIMIT_WAIT = REGISTRY.histogram('keiba_rate_limit_wait_seconds', 'Time spent waiting for the rate limiter')
+PARSE_DURATION = REGISTRY.histogram('keiba_parse_duration_seconds', 'HTML parse time', ['url_class'])
+CACHE_REQUESTS = REGISTRY.counter(
+    'keiba_cache_requests_total', 'Cache reads by tier, key prefix and result (hit/miss)', ['tier', 'prefix', 'result'])
+CACHE_DURATION = REGISTRY.histogram('keiba_cache_duration_seconds', 'Cache operation latency', ['tier', 'op'])
+LLM_DURATION = REGISTRY.histogram(
+    'keiba_llm_duration_seconds', 'LLM call latency', ['provider', 'model'], buckets=LLM_BUCKETS)
+LLM_TTFT = REGISTRY.histogram(
+    'keiba_llm_ttft_seconds', 'LLM time to first token', ['provider', 'model'], buckets=LLM_BUCKETS)
+LLM_TOKENS = REGISTRY.counter('keiba_llm_tokens_total', 'LLM tokens (input/output/cached)', ['provider', 'model', 'type'])
+LLM_COST = REGISTRY.counter('keiba_llm_cost_usd_total', 'Estimated LLM cost in USD', ['provider', 'model'])
+LLM_ERRORS = REGISTRY.counter('keiba_llm_errors_total', 'Failed or cancelled LLM calls', ['provider', 'model'])
+INFLIGHT_SESSIONS = REGISTRY.gauge('keiba_inflight_sessions', 'Streamlit sessions currently running a script run')
+
+
+def _status_class(status) -> str:
+    """200 -> "2xx"; missing status -> "error" (no response)"""
+    return f"{int(status) // 100}xx" if status else 'error'
+
+
+class MetricsSink:
+    """tracing sink that turns finished spans into metrics"""
+
+    def export(self, span: tracing.Span) -> None:
+        attrs = span.attributes
+        seconds = span.duration_ms / 1000
+
+        if span.name == 'http.request':
+            url_class = attrs.get('url_class', '')
+            FETCH_DURATION.observe(seconds, url_class=url_class)
+            FETCH_RESPONSES.inc(url_class=url_class, status=_status_class(attrs.get('status')))
+            if attrs.get('retries'):
+                FETCH_RETRIES.inc(attrs['retries'], url_class=url_class)
+            for reason, count in (attrs.get('failures') or {}).items():
+                FETCH_FAILURES.inc(count, url_class=url_class, reason=reason)
+            if attrs.get('wait_ms') is not None:
+                RATE_LIMIT_WAIT.observe(attrs['wait_ms'] / 1000)
+
+        elif span.name == 'html.parse':
+            PARSE_DURATION.observe(seconds, url_class=attrs.get('url_class', ''))
+
+        elif span.name in ('cache.get', 'cache.set'):
+            op = span.name.split('.', 1)[1]
+            CACHE_DURATION.observe(seconds, tier=attrs.get('tier', ''), op=op)
+            if op == 'get':
+                CACHE_REQUESTS.inc(tier=attrs.get('tier', ''), prefix=attrs.get('key_prefix', ''),
+                                   result='hit' if attrs.get('hit') else 'miss')
+
+        elif span.name == 'llm.complete':
+            labels = {'provider': attrs.get('provider', ''), 'model': attrs.get('model', '')}
+            if span.error:
+                LLM_ERRORS.inc(**labels)
+                return
+            LLM_DURATION.observe(seconds, **labels)
+            if attrs.get('ttft_ms') is not None:
+                LLM_TTFT.observe(attrs['ttft_ms'] / 1000, **labels)
+            for token_type in ('input', 'output', 'cached'):
+                LLM_TOKENS.inc(attrs.get(f'{token_type}_tokens', 0), type=token_type, **labels)
+            LLM_COST.inc(attrs.get('cost_usd', 0.0), **labels)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves REGISTRY at /metrics"""
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the app log
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Start the /metrics sidecar thread once per process
+
+    Safe to call on every Streamlit rerun; later calls return the running server.
+
+    Args:
+        port: Listen port (defaults to METRICS_PORT)
+        host: Listen address (defaults to METRICS_HOST)
+
+    Returns:
+        The server, or None if METRICS_ENABLED is not "true" or the port is unavailable
+    """
+    global _server
+
+    if os.getenv('METRICS_ENABLED', 'false').lower() != 'true':
+        return None
+
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        port = port if port is not None else int(os.getenv('METRICS_PORT', '9108'))
+        host = host or os.getenv('METRICS_HOST', '0.0.0.0')
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"Error starting metrics server on {host}:{port}: {e}")
+            return None
+
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name='metrics').start()
+        tracing.add_sink(MetricsSink())
+        _server = server
+        print(f"Metrics server listening on {host}:{server.server_address[1]}/metrics")
+        return server
+
+
+@contextmanager
+def track_session() -> Iterator[None]:
+    """Count the enclosed script run in keiba_inflight_sessions"""
+    INFLIGHT_SESSIONS.inc()
+    try:
+        yield
+    finally:
+        INFLIGHT_SESSIONS.dec()
@@ -0,0 +1,115 @@
+"""
+Opt-in profiling of one analysis request
+Wraps a full fetch + analysis run in a profiler and dumps the profile to
+PROFILE_DIR keyed by race_id and timestamp:
+    pyinstrument installed  - sampling profiler, speedscope JSON (open at https://www.speedscope.app)
+    otherwise               - cProfile, .pstats (python -m pstats FILE)
+
+Enabled for every request with PROFILE_ENABLED=true, or per request with the
+admin query parameter ?profile=<PROFILE_TOKEN>. When disabled, profile()
+only checks a flag.
+
+Both profilers sample the calling thread; time spent in fetch/analysis
+worker threads shows up as the caller waiting on them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Mapping, Optional
+
+
+class ProfileResult:
+    """Where a finished profile was written"""
+
+    def __init__(self, race_id: str):
+        self.race_id = race_id
+        self.path: Optional[str] = None
+        self.format = ''
+        self.seconds = 0.0
+
+
+def profiling_requested(query_params: Optional[Mapping[str, str]] = None) -> bool:
+    """
+    Decide whether this request is profiled
+
+    Args:
+        query_params: Page query parameters (e.g. st.query_params)
+
+    Returns:
+        True if PROFILE_ENABLED is set, or ?profile= matches a non-empty PROFILE_TOKEN
+    """
+    if os.getenv('PROFILE_ENABLED', 'false').lower() == 'true':
+        return True
+
+    token = os.getenv('PROFILE_TOKEN', '')
+    return bool(token) and query_params is not None and query_params.get('profile') == token
+
+
+@contextmanager
+def profile(race_id: str, enabled: bool) -> Iterator[Optional[ProfileResult]]:
+    """
+    Profile the enclosed block
+
+    The profile is written even if the block raises (e.g. st.stop()).
+
+    Args:
+        race_id: Race identifier (part of the file name)
+        enabled: Whether to profile (from profiling_requested)
+
+    Yields:
+        ProfileResult whose path is set on exit, or None when disabled
+    """
+    if not enabled:
+        yield None
+        return
+
+    result = ProfileResult(race_id)
+    directory = os.getenv('PROFILE_DIR', 'data/profiles')
+    os.makedirs(directory, exist_ok=True)
+    base_path = os.path.join(directory, f"{race_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler(interval=float(os.getenv('PROFILE_INTERVAL', '0.001')))
+        profiler.start()
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    start_time = time.time()
+    try:
+        yield result
+    finally:
+        result.seconds = time.time() - start_time
+        if Profiler is not None:
+            profiler.stop()
+            _write_pyinstrument(profiler, base_path, result)
+        else:
+            profiler.disable()
+            result.path = base_path + '.pstats'
+            result.format = 'pstats'
+            profiler.dump_stats(result.path)
+        print(f"Profile written: {result.path} ({result.seconds:.1f}s)")
+
+
+def _write_pyinstrument(profiler, base_path: str, result: ProfileResult) -> None:
+    """Write a pyinstrument session as speedscope JSON (HTML for versions without that renderer)"""
+    try:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        result.path = base_path + '.speedscope.json'
+        result.format = 'speedscope'
+        content = profiler.output(renderer=SpeedscopeRenderer())
+    except ImportError:
+        result.path = base_path + '.html'
+        result.format = 'html'
+        content = profiler.output_html()
+
+    with open(result.path, 'w', encoding='utf-8') as f:
+        f.write(content)
@@ -0,0 +1,256 @@
+"""
+Lightweight tracing spans for scraper, cache and analyzer calls
+Spans nest through a context variable, so the parent/child structure follows
+asyncio tasks automatically and thread pools that run their tasks with
+bind() (or a copied context, like scraper.engine.FetchEngine).
+
+Finished spans go to the sink chosen by TRACE_SINK:
+    none    - tracing disabled (default, span() is a no-op)
+    stdout  - one JSON object per span on stdout
+    otlp    - OTLP/JSON lines (ExportTraceServiceRequest) appended to TRACE_PATH
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class Span:
+    """One timed operation with attributes"""
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Optional[Dict[str, Any]] = None):
+        """
+        Start a span
+
+        Args:
+            name: Operation name (e.g. "http.request")
+            parent: Enclosing span (None = new trace)
+            attributes: Initial attributes
+        """
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        """Add or overwrite attributes"""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        """Milliseconds from start to end (or to now while running)"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Flat JSON representation"""
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+class _NoopSpan:
+    """Span stand-in used while tracing is disabled"""
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class StdoutSink:
+    """Prints one JSON object per finished span"""
+
+    def export(self, span: Span) -> None:
+        print(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+
+class OTLPFileSink:
+    """Appends spans as OTLP/JSON ExportTraceServiceRequest lines (OpenTelemetry file exporter format)"""
+
+    def __init__(self, path: Optional[str] = None, service_name: Optional[str] = None):
+        """
+        Initialize OTLP file sink
+
+        Args:
+            path: Output file (defaults to TRACE_PATH)
+            service_name: service.name resource attribute (defaults to TRACE_SERVICE_NAME)
+        """
+        self.path = path or os.getenv('TRACE_PATH', 'data/traces.otlp.jsonl')
+        self.service_name = service_name or os.getenv('TRACE_SERVICE_NAME', 'keiba-analyzer')
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        record = {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'utils.tracing'},
+                    'spans': [{
+                        'traceId': span.trace_id,
+                        'spanId': span.span_id,
+                        'parentSpanId': span.parent_id or '',
+                        'name': span.name,
+                        'kind': 1,  # SPAN_KIND_INTERNAL
+                        'startTimeUnixNano': str(span.start_ns),
+                        'endTimeUnixNano': str(span.end_ns),
+                        'attributes': [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+                        'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+                    }]
+                }]
+            }]
+        }
+        line = json.dumps(record, ensure_ascii=False)
+
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        except Exception as e:
+            print(f"Error writing trace: {e}")
+
+
+class FanoutSink:
+    """Sends every span to several sinks (e.g. a trace file and utils.metrics)"""
+
+    def __init__(self, sinks: list):
+        self.sinks = list(sinks)
+
+    def export(self, span: Span) -> None:
+        for sink in self.sinks:
+            try:
+                sink.export(span)
+            except Exception as e:
+                print(f"Error exporting span to {type(sink).__name__}: {e}")
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """Encode one attribute as an OTLP KeyValue"""
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+_sink = None
+_sink_configured = False
+
+
+def make_sink(name: Optional[str] = None):
+    """
+    Create the sink named by TRACE_SINK
+
+    Args:
+        name: "none", "stdout" or "otlp" (defaults to TRACE_SINK)
+
+    Returns:
+        Sink instance, or None when tracing is disabled
+    """
+    name = (name or os.getenv('TRACE_SINK', 'none')).lower()
+    if name == 'stdout':
+        return StdoutSink()
+    if name == 'otlp':
+        return OTLPFileSink()
+    return None
+
+
+def set_sink(sink) -> None:
+    """Install a sink (any object with export(span); None disables tracing)"""
+    global _sink, _sink_configured
+    _sink = sink
+    _sink_configured = True
+
+
+def add_sink(sink) -> None:
+    """Install a sink next to the configured one (enables tracing if it was off)"""
+    current = get_sink()
+    if current is None:
+        set_sink(sink)
+    elif isinstance(current, FanoutSink):
+        current.sinks.append(sink)
+    else:
+        set_sink(FanoutSink([current, sink]))
+
+
+def get_sink():
+    """Current sink, created from TRACE_SINK on first use"""
+    if not _sink_configured:
+        set_sink(make_sink())
+    return _sink
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Trace the enclosed block as a child of the current span
+
+    Args:
+        name: Operation name
+        **attributes: Initial attributes (more can be added with .set())
+
+    Yields:
+        The span (a no-op stand-in while tracing is disabled)
+    """
+    sink = get_sink()
+    if sink is None:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        sink.export(current)
+
+
+def current_span():
+    """The innermost active span (a no-op stand-in if there is none)"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Bind a function to the caller's context for running on another thread
+
+    Spans started by fn become children of the span active at bind time.
+
+    Args:
+        fn: Function to submit to a thread pool
+
+    Returns:
+        Function that runs fn inside a copy of the current context
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)